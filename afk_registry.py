@@ -0,0 +1,48 @@
+# afk_registry.py
+"""
+In-memory AFK statuses.
+
+The file is loaded once through the shared state store when the Misc cog
+loads; after that every lookup is a dict access, so on_message can check the
+author and each mention without touching the disk. Changes are handed back to
+the store, which writes them out a few seconds later in one atomic write.
+"""
+
+from state_store import state_store
+
+
+class AfkRegistry:
+    def __init__(self, path):
+        self.path = path
+        # str(user_id) -> {"message", "timestamp", "guild_id", "channel_id"}
+        self._entries = {}
+
+    def load(self):
+        self._entries = state_store.load(self.path, {})
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._entries
+
+    def get(self, user_id):
+        return self._entries.get(str(user_id))
+
+    def items(self):
+        return list(self._entries.items())
+
+    def set(self, user_id, info):
+        self._entries[str(user_id)] = info
+        state_store.save(self.path, self._entries)
+
+    def pop(self, user_id):
+        """Remove and return a user's status, or None if they weren't AFK"""
+        info = self._entries.pop(str(user_id), None)
+        if info is not None:
+            state_store.save(self.path, self._entries)
+        return info
+
+    async def flush(self):
+        """Write the current statuses now (also called when the cog unloads)"""
+        await state_store.flush(self.path)
@@ -0,0 +1,184 @@
+# autocomplete.py
+"""
+Shared slash-command autocomplete.
+
+Discord sends an autocomplete request on every keystroke and drops the
+answer if it takes longer than 3 seconds. Catalogues (shop items, pets,
+command names) are wrapped in a PrefixIndex once: a sorted list of lowercase
+keys for the whole name and for every word in it, so a query is a bisect
+rather than a scan. Matches are ranked whole-name prefix first, then word
+prefix, then plain substring. The items and pets a user owns are fetched once
+and reused for OWNED_TTL seconds, and every request is answered within
+AUTOCOMPLETE_BUDGET: a lookup that is still running by then finishes in the
+background to warm the cache, and the user sees no suggestions for that
+keystroke instead of a failed interaction. db notifies its owned-change
+listeners (see db.on_owned_change) whenever a user's items or pets are
+written, through the item/pet helpers, UserTransaction or a full-list
+update_user/aupdate_user, and that user's cached names are dropped then.
+"""
+
+import asyncio
+import re
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from discord import app_commands
+
+from db import aget_user_fields, on_owned_change
+
+MAX_CHOICES = 25  # Discord's limit per response
+AUTOCOMPLETE_BUDGET = 2.0
+OWNED_TTL = 15.0
+OWNED_CACHE_SIZE = 2000
+
+# Where a new word starts: after a space, dash, underscore, dot or colon
+_WORD_START = re.compile(r"(?<=[\s\-_.:])\w")
+
+
+class PrefixIndex:
+    """Names searchable by lowercase prefix of the whole name or of any word in it"""
+
+    def __init__(self, names):
+        self.names = list(dict.fromkeys(names))
+        self._known = set(self.names)
+        self._whole = sorted((name.lower(), name) for name in self.names)
+        self._words = sorted(
+            (name.lower()[match.start():], name)
+            for name in self.names
+            for match in _WORD_START.finditer(name.lower())
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _starting_with(keys, query):
+        position = bisect_left(keys, (query,))
+        while position < len(keys) and keys[position][0].startswith(query):
+            yield keys[position][1]
+            position += 1
+
+    def search(self, query, within=None, limit=MAX_CHOICES):
+        """Names matching what the user typed, best first
+
+        `within` restricts the result to those names (e.g. what the user owns); names in it that
+        aren't indexed are still offered when they contain the query.
+        """
+        query = query.lower().strip()
+        allowed = None if within is None else set(within)
+        results = []
+        seen = set()
+
+        def add(names):
+            for name in names:
+                if name not in seen and (allowed is None or name in allowed):
+                    seen.add(name)
+                    results.append(name)
+                    if len(results) >= limit:
+                        return True
+            return False
+
+        candidates = self.names if allowed is None else [name for name in self.names if name in allowed]
+        extras = [] if allowed is None else sorted(allowed - self._known)
+        if not query:
+            add(candidates + extras)
+            return results
+        if add(self._starting_with(self._whole, query)) or add(self._starting_with(self._words, query)):
+            return results
+        add(name for name in candidates + extras if query in name.lower())
+        return results
+
+
+class AutocompleteService:
+    def __init__(self, ttl=OWNED_TTL, budget=AUTOCOMPLETE_BUDGET, max_entries=OWNED_CACHE_SIZE):
+        self.ttl = ttl
+        self.budget = budget
+        self.max_entries = max_entries
+        # (user_id, field) -> (expires at, names), least recently used first
+        self._owned = OrderedDict()
+        # (user_id, field) -> running fetch, shared by overlapping requests
+        self._fetches = {}
+        self._loop = None
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+    async def owned(self, user_id, field):
+        """Distinct names in one of the user's list columns ("inventory" or "pets"), cached briefly
+
+        Raises asyncio.TimeoutError if the database doesn't answer within the budget.
+        """
+        key = (user_id, field)
+        entry = self._owned.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._owned.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        self._loop = asyncio.get_running_loop()
+        task = self._fetches.get(key)
+        if task is None:
+            task = self._fetches[key] = asyncio.get_running_loop().create_task(self._fetch(key))
+        # shield: a timed-out request leaves the fetch running so it can fill the cache
+        return await asyncio.wait_for(asyncio.shield(task), self.budget)
+
+    async def _fetch(self, key):
+        user_id, field = key
+        try:
+            row = await aget_user_fields(user_id, field)
+            names = list(dict.fromkeys(row.get(field) or []))
+        except Exception as e:
+            print(f"[ERROR] Autocomplete failed to load {field} for {user_id}: {e}")
+            return []
+        finally:
+            # invalidate() drops fetches that started before the change; don't cache what they read
+            current = self._fetches.get(key) is asyncio.current_task()
+            if current:
+                del self._fetches[key]
+        if not current:
+            return names
+        self._owned[key] = (time.monotonic() + self.ttl, names)
+        self._owned.move_to_end(key)
+        while len(self._owned) > self.max_entries:
+            self._owned.popitem(last=False)
+        return names
+
+    def invalidate(self, user_id):
+        """Forget a user's cached items and pets; db calls this (via owned_changed) right after they change"""
+        for key in [key for key in self._owned if key[0] == user_id]:
+            del self._owned[key]
+        for key in [key for key in self._fetches if key[0] == user_id]:
+            del self._fetches[key]
+
+    def owned_changed(self, user_id):
+        """db listener; ownership changes are committed on db worker threads, so hop onto the bot's loop"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self.invalidate, user_id)
+
+    async def complete(self, interaction, current, index, owned_field=None):
+        """Choices for an autocomplete request from an index, optionally limited to what the user owns"""
+        within = None
+        if owned_field is not None:
+            try:
+                within = await self.owned(interaction.user.id, owned_field)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                print(f"[DEBUG] Autocomplete for {owned_field} of {interaction.user.id} ran past {self.budget}s")
+                return []
+        names = index.search(current or "", within=within, limit=MAX_CHOICES)
+        # Choice names and values are capped at 100 characters
+        return [app_commands.Choice(name=name[:100], value=name[:100]) for name in names]
+
+    def stats(self):
+        return {
+            "cached_users": len({user_id for user_id, _ in self._owned}),
+            "hits": self.hits,
+            "misses": self.misses,
+            "timeouts": self.timeouts,
+        }
+
+
+autocomplete = AutocompleteService()
+on_owned_change(autocomplete.owned_changed)
@@ -0,0 +1,217 @@
+# automod.py
+"""
+Compiled auto-moderation checks.
+
+Patterns are compiled once at import, the forbidden-word list becomes a single
+Aho-Corasick automaton, and each guild's settings are turned into a GuildRules
+object the first time that guild sends a message. The Moderation cog drops a
+guild's compiled rules when /automod, /alloweddomains or /autodetect changes
+them, so checking a message costs one pass over its text per enabled check.
+"""
+
+from collections import OrderedDict, deque
+import re
+import sys
+import time
+
+# Unicode emoji blocks plus custom <:name:id> / <a:name:id> emojis
+EMOJI_PATTERN = re.compile(r'<a?:.+?:\d+>|[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002600-\U000027BF\U0001F900-\U0001F9FF]')
+URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+
+class WordMatcher:
+    """Aho-Corasick automaton that finds every listed word inside a text in one pass"""
+
+    def __init__(self, words):
+        self.words = list(dict.fromkeys(word.lower() for word in words if word))
+        # Trie transitions, failure links and the word indexes that end at each node
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for index, word in enumerate(self.words):
+            node = 0
+            for ch in word:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] += (index,)
+        # Breadth-first so every failure link points at an already finished node
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] += self._out[self._fail[child]]
+
+    def find(self, text):
+        """Listed words occurring anywhere in text (already lowercased), in list order"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        hits = set()
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits.update(out[node])
+        return [self.words[index] for index in sorted(hits)]
+
+
+def caps_ratio(content):
+    """Share of letters that are uppercase, counted in one pass (None if there are no letters)"""
+    letters = upper = 0
+    for ch in content:
+        if ch.isalpha():
+            letters += 1
+            if ch.isupper():
+                upper += 1
+    return upper / letters if letters else None
+
+
+def is_caps_spam(content, threshold=0.7):
+    """Check if message is mostly caps"""
+    if len(content) < 10:
+        return False
+    ratio = caps_ratio(content)
+    return ratio is not None and ratio > threshold
+
+
+def is_emoji_spam(content, threshold=0.5):
+    """Check if message is mostly emojis"""
+    if len(content) < 5:
+        return False
+    text_content, emoji_count = EMOJI_PATTERN.subn('', content)
+    text_content = text_content.strip()
+    if not text_content:
+        return emoji_count > 0
+    return emoji_count / (emoji_count + len(text_content)) > threshold
+
+
+def link_domains(content):
+    """Lowercased host of every link in the message"""
+    return [url.split('/')[2].lower() for url in URL_PATTERN.findall(content)]
+
+
+class SpamTracker:
+    """Sliding-window message rate per (guild, user), bounded in memory
+
+    Only the last `limit` timestamps (monotonic floats) are kept per user: the user is spamming
+    when that many messages fall within `window` seconds. Each guild keeps at most
+    `max_users_per_guild` users, dropping the least recently active, and sweep() forgets users
+    who have been quiet for a full window.
+    """
+
+    def __init__(self, limit=3, window=10.0, max_users_per_guild=5000):
+        self.limit = limit
+        self.window = window
+        self.max_users_per_guild = max_users_per_guild
+        # guild_id -> OrderedDict(user_id -> deque of timestamps), least recently active first
+        self._guilds = {}
+        self.evictions = 0
+        self.swept = 0
+
+    def hit(self, guild_id, user_id, now=None):
+        """Record a message; returns True if the user is over the rate"""
+        now = time.monotonic() if now is None else now
+        users = self._guilds.get(guild_id)
+        if users is None:
+            users = self._guilds[guild_id] = OrderedDict()
+        timestamps = users.get(user_id)
+        if timestamps is None:
+            timestamps = users[user_id] = deque(maxlen=self.limit)
+            if len(users) > self.max_users_per_guild:
+                users.popitem(last=False)
+                self.evictions += 1
+        else:
+            users.move_to_end(user_id)
+        timestamps.append(now)
+        return len(timestamps) == self.limit and now - timestamps[0] <= self.window
+
+    def sweep(self, now=None):
+        """Forget users (and guilds) with no message inside the window; returns how many users went"""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        for guild_id in list(self._guilds):
+            users = self._guilds[guild_id]
+            # Least recently active first, so stop at the first user still inside the window
+            while users:
+                user_id, timestamps = next(iter(users.items()))
+                if now - timestamps[-1] <= self.window:
+                    break
+                users.popitem(last=False)
+                removed += 1
+            if not users:
+                del self._guilds[guild_id]
+        self.swept += removed
+        return removed
+
+    def forget_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def stats(self):
+        users = sum(len(guild_users) for guild_users in self._guilds.values())
+        approx_bytes = sys.getsizeof(self._guilds) + sum(
+            sys.getsizeof(guild_users) + sum(sys.getsizeof(timestamps) for timestamps in guild_users.values())
+            for guild_users in self._guilds.values()
+        )
+        return {
+            "guilds": len(self._guilds),
+            "users": users,
+            "approx_bytes": approx_bytes,
+            "evictions": self.evictions,
+            "swept": self.swept,
+        }
+
+
+class GuildRules:
+    """One guild's automod settings, resolved once"""
+
+    def __init__(self, config, word_filter):
+        self.spam_detection = config["spam_detection"]
+        self.caps_detection = config["caps_detection"]
+        self.emoji_spam_detection = config["emoji_spam_detection"]
+        self.link_filtering = config["link_filtering"]
+        self.allowed_domains = tuple(domain.lower() for domain in config["allowed_domains"])
+        self.caps_threshold = config["caps_threshold"]
+        self.emoji_threshold = config["emoji_threshold"]
+        self.word_filter = word_filter
+        # Nothing but spam tracking to do for most guilds
+        self.any_content_checks = (self.caps_detection or self.emoji_spam_detection
+                                   or self.link_filtering or self.word_filter)
+
+    def has_blocked_link(self, content):
+        """True if the message links anywhere outside the allowed domains (all links when none are set)"""
+        for domain in link_domains(content):
+            if not any(allowed in domain for allowed in self.allowed_domains):
+                return True
+        return False
+
+
+class AutomodEngine:
+    def __init__(self, forbidden_words):
+        self.words = WordMatcher(forbidden_words)
+        # guild_id (str) -> GuildRules
+        self._rules = {}
+
+    def rules(self, guild_id, build):
+        """Compiled rules for a guild; build() -> (config dict, word filter on) is only called on a miss"""
+        rules = self._rules.get(guild_id)
+        if rules is None:
+            config, word_filter = build()
+            rules = self._rules[guild_id] = GuildRules(config, word_filter)
+        return rules
+
+    def invalidate(self, guild_id):
+        self._rules.pop(str(guild_id), None)
+
+    def forbidden_words(self, content):
+        return self.words.find(content.lower())
@@ -9,13 +9,15 @@ try:
 except ImportError:
     import config_fallback as config
 
-from db import get_user, update_user, get_all_users, get_team, get_all_teams, calculate_inventory_value, update_inventory_value
+from db import aget_user, aget_user_fields, aupdate_user, aadjust_user, asettle_bet, aclaim_reward, aget_all_users, arandom_user_id, aadd_item, aremove_item, aget_leaderboard, aget_team, calculate_inventory_value
 from datetime import datetime, timedelta
 import asyncio
 import os
 import random
 from cogs.pets import get_pet_by_name, get_pet_rarity_color
-import json
+import quests
+import combat
+import economy
 import calendar
 import time
 
@@ -37,6 +39,14 @@ SCP_LIST = [
     {"name": "SCP-409", "hp": 100, "atk": 19, "desc": "Crystal that causes living things to crystallize and shatter."}
 ]
 
+# The rare dangerous /recontainscp encounter; hp and atk are rolled from these ranges
+DANGEROUS_SCP = {
+    "name": "SCP-682 (Hard-to-Destroy Reptile)",
+    "hp": (500, 700),
+    "atk": (40, 60),
+    "desc": "Extremely dangerous and nearly impossible to destroy."
+}
+
 WEAPON_BONUS = {
     "Stun Baton": 5,
     "Pistol": 10,
@@ -45,6 +55,7 @@ WEAPON_BONUS = {
     "Rifle": 22,
 }
 SUIT_BONUS = 20  # Bonus HP for Containment Suit
+LEADERBOARD_PAGE_SIZE = 10
 
 GUN_CONDITIONS = ["Excellent", "Great", "Good", "Damaged", "Unrepairable"]
 
@@ -69,18 +80,6 @@ def get_gun_percentage(user_data, gun_name):
     gun_conditions = user_data.get("gun_conditions", {})
     return gun_conditions.get(gun_name, 100)  # Default 100%
 
-QUESTS_FILE = "quests.json"
-
-def load_quests():
-    if not os.path.exists(QUESTS_FILE):
-        return {}
-    with open(QUESTS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_quests(data):
-    with open(QUESTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
-
 # Utility function to check for boosts
 def apply_xp_boost(user_data, base_xp):
     if user_data.get("xp_boost", 0) > time.time():
@@ -92,17 +91,15 @@ def apply_credit_boost(user_data, base_credits):
         return int(base_credits * 2)
     return base_credits
 
-def check_level_up(interaction, user_data):
-    leveled_up = False
-    level_up_messages = []
+async def check_level_up(interaction, user_data):
     XP_PER_LEVEL = 100
-    while user_data.get("xp", 0) >= XP_PER_LEVEL:
-        user_data["xp"] -= XP_PER_LEVEL
-        user_data["level"] = user_data.get("level", 1) + 1
-        leveled_up = True
-        level_up_messages.append(user_data["level"])
-    if leveled_up:
-        update_user(interaction.user.id, xp=user_data["xp"], level=user_data["level"])
+    levels = (user_data.get("xp") or 0) // XP_PER_LEVEL
+    if levels > 0:
+        # Trade whole levels' worth of XP in one guarded update so overlapping rewards can't double-level
+        result = await aadjust_user(interaction.user.id, floor={"xp": 0}, xp=-levels * XP_PER_LEVEL, level=levels)
+        if result is None:
+            return None
+        user_data.update(result)
         embed = discord.Embed(
             title="🎉 Level Up!",
             description=f"Congratulations {interaction.user.mention}, you reached **Level {user_data['level']}**!",
@@ -125,21 +122,19 @@ class Game(commands.Cog):
             if user is None:
                 user = interaction.user
             print(f"[DEBUG] Fetching user data for {user.display_name} (ID: {user.id})")
-            user_data = get_user(user.id)
+            user_data = await aget_user(user.id)
             print(f"[DEBUG] User data: {user_data}")
             # Check mute status
             muted = False
             silly_message = None
-            if os.path.exists("muted.json"):
-                with open("muted.json", "r", encoding="utf-8") as f:
-                    muted_data = json.load(f)
-                if str(user.id) in muted_data:
-                    muted = True
-                    silly_options = [
-                        "Shhh! This user is on vocal lockdown. 🤫",
-                        "This player got hit with a mod mute. Sucks to be like that. LOL"
-                    ]
-                    silly_message = random.choice(silly_options)
+            moderation = self.bot.get_cog("Moderation")
+            if moderation and interaction.guild and moderation.mutes.is_muted(interaction.guild.id, user.id):
+                muted = True
+                silly_options = [
+                    "Shhh! This user is on vocal lockdown. 🤫",
+                    "This player got hit with a mod mute. Sucks to be like that. LOL"
+                ]
+                silly_message = random.choice(silly_options)
             # Equipped pet logic
             equipped_pets = user_data.get("equipped_pets", [])
             pet_objs = []
@@ -228,11 +223,11 @@ class Game(commands.Cog):
             print(f"[DEBUG] Team name: {team_name}")
             if team_name:
                 team_role = user_data.get("team_role", "Member")
-                team = get_team(team_name)
+                team = await aget_team(team_name)
                 print(f"[DEBUG] Team object: {team}")
                 team_points = team.get("points", 0) if team else 0
                 # Calculate team rank by points
-                all_teams = get_all_users()
+                all_teams = await aget_all_users()
                 print(f"[DEBUG] All teams: {all_teams}")
                 team_points_list = [u.get("team_points", 0) for u in all_teams if u.get("team") == team_name]
                 team_points_list.sort(reverse=True)
@@ -284,16 +279,14 @@ class Game(commands.Cog):
     @app_commands.command(name="mission", description="Complete a mission for XP")
     async def mission(self, interaction: discord.Interaction):
         print(f"[DEBUG] /mission called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
-        user_data["xp"] = user_data.get("xp", 0) + 10
-        update_user(interaction.user.id, xp=user_data["xp"])
+        user_data = await aadjust_user(interaction.user.id, xp=10)
         embed = discord.Embed(
             description=f"{interaction.user.mention}, you gained 10 XP! (Total: {user_data['xp']})",
             color=discord.Color.green()
         )
         await interaction.response.send_message(embed=embed, ephemeral=True)
         # Level up check
-        levelup_embed = check_level_up(interaction, user_data)
+        levelup_embed = await check_level_up(interaction, user_data)
         if levelup_embed:
             try:
                 await interaction.followup.send(embed=levelup_embed)
@@ -314,14 +307,11 @@ class Game(commands.Cog):
             event_type = random.choice(["vault", "008"])
             if event_type == "vault":
                 # Vault Air Drop: Give a random user a keycard
-                all_users = get_all_users()
-                lucky_user = random.choice(all_users)
+                lucky_id = await arandom_user_id() or interaction.user.id
                 keycard = random.choice(["Keycard Level 2", "Keycard Level 3"])
-                inventory = lucky_user.get("inventory", [])
-                inventory.append(keycard)
-                update_user(lucky_user["id"], inventory=inventory)
-                member = interaction.guild.get_member(lucky_user["id"])
-                name = member.display_name if member else f"User {lucky_user['id']}"
+                await aadd_item(lucky_id, keycard)
+                member = interaction.guild.get_member(lucky_id)
+                name = member.display_name if member else f"User {lucky_id}"
                 event_embed = discord.Embed(
                     title="🚁 Vault Air Drop!",
                     description=f"A supply drop has landed! {name} found a **{keycard}**!",
@@ -330,7 +320,8 @@ class Game(commands.Cog):
                 await interaction.followup.send(embed=event_embed)
             else:
                 # SCP-008 Breach Event
-                has_suit = "Containment Suit" in user_data.get("inventory", [])
+                suit_data = await aget_user_fields(interaction.user.id, "inventory")
+                has_suit = "Containment Suit" in suit_data.get("inventory", [])
                 if has_suit:
                     event_embed = discord.Embed(
                         title="☣️ SCP-008 Breach!",
@@ -340,8 +331,7 @@ class Game(commands.Cog):
                 else:
                     # Apply a penalty or just a message
                     penalty = 50
-                    user_data["credits"] = max(0, user_data.get("credits", 0) - penalty)
-                    update_user(interaction.user.id, credits=user_data["credits"])
+                    await aadjust_user(interaction.user.id, floor=0, clamp=True, credits=-penalty)
                     event_embed = discord.Embed(
                         title="☣️ SCP-008 Breach!",
                         description=f"SCP-008 has breached containment! You were exposed and lost {penalty} credits. (Get a Containment Suit to protect yourself.)",
@@ -353,7 +343,7 @@ class Game(commands.Cog):
     async def daily(self, interaction: discord.Interaction):
         print(f"[DEBUG] /daily called by {interaction.user}")
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user_fields(interaction.user.id, "last_daily", "daily_streak")
             now = datetime.utcnow()
             last_daily = user_data.get("last_daily")
             daily_streak = user_data.get("daily_streak", 0)
@@ -396,35 +386,16 @@ class Game(commands.Cog):
                 # Increment streak
                 daily_streak += 1
                 
-                # Calculate base reward and streak multiplier
-                base_reward = 100
-                streak_multiplier = min(1 + (daily_streak - 1) * 0.1, 2.0)  # Max 2x multiplier at 11+ days
-                total_reward = int(base_reward * streak_multiplier)
+                # Calculate base reward, streak multiplier and milestone bonus
+                base_reward = economy.DAILY_STREAK["base"]
+                streak_multiplier, bonus_reward, total_reward = economy.streak_reward(economy.DAILY_STREAK, daily_streak)
+                bonus_message = f"🎉 **{daily_streak}-Day Streak Bonus:** +{bonus_reward} credits!" if bonus_reward else ""
                 
-                # Bonus rewards for milestone streaks
-                bonus_reward = 0
-                bonus_message = ""
-                
-                if daily_streak == 7:
-                    bonus_reward = 200
-                    bonus_message = "🎉 **7-Day Streak Bonus:** +200 credits!"
-                elif daily_streak == 14:
-                    bonus_reward = 500
-                    bonus_message = "🎉 **14-Day Streak Bonus:** +500 credits!"
-                elif daily_streak == 30:
-                    bonus_reward = 1000
-                    bonus_message = "🎉 **30-Day Streak Bonus:** +1000 credits!"
-                elif daily_streak == 100:
-                    bonus_reward = 5000
-                    bonus_message = "🎉 **100-Day Streak Bonus:** +5000 credits!"
-                
-                total_reward += bonus_reward
-                
-                # Update user data
-                user_data["credits"] = user_data.get("credits", 0) + total_reward
-                user_data["last_daily"] = now.isoformat()
-                user_data["daily_streak"] = daily_streak
-                update_user(interaction.user.id, credits=user_data["credits"], last_daily=user_data["last_daily"], daily_streak=daily_streak)
+                # Claim, save the streak and pay in one statement; a claim that lost a race gets nothing
+                if await aclaim_reward(interaction.user.id, "last_daily", "daily_streak", last_daily, now,
+                                       timedelta(days=1), daily_streak, total_reward) is None:
+                    await interaction.response.send_message("⏳ You have already claimed your daily.", ephemeral=True)
+                    return
                 
                 # Create embed
                 embed = discord.Embed(
@@ -462,7 +433,7 @@ class Game(commands.Cog):
     async def weekly(self, interaction: discord.Interaction):
         print(f"[DEBUG] /weekly called by {interaction.user}")
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user_fields(interaction.user.id, "last_weekly", "weekly_streak")
             now = datetime.utcnow()
             last_weekly = user_data.get("last_weekly")
             weekly_streak = user_data.get("weekly_streak", 0)
@@ -505,35 +476,17 @@ class Game(commands.Cog):
                 # Increment streak
                 weekly_streak += 1
                 
-                # Calculate base reward and streak multiplier
-                base_reward = 500
-                streak_multiplier = min(1 + (weekly_streak - 1) * 0.2, 3.0)  # Max 3x multiplier at 11+ weeks
-                total_reward = int(base_reward * streak_multiplier)
+                # Calculate base reward, streak multiplier and milestone bonus
+                base_reward = economy.WEEKLY_STREAK["base"]
+                streak_multiplier, bonus_reward, total_reward = economy.streak_reward(economy.WEEKLY_STREAK, weekly_streak)
+                streak_label = "1-Year" if weekly_streak == 52 else f"{weekly_streak}-Week"
+                bonus_message = f"🎉 **{streak_label} Streak Bonus:** +{bonus_reward} credits!" if bonus_reward else ""
                 
-                # Bonus rewards for milestone streaks
-                bonus_reward = 0
-                bonus_message = ""
-                
-                if weekly_streak == 4:
-                    bonus_reward = 1000
-                    bonus_message = "🎉 **4-Week Streak Bonus:** +1000 credits!"
-                elif weekly_streak == 8:
-                    bonus_reward = 2500
-                    bonus_message = "🎉 **8-Week Streak Bonus:** +2500 credits!"
-                elif weekly_streak == 12:
-                    bonus_reward = 5000
-                    bonus_message = "🎉 **12-Week Streak Bonus:** +5000 credits!"
-                elif weekly_streak == 52:
-                    bonus_reward = 25000
-                    bonus_message = "🎉 **1-Year Streak Bonus:** +25000 credits!"
-                
-                total_reward += bonus_reward
-                
-                # Update user data
-                user_data["credits"] = user_data.get("credits", 0) + total_reward
-                user_data["last_weekly"] = now.isoformat()
-                user_data["weekly_streak"] = weekly_streak
-                update_user(interaction.user.id, credits=user_data["credits"], last_weekly=user_data["last_weekly"], weekly_streak=weekly_streak)
+                # Claim, save the streak and pay in one statement; a claim that lost a race gets nothing
+                if await aclaim_reward(interaction.user.id, "last_weekly", "weekly_streak", last_weekly, now,
+                                       timedelta(days=7), weekly_streak, total_reward) is None:
+                    await interaction.response.send_message("⏳ You have already claimed your weekly.", ephemeral=True)
+                    return
                 
                 # Create embed
                 embed = discord.Embed(
@@ -567,17 +520,26 @@ class Game(commands.Cog):
             except Exception:
                 pass
 
-    @app_commands.command(name="leaderboard", description="Show the top 10 users by level")
-    async def leaderboard(self, interaction: discord.Interaction):
+    @app_commands.command(name="leaderboard", description="Show the top 10 users in this server by level")
+    @app_commands.describe(page="Leaderboard page to show (default: 1)")
+    async def leaderboard(self, interaction: discord.Interaction, page: int = 1):
         print(f"[DEBUG] /leaderboard called by {interaction.user}")
-        users = get_all_users()
-        # Sort by level (primary), then XP (secondary), then credits (tertiary)
-        users.sort(key=lambda u: (u.get("level", 1), u.get("xp", 0), u.get("credits", 0)), reverse=True)
+        page = max(page, 1)
+        offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+        # Rank only this server's members; in DMs fall back to everyone.
+        # guild.members is only complete with the members intent (hanuko_bot.py enables Intents.all(),
+        # and Server Members Intent must stay switched on in the developer portal) - without it this
+        # server's board would silently shrink to whoever happens to be cached. Bots never play.
+        member_ids = [m.id for m in interaction.guild.members if not m.bot] if interaction.guild else None
+        users = await aget_leaderboard(LEADERBOARD_PAGE_SIZE, offset, member_ids)
+        title = "🏆 Leaderboard (Top 10 by Level)" if page == 1 else f"🏆 Leaderboard (Page {page})"
         embed = discord.Embed(
-            title="🏆 Leaderboard (Top 10 by Level)",
+            title=title,
             color=config.EMBED_COLORS["info"]
         )
-        for i, user in enumerate(users[:10], 1):
+        if not users:
+            embed.description = "No users on this page yet."
+        for i, user in enumerate(users, offset + 1):
             member = interaction.guild.get_member(user["id"]) if interaction.guild else None
             if member:
                 name = f"**{member.display_name}**"
@@ -585,7 +547,7 @@ class Game(commands.Cog):
                 name = f"**Unknown User ({user['id']})**"
             embed.add_field(
                 name=f"#{i}",
-                value=f"{name}\nLevel: {user.get('level', 1)} | XP: {user.get('xp', 0)} | Credits: {user.get('credits', 0)}",
+                value=f"{name}\nLevel: {user.get('level') or 1} | XP: {user.get('xp') or 0} | Credits: {user.get('credits') or 0}",
                 inline=False
             )
         await interaction.response.send_message(embed=embed)
@@ -597,30 +559,16 @@ class Game(commands.Cog):
             # Defer the interaction to avoid timeout issues
             await interaction.response.defer()
             # Daily quest progress update
-            quests = load_quests()
-            user_id = str(interaction.user.id)
-            today = datetime.utcnow().strftime("%Y-%m-%d")
-            user_quests = quests.get(user_id, {"daily": {"date": today, "recontain": 0, "claimed": False}})
-            # Reset if new day
-            if user_quests["daily"].get("date") != today:
-                user_quests["daily"] = {"date": today, "recontain": 0, "claimed": False}
-            user_quests["daily"]["recontain"] += 1
-            quests[user_id] = user_quests
-            save_quests(quests)
-            user_data = get_user(interaction.user.id)
+            await quests.record(interaction.user.id, quests.EVENT_RECONTAIN)
+            user_data = await aget_user(interaction.user.id)
             inventory = user_data.get("inventory", [])
             damaged_items = user_data.get("damaged_items")
             if not isinstance(damaged_items, list):
                 damaged_items = []
             # Determine if rare dangerous battle (10% chance)
-            is_dangerous = random.random() < 0.10
+            is_dangerous = random.random() < economy.RECONTAIN_DANGEROUS_CHANCE
             if is_dangerous:
-                scp = {
-                    "name": "SCP-682 (Hard-to-Destroy Reptile)",
-                    "hp": 500 + random.randint(0, 200),
-                    "atk": 40 + random.randint(0, 20),
-                    "desc": "Extremely dangerous and nearly impossible to destroy."
-                }
+                scp = dict(DANGEROUS_SCP, hp=random.randint(*DANGEROUS_SCP["hp"]), atk=random.randint(*DANGEROUS_SCP["atk"]))
             else:
                 scp = random.choice(SCP_LIST)
             scp_hp = scp["hp"]
@@ -641,9 +589,10 @@ class Game(commands.Cog):
                 cond = get_gun_condition(user_data, equipped_weapon)
                 if cond == "Unrepairable":
                     inventory.remove(equipped_weapon)
+                    await aremove_item(interaction.user.id, equipped_weapon)
                     if user_data.get("equipped_gun") == equipped_weapon:
                         user_data["equipped_gun"] = None
-                    update_user(interaction.user.id, inventory=inventory, equipped_gun=user_data.get("equipped_gun"))
+                        await aupdate_user(interaction.user.id, equipped_gun=None)
                     weapon_removed_message = f"❌ Your {equipped_weapon} became unrepairable and was removed from your inventory!"
                     equipped_weapon = None
             if equipped_weapon:
@@ -671,55 +620,40 @@ class Game(commands.Cog):
             log = [f"You encounter **{scp['name']}**! {scp['desc']}",
                    f"Your HP: {user_hp} | ATK: {user_atk}{pet_info}",
                    f"SCP HP: {scp_hp} | ATK: {scp_atk}"]
-            turn = 1
-            u_hp, s_hp = user_hp, scp_hp
-            weapon_damaged = False
-            while u_hp > 0 and s_hp > 0 and turn <= 20:
-                # User attacks
-                if equipped_weapon:
-                    dmg = random.randint(int(user_atk*0.8), int(user_atk*1.2))
-                    s_hp -= dmg
-                    log.append(f"Turn {turn}: You attack {scp['name']} for {dmg} damage! SCP HP: {max(s_hp,0)}")
+            attackers = ([("You", user_atk)] if equipped_weapon else []) + [(pet_obj["name"], pet_obj["atk"]) for pet_obj in pet_objs]
+            player_side = combat.side("You", user_hp, *attackers)
+            scp_side = combat.side(scp["name"], scp_hp, (scp["name"], scp_atk))
+            outcome, hits = combat.fight_log(player_side, scp_side, max_turns=20)
+            turn = 0
+            for hit in hits:
+                if hit.turn != turn:
+                    turn = hit.turn
+                    if not equipped_weapon:
+                        log.append(f"Turn {turn}:DANGER! You have no usable weapon!")
+                if hit.side == "b":
+                    log.append(f"Turn {turn}: {scp['name']} attacks you for {hit.damage} damage! Your HP: {hit.target_hp}")
+                elif equipped_weapon and hit.attacker == 0:
+                    log.append(f"Turn {turn}: You attack {scp['name']} for {hit.damage} damage! SCP HP: {hit.target_hp}")
                 else:
-                    log.append(f"Turn {turn}:DANGER! You have no usable weapon!")
-                # Pet attacks (if present)
-                if pet_objs and s_hp > 0:
-                    for pet_obj in pet_objs:
-                        if s_hp <= 0:
-                            break
-                        pet_dmg = random.randint(int(pet_obj["atk"]*0.8), int(pet_obj["atk"]*1.2))
-                        s_hp -= pet_dmg
-                        log.append(f"Turn {turn}: Your pet {pet_obj['name']} attacks {scp['name']} for {pet_dmg} damage! SCP HP: {max(s_hp,0)}")
-                if s_hp <= 0:
-                    break
-                # SCP attacks
-                dmg = random.randint(int(scp_atk*0.8), int(scp_atk*1.2))
-                u_hp -= dmg
-                log.append(f"Turn {turn}: {scp['name']} attacks you for {dmg} damage! Your HP: {max(u_hp,0)}")
-                turn += 1
+                    log.append(f"Turn {turn}: Your pet {player_side.attackers[hit.attacker].name} attacks {scp['name']} for {hit.damage} damage! SCP HP: {hit.target_hp}")
+            weapon_damaged = False
             # Result and rewards
             reward_xp = 0
             reward_credits = 0
             gun_condition_changed = False
             levelup_embed = None
-            if u_hp > 0 and s_hp <= 0:
-                if is_dangerous:
-                    reward_xp = 50
-                    reward_credits = 200
-                else:
-                    reward_xp = 20
-                    reward_credits = 75
+            if outcome.winner == "a":
+                reward_xp = economy.RECONTAIN_REWARDS[is_dangerous]["xp"]
+                reward_credits = economy.RECONTAIN_REWARDS[is_dangerous]["credits"]
                 reward_xp = apply_xp_boost(user_data, reward_xp)
                 reward_credits = apply_credit_boost(user_data, reward_credits)
-                user_data["xp"] = user_data.get("xp", 0) + reward_xp
-                user_data["credits"] = user_data.get("credits", 0) + reward_credits
-                update_user(interaction.user.id, xp=user_data["xp"], credits=user_data["credits"])
+                user_data.update(await aadjust_user(interaction.user.id, xp=reward_xp, credits=reward_credits))
                 result = f"✅ You successfully recontained {scp['name']}!\nYou earned {reward_xp} XP and {reward_credits} credits."
                 color = discord.Color.green()
                 # Level up check
-                levelup_embed = check_level_up(interaction, user_data)
+                levelup_embed = await check_level_up(interaction, user_data)
                 print(f"[DEBUG] levelup_embed: {levelup_embed} (type: {type(levelup_embed)})")
-            elif s_hp > 0 and u_hp <= 0:
+            elif outcome.winner == "b":
                 # Gun break logic: 30% chance to degrade equipped gun
                 gun_status_msg = ""
                 if equipped_weapon:
@@ -742,18 +676,15 @@ class Game(commands.Cog):
                             if user_data.get("equipped_gun") == equipped_weapon:
                                 user_data["equipped_gun"] = None
                             log.append(f"❌ Your {equipped_weapon} became unrepairable and was removed from your inventory!")
-                            update_user(interaction.user.id, gun_conditions=gun_conditions, inventory=inventory, equipped_gun=user_data.get("equipped_gun"))
+                            await aremove_item(interaction.user.id, equipped_weapon)
+                            await aupdate_user(interaction.user.id, gun_conditions=gun_conditions, equipped_gun=user_data.get("equipped_gun"))
                         else:
-                            update_user(interaction.user.id, gun_conditions=gun_conditions)
+                            await aupdate_user(interaction.user.id, gun_conditions=gun_conditions)
                     
                     gun_status_msg = f"\nYour {equipped_weapon} status is **{current_condition}** ({current_percentage}%)."
                 # Deduct credits based on SCP difficulty
-                if is_dangerous:
-                    loss_credits = 100
-                else:
-                    loss_credits = 30
-                user_data["credits"] = max(0, user_data.get("credits", 0) - loss_credits)
-                update_user(interaction.user.id, credits=user_data["credits"])
+                loss_credits = economy.RECONTAIN_REWARDS[is_dangerous]["loss"]
+                await aadjust_user(interaction.user.id, floor=0, clamp=True, credits=-loss_credits)
                 result = f"❌ You were defeated by {scp['name']}! You lost {loss_credits} credits.{gun_status_msg}"
                 color = discord.Color.red()
             else:
@@ -761,7 +692,7 @@ class Game(commands.Cog):
                 color = discord.Color.orange()
             # Save damaged items if changed
             if weapon_damaged:
-                update_user(interaction.user.id, damaged_items=damaged_items)
+                await aupdate_user(interaction.user.id, damaged_items=damaged_items)
             embed = discord.Embed(title=f"Containment Battle: {scp['name']}", description="\n".join(log), color=color)
             embed.add_field(name="Result", value=result, inline=False)
             
@@ -806,7 +737,7 @@ class Game(commands.Cog):
     @app_commands.describe(item="The name of the weapon to repair")
     async def gunsmith(self, interaction: discord.Interaction, item: str):
         print(f"[DEBUG] /gunsmith called by {interaction.user} for {item}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         inventory = user_data.get("inventory", [])
         damaged_items = user_data.get("damaged_items")
         if not isinstance(damaged_items, list):
@@ -815,10 +746,9 @@ class Game(commands.Cog):
         cond = gun_conditions.get(item, "Excellent")
         if cond == "Unrepairable":
             if item in inventory:
-                inventory.remove(item)
+                await aremove_item(interaction.user.id, item)
                 if user_data.get("equipped_gun") == item:
-                    user_data["equipped_gun"] = None
-                update_user(interaction.user.id, inventory=inventory, equipped_gun=user_data.get("equipped_gun"))
+                    await aupdate_user(interaction.user.id, equipped_gun=None)
             await interaction.response.send_message(f"❌ {item} is unrepairable and has been removed from your inventory.", ephemeral=True)
             return
         # Find item in shop
@@ -831,12 +761,11 @@ class Game(commands.Cog):
             await interaction.response.send_message(f"'{item}' is not damaged.", ephemeral=True)
             return
         cost = int(weapon["price"] * 0.1)
-        if user_data.get("credits", 0) < cost:
+        if await aadjust_user(interaction.user.id, floor=0, credits=-cost) is None:
             await interaction.response.send_message(f"❌ You need {cost} credits to repair '{item}'.", ephemeral=True)
             return
-        user_data["credits"] -= cost
         damaged_items.remove(item)
-        update_user(interaction.user.id, credits=user_data["credits"], damaged_items=damaged_items)
+        await aupdate_user(interaction.user.id, damaged_items=damaged_items)
         cond = gun_conditions.get(item, "Excellent")
         embed = discord.Embed(description=f"🛠️ You repaired **{item} [{cond}]** for {cost} credits!", color=discord.Color.green())
         await interaction.response.send_message(embed=embed)
@@ -844,7 +773,7 @@ class Game(commands.Cog):
     @app_commands.command(name="checkgun", description="Check the condition of a gun you own")
     @app_commands.describe(gun="The name of the gun to check")
     async def checkgun(self, interaction: discord.Interaction, gun: str):
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         if gun not in user_data.get("inventory", []):
             await interaction.response.send_message(f"❌ You do not own '{gun}'.", ephemeral=True)
             return
@@ -868,7 +797,7 @@ class Game(commands.Cog):
     async def checkcredits(self, interaction: discord.Interaction, user: discord.Member = None, public: bool = False):
         if user is None:
             user = interaction.user
-        user_data = get_user(user.id)
+        user_data = await aget_user_fields(user.id, "credits")
         credits = user_data.get("credits", 0)
         embed = discord.Embed(
             title=f"💰 Credits for {user.display_name}",
@@ -879,66 +808,24 @@ class Game(commands.Cog):
 
     @app_commands.command(name="quest", description="View and claim your daily, weekly, and monthly quest rewards")
     async def quest(self, interaction: discord.Interaction):
-        quests = load_quests()
-        user_id = str(interaction.user.id)
-        today = datetime.utcnow().strftime("%Y-%m-%d")
-        week = datetime.utcnow().strftime("%Y-W%U")
-        month = datetime.utcnow().strftime("%Y-%m")
-        user_quests = quests.get(user_id, {})
-        # Daily
-        if "daily" not in user_quests or user_quests["daily"].get("date") != today:
-            user_quests["daily"] = {"date": today, "recontain": 0, "claimed": False}
-        # Weekly
-        if "weekly" not in user_quests or user_quests["weekly"].get("week") != week:
-            user_quests["weekly"] = {"week": week, "petbattle": 0, "claimed": False}
-        # Monthly
-        if "monthly" not in user_quests or user_quests["monthly"].get("month") != month:
-            user_quests["monthly"] = {"month": month, "adopt": 0, "claimed": False}
-        # Daily quest
-        daily_progress = user_quests["daily"]["recontain"]
-        daily_claimed = user_quests["daily"]["claimed"]
-        # Weekly quest
-        weekly_progress = user_quests["weekly"]["petbattle"]
-        weekly_claimed = user_quests["weekly"]["claimed"]
-        # Monthly quest
-        monthly_progress = user_quests["monthly"]["adopt"]
-        monthly_claimed = user_quests["monthly"]["claimed"]
+        user_progress = await quests.progress(interaction.user.id)
         embed = discord.Embed(title="📅 Quests", color=discord.Color.green())
-        # Daily
-        embed.add_field(name="Daily Quest", value=f"Complete 5 recontainment battles (/recontainscp)\nProgress: {daily_progress}/5\nStatus: {'✅ Claimed' if daily_claimed else ('🎉 Ready to claim!' if daily_progress >= 5 else '❌ Not completed')}", inline=False)
-        # Weekly
-        embed.add_field(name="Weekly Quest", value=f"Win 10 pet battles (/petbattle)\nProgress: {weekly_progress}/10\nStatus: {'✅ Claimed' if weekly_claimed else ('🎉 Ready to claim!' if weekly_progress >= 10 else '❌ Not completed')}", inline=False)
-        # Monthly
-        embed.add_field(name="Monthly Quest", value=f"Adopt 10 pets (/adoptpet or /premiumpets)\nProgress: {monthly_progress}/10\nStatus: {'✅ Claimed' if monthly_claimed else ('🎉 Ready to claim!' if monthly_progress >= 10 else '❌ Not completed')}", inline=False)
+        for period, quest in quests.QUESTS.items():
+            count, claimed = user_progress[period]
+            target = quest["target"]
+            status = '✅ Claimed' if claimed else ('🎉 Ready to claim!' if count >= target else '❌ Not completed')
+            embed.add_field(name=quest["title"], value=f"{quest['description']}\nProgress: {count}/{target}\nStatus: {status}", inline=False)
         # Claim rewards if ready
-        reward_msgs = []
-        user_data = get_user(interaction.user.id)
-        # Daily
-        if not daily_claimed and daily_progress >= 5:
-            user_data["credits"] = user_data.get("credits", 0) + 100
-            user_quests["daily"]["claimed"] = True
-            reward_msgs.append("Daily: 100 credits")
-        # Weekly
-        if not weekly_claimed and weekly_progress >= 10:
-            user_data["credits"] = user_data.get("credits", 0) + 500
-            user_quests["weekly"]["claimed"] = True
-            reward_msgs.append("Weekly: 500 credits")
-        # Monthly
-        if not monthly_claimed and monthly_progress >= 10:
-            user_data["credits"] = user_data.get("credits", 0) + 2000
-            user_quests["monthly"]["claimed"] = True
-            reward_msgs.append("Monthly: 2000 credits")
-        if reward_msgs:
-            update_user(interaction.user.id, credits=user_data["credits"])
+        rewards = await quests.claim(interaction.user.id)
+        if rewards:
+            reward_msgs = [f"{period.capitalize()}: {reward} credits" for period, reward in rewards]
             embed.add_field(name="Rewards Claimed!", value="\n".join(reward_msgs), inline=False)
-        quests[user_id] = user_quests
-        save_quests(quests)
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
     @app_commands.command(name="scp914", description="Gamble your credits in SCP-914! Choose a setting for different odds.")
     @app_commands.describe(bet="Amount of credits to gamble (or 'all')", setting="SCP-914 setting: rough, coarse, 1:1, fine, very fine")
     async def scp914(self, interaction: discord.Interaction, bet: str, setting: str):
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user_fields(interaction.user.id, "credits")
         if bet.lower() == "all":
             bet = user_data.get("credits", 0)
         else:
@@ -953,13 +840,7 @@ class Game(commands.Cog):
         if user_data.get("credits", 0) < bet:
             await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
             return
-        settings = {
-            "rough": {"win_chance": 0.10, "multiplier": 10, "desc": "You risk it all for a huge reward!"},
-            "coarse": {"win_chance": 0.25, "multiplier": 4, "desc": "A dangerous gamble for a big payout."},
-            "1:1": {"win_chance": 0.5, "multiplier": 2, "desc": "A fair 50/50 shot."},
-            "fine": {"win_chance": 0.7, "multiplier": 1.5, "desc": "Safer, but smaller reward."},
-            "very fine": {"win_chance": 0.9, "multiplier": 1.2, "desc": "Almost safe, but not much gain."}
-        }
+        settings = economy.SCP914_SETTINGS
         setting = setting.lower()
         if setting not in settings:
             await interaction.response.send_message("Invalid setting. Choose from: rough, coarse, 1:1, fine, very fine.", ephemeral=True)
@@ -968,26 +849,27 @@ class Game(commands.Cog):
             await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
             return
         odds = settings[setting]
-        import random
-        win = random.random() < odds["win_chance"]
-        if win:
-            winnings = int(bet * odds["multiplier"])
-            user_data["credits"] = user_data.get("credits", 0) - bet + winnings
-            update_user(interaction.user.id, credits=user_data["credits"])
+        result, multiplier = economy.roll(economy.scp914_outcomes(setting))
+        if result == "win":
+            winnings = economy.payout(bet, multiplier)
+            payout = winnings
             msg = f"🛠️ You placed {bet} credits into SCP-914 on **{setting.title()}**. {odds['desc']}\n\n**Success!** You received {winnings} credits!"
             color = discord.Color.green()
         else:
-            user_data["credits"] = user_data.get("credits", 0) - bet
-            update_user(interaction.user.id, credits=user_data["credits"])
+            payout = 0
             msg = f"🛠️ You placed {bet} credits into SCP-914 on **{setting.title()}**. {odds['desc']}\n\n**Failure!** You lost your bet."
             color = discord.Color.red()
+        if await asettle_bet(interaction.user.id, bet, payout) is None:
+            # Balance changed since the check above (e.g. an overlapping gamble)
+            await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
+            return
         embed = discord.Embed(title="SCP-914: The Clockworks", description=msg, color=color)
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="scp294", description="Order a mystery drink from SCP-294 for a random outcome!")
     @app_commands.describe(bet="Amount of credits to gamble (or 'all')")
     async def scp294(self, interaction: discord.Interaction, bet: str):
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user_fields(interaction.user.id, "credits")
         if bet.lower() == "all":
             bet = user_data.get("credits", 0)
         else:
@@ -1002,48 +884,36 @@ class Game(commands.Cog):
         if user_data.get("credits", 0) < bet:
             await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
             return
-        outcomes = [
-            ("win", 0.25),  # 25% win double
-            ("lose", 0.5),  # 50% lose all
-            ("item", 0.15), # 15% get a random item
-            ("funny", 0.1)  # 10% funny message
-        ]
-        roll = random.random()
-        acc = 0
-        for outcome, chance in outcomes:
-            acc += chance
-            if roll < acc:
-                result = outcome
-                break
+        result, multiplier = economy.roll(economy.SCP294_OUTCOMES)
         if result == "win":
-            winnings = bet * 2
-            user_data["credits"] = user_data.get("credits", 0) - bet + winnings
-            update_user(interaction.user.id, credits=user_data["credits"])
+            winnings = economy.payout(bet, multiplier)
+            payout = winnings
             msg = f"☕ SCP-294 dispenses a mysterious drink... It's lucky! You win {winnings} credits!"
             color = discord.Color.green()
         elif result == "lose":
-            user_data["credits"] = user_data.get("credits", 0) - bet
-            update_user(interaction.user.id, credits=user_data["credits"])
+            payout = 0
             msg = f"☕ SCP-294 dispenses a foul-tasting drink. You lose your bet."
             color = discord.Color.red()
         elif result == "item":
             # Give a random item (for demo, just a message)
-            user_data["credits"] = user_data.get("credits", 0) - bet
-            update_user(interaction.user.id, credits=user_data["credits"])
+            payout = 0
             msg = f"☕ SCP-294 dispenses a strange item! (But it's just a collectible cup for now.)"
             color = discord.Color.blurple()
         else:
-            user_data["credits"] = user_data.get("credits", 0) - bet
-            update_user(interaction.user.id, credits=user_data["credits"])
+            payout = 0
             msg = f"☕ SCP-294 dispenses... nothing? The machine beeps and displays: 'OUT OF ORDER'."
             color = discord.Color.orange()
+        if await asettle_bet(interaction.user.id, bet, payout) is None:
+            # Balance changed since the check above (e.g. an overlapping gamble)
+            await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
+            return
         embed = discord.Embed(title="SCP-294: The Coffee Machine", description=msg, color=color)
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="scp963", description="Flip Dr. Bright's Coin of Fate!")
     @app_commands.describe(bet="Amount of credits to gamble (or 'all')", side="Choose heads or tails")
     async def scp963(self, interaction: discord.Interaction, bet: str, side: str):
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user_fields(interaction.user.id, "credits")
         if bet.lower() == "all":
             bet = user_data.get("credits", 0)
         else:
@@ -1062,37 +932,32 @@ class Game(commands.Cog):
         if side not in ["heads", "tails"]:
             await interaction.response.send_message("You must choose 'heads' or 'tails'!", ephemeral=True)
             return
-        roll = random.random()
-        if roll < 0.48:
-            result = "heads"
-        elif roll < 0.96:
-            result = "tails"
-        else:
-            result = "edge"
+        result, multiplier = economy.roll(economy.scp963_outcomes(side))
         if result == side:
-            winnings = bet * 2
-            user_data["credits"] = user_data.get("credits", 0) - bet + winnings
-            update_user(interaction.user.id, credits=user_data["credits"])
+            winnings = economy.payout(bet, multiplier)
+            payout = winnings
             msg = f"🪙 The coin lands on **{result}**! You guessed right and win {winnings} credits!"
             color = discord.Color.green()
         elif result == "edge":
-            winnings = bet * 10
-            user_data["credits"] = user_data.get("credits", 0) - bet + winnings
-            update_user(interaction.user.id, credits=user_data["credits"])
+            winnings = economy.payout(bet, multiplier)
+            payout = winnings
             msg = f"🪙 The coin lands on its edge! Dr. Bright laughs and gives you {winnings} credits!"
             color = discord.Color.gold()
         else:
-            user_data["credits"] = user_data.get("credits", 0) - bet
-            update_user(interaction.user.id, credits=user_data["credits"])
+            payout = 0
             msg = f"🪙 The coin lands on **{result}**. You guessed wrong and lose your bet."
             color = discord.Color.red()
+        if await asettle_bet(interaction.user.id, bet, payout) is None:
+            # Balance changed since the check above (e.g. an overlapping gamble)
+            await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
+            return
         embed = discord.Embed(title="SCP-963: Coin of Fate", description=msg, color=color)
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="scp999", description="Hug SCP-999 for a chance at a lucky reward!")
     @app_commands.describe(bet="Amount of credits to gamble (or 'all')")
     async def scp999(self, interaction: discord.Interaction, bet: str):
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user_fields(interaction.user.id, "credits")
         if bet.lower() == "all":
             bet = user_data.get("credits", 0)
         else:
@@ -1107,24 +972,25 @@ class Game(commands.Cog):
         if user_data.get("credits", 0) < bet:
             await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
             return
-        roll = random.random()
-        if roll < 0.7:
-            winnings = int(bet * 1.2)
-            user_data["credits"] = user_data.get("credits", 0) - bet + winnings
-            update_user(interaction.user.id, credits=user_data["credits"])
+        result, multiplier = economy.roll(economy.SCP999_OUTCOMES)
+        if result == "hug":
+            winnings = economy.payout(bet, multiplier)
+            payout = winnings
             msg = f"🧡 SCP-999 gives you a big, ticklish hug! You feel lucky and win {winnings} credits!"
             color = discord.Color.green()
-        elif roll < 0.9:
-            user_data["credits"] = user_data.get("credits", 0) - bet
-            update_user(interaction.user.id, credits=user_data["credits"])
+        elif result == "nothing":
+            payout = 0
             msg = f"🧡 SCP-999 hugs you, but nothing special happens. You lose your bet."
             color = discord.Color.orange()
         else:
-            winnings = bet * 5
-            user_data["credits"] = user_data.get("credits", 0) - bet + winnings
-            update_user(interaction.user.id, credits=user_data["credits"])
+            winnings = economy.payout(bet, multiplier)
+            payout = winnings
             msg = f"🧡 SCP-999 is extra bouncy today! You win {winnings} credits!"
             color = discord.Color.gold()
+        if await asettle_bet(interaction.user.id, bet, payout) is None:
+            # Balance changed since the check above (e.g. an overlapping gamble)
+            await interaction.response.send_message("You don't have enough credits to bet that amount!", ephemeral=True)
+            return
         embed = discord.Embed(title="SCP-999: The Tickle Monster", description=msg, color=color)
         await interaction.response.send_message(embed=embed)
 
@@ -1146,17 +1012,14 @@ class Game(commands.Cog):
         task_list = "\n".join([f"{i+1}. {task}" for i, task in enumerate(selected_tasks)])
         reward_xp = 5
         reward_credits = 10
-        user_data = get_user(interaction.user.id)
-        user_data["xp"] = user_data.get("xp", 0) + reward_xp
-        user_data["credits"] = user_data.get("credits", 0) + reward_credits
-        update_user(interaction.user.id, xp=user_data["xp"], credits=user_data["credits"])
+        user_data = await aadjust_user(interaction.user.id, xp=reward_xp, credits=reward_credits)
         embed = discord.Embed(
             title="🧹 Easy SCP Containment Tasks",
             description=f"Complete these 5 tasks to help the Foundation!\n\n{task_list}\n\n✅ All tasks completed! You earned {reward_xp} XP and {reward_credits} credits.",
             color=discord.Color.green()
         )
         # Level up check
-        levelup_embed = check_level_up(interaction, user_data)
+        levelup_embed = await check_level_up(interaction, user_data)
         await interaction.response.send_message(embed=embed)
         if levelup_embed:
             try:
@@ -1169,14 +1032,14 @@ class Game(commands.Cog):
     @app_commands.command(name="inventoryvalue", description="Check the total value of your inventory")
     async def inventoryvalue(self, interaction: discord.Interaction):
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user(interaction.user.id)
             inventory = user_data.get("inventory", [])
             
             # Calculate current inventory value
             current_value = calculate_inventory_value(inventory)
             
             # Update the database with the calculated value
-            update_user(interaction.user.id, inventory_value=current_value)
+            await aupdate_user(interaction.user.id, inventory_value=current_value)
             
             embed = discord.Embed(
                 title="💰 Inventory Value",
@@ -1226,62 +1089,45 @@ class Game(commands.Cog):
         GEAR_NAMES = [
             "Containment Suit", "Tactical Vest", "Night Vision Goggles", "Radio", "Binoculars", "Lockpick Set"
         ]
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         inventory = user_data.get("inventory", [])
         if gear not in inventory or gear not in GEAR_NAMES:
             await interaction.response.send_message(f"❌ You do not have '{gear}' in your inventory or it is not a valid gear item.", ephemeral=True)
             return
         user_data["equipped_gear"] = gear
-        update_user(interaction.user.id, equipped_gear=gear)
+        await aupdate_user(interaction.user.id, equipped_gear=gear)
         await interaction.response.send_message(f"✅ You have equipped '{gear}'.", ephemeral=True)
 
     @app_commands.command(name="gleaderboard", description="Show the global top 10 users across all servers")
-    async def gleaderboard(self, interaction: discord.Interaction):
+    @app_commands.describe(page="Leaderboard page to show (default: 1)")
+    async def gleaderboard(self, interaction: discord.Interaction, page: int = 1):
         print(f"[DEBUG] /gleaderboard called by {interaction.user}")
         try:
-            # Get all users from the database
-            all_users = get_all_users()
-            print(f"[DEBUG] get_all_users() returned: {all_users}")
-            if not all_users:
+            page = max(page, 1)
+            offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+            top_users = await aget_leaderboard(LEADERBOARD_PAGE_SIZE, offset)
+            if not top_users:
                 await interaction.response.send_message("❌ No users found in the global database.", ephemeral=True)
                 return
-            # Filter out users missing required fields
-            filtered_users = []
-            for u in all_users:
-                if not isinstance(u, dict):
-                    print(f"[DEBUG] Skipping non-dict user: {u}")
-                    continue
-                if "id" not in u:
-                    print(f"[DEBUG] Skipping user missing 'id': {u}")
-                    continue
-                filtered_users.append(u)
-            print(f"[DEBUG] Filtered users: {filtered_users}")
-            # Sort by level (primary), then XP (secondary), then credits (tertiary)
-            sorted_users = sorted(filtered_users, key=lambda x: (
-                x.get("level", 1), 
-                x.get("xp", 0), 
-                x.get("credits", 0)
-            ), reverse=True)
-            # Get top 10
-            top_10 = sorted_users[:10]
             embed = discord.Embed(
                 title="🌍 Global Leaderboard",
-                description="Top 10 players across all servers",
+                description="Top 10 players across all servers" if page == 1 else f"Page {page} of the global rankings",
                 color=discord.Color.gold()
             )
-            for i, user_data in enumerate(top_10, 1):
+            for i, user_data in enumerate(top_users, offset + 1):
                 user_id = user_data.get("id")
                 if not user_id:
                     continue
                 try:
-                    user = await self.bot.fetch_user(int(user_id))
+                    # Prefer the gateway cache; only hit the API for users the bot can't see
+                    user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(int(user_id))
                     username = user.display_name
                 except Exception as e:
                     print(f"[DEBUG] Could not fetch user {user_id}: {e}")
                     username = f"User {user_id}"
-                credits = user_data.get("credits", 0)
-                xp = user_data.get("xp", 0)
-                level = user_data.get("level", 1)
+                credits = user_data.get("credits") or 0
+                xp = user_data.get("xp") or 0
+                level = user_data.get("level") or 1
                 # Medal emojis for top 3
                 medal = ""
                 if i == 1:
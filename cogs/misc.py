@@ -10,64 +10,65 @@ except ImportError:
 
 import os
 import time
-import json
-from hanuko_bot import event_008_breach
 import logging
 from discord.ext.commands import BucketType, CommandOnCooldown
-from db import get_user, update_user
+from db import aget_user_fields, aadjust_user
+from afk_registry import AfkRegistry
+from message_pipeline import STAGE_AFK
+from poll_engine import PollEngine, build_poll_embed
+from autocomplete import autocomplete, PrefixIndex
 from datetime import datetime, timedelta
 import asyncio
 import re
 
-enabled_008_file = "008_enabled_guilds.json"
-vault_event_file = "vault_event_channels.json"
 afk_file = "afk_status.json"
-polls_file = "polls.json"
 ALLOWED_CHANNEL_ID = 123456789012345678  # Replace with your channel's ID
 
-def load_enabled_008():
-    if not os.path.exists(enabled_008_file):
-        return {}
-    with open(enabled_008_file, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_enabled_008(guild_ids):
-    with open(enabled_008_file, "w", encoding="utf-8") as f:
-        json.dump(guild_ids, f, indent=4)
-
-def load_vault_event_channels():
-    if not os.path.exists(vault_event_file):
-        return {}
-    with open(vault_event_file, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_vault_event_channels(guild_channels):
-    with open(vault_event_file, "w", encoding="utf-8") as f:
-        json.dump(guild_channels, f, indent=4)
-
-def load_afk_status():
-    if not os.path.exists(afk_file):
-        return {}
-    with open(afk_file, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_afk_status(afk_data):
-    with open(afk_file, "w", encoding="utf-8") as f:
-        json.dump(afk_data, f, indent=4)
-
-def load_polls():
-    if not os.path.exists(polls_file):
-        return {}
-    with open(polls_file, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_polls(polls_data):
-    with open(polls_file, "w", encoding="utf-8") as f:
-        json.dump(polls_data, f, indent=4)
+# Every command /help can autocomplete
+HELP_COMMANDS = [
+    "profile", "mission", "daily", "weekly", "leaderboard", "gleaderboard", "quest",
+    "shop", "buy", "inventory", "checkcredits", "equipgun", "equipgear", "upgrade", "removeitem", "gunsmith", "checkgun", "inventoryvalue",
+    "marketplace_list", "marketplace_browse", "marketplace_buy", "marketplace_retrieve", "trade", "confirmtrade", "canceltrade",
+    "adoptpet", "adoptpet10x", "premiumpets", "premiumpets10x", "pets", "equippet", "unequippet", "equippedpets", "petbattle", "petbattleteam", "trainpet", "releasepet", "comparepet",
+    "createteam", "inviteteam", "jointeam", "team", "promote", "demote",
+    "setrole", "listcustomroles",
+    "scp914", "scp294", "scp963", "scp999", "recontainscp", "easyrecontain",
+    "containmentsuit", "claimvault",
+    "afk", "return", "afklist",
+    "poll", "vote", "pollresults", "endpoll", "listpolls",
+    "ping", "botdetails", "serverinfo", "textme", "recommend"
+]
+HELP_INDEX = PrefixIndex(HELP_COMMANDS)
+
+def format_afk_time(afk_info):
+    """How long someone has been AFK, e.g. '1:02:03'"""
+    afk_timestamp = afk_info.get("timestamp")
+    if not afk_timestamp:
+        return "Unknown"
+    try:
+        time_spent = datetime.utcnow() - datetime.fromisoformat(afk_timestamp)
+        return str(time_spent).split('.')[0]  # Remove microseconds
+    except:
+        return "Unknown"
 
 class Misc(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # AFK statuses live in memory; on_message checks them on every message
+        self.afk_registry = AfkRegistry(afk_file)
+        # Open polls, their button views and the timer that closes them
+        self.poll_engine = PollEngine(bot)
+
+    async def cog_load(self):
+        self.afk_registry.load()
+        self.bot.message_pipeline.register("afk", self.afk_stage, STAGE_AFK)
+        self.poll_engine.load()
+        self.poll_engine.start()
+
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("afk")
+        await self.afk_registry.flush()
+        self.poll_engine.stop()
 
     async def cog_app_command_error(self, interaction, error):
         if isinstance(error, CommandOnCooldown):
@@ -135,17 +136,13 @@ class Misc(commands.Cog):
     async def afk(self, interaction: discord.Interaction, message: str = None):
         print(f"[DEBUG] /afk called by {interaction.user}")
         
-        afk_data = load_afk_status()
-        user_id = str(interaction.user.id)
-        
         # Set AFK status
-        afk_data[user_id] = {
+        self.afk_registry.set(interaction.user.id, {
             "message": message or "AFK",
             "timestamp": datetime.utcnow().isoformat(),
             "guild_id": str(interaction.guild.id),
             "channel_id": str(interaction.channel.id)
-        }
-        save_afk_status(afk_data)
+        })
         
         embed = discord.Embed(
             title="😴 AFK Status Set",
@@ -162,32 +159,14 @@ class Misc(commands.Cog):
     async def return_from_afk(self, interaction: discord.Interaction):
         print(f"[DEBUG] /return called by {interaction.user}")
         
-        afk_data = load_afk_status()
-        user_id = str(interaction.user.id)
-        
-        if user_id not in afk_data:
+        # Remove AFK status
+        afk_info = self.afk_registry.pop(interaction.user.id)
+        if afk_info is None:
             await interaction.response.send_message("You are not currently AFK.", ephemeral=True)
             return
         
-        # Get AFK info before removing
-        afk_info = afk_data[user_id]
         afk_message = afk_info.get("message", "AFK")
-        afk_timestamp = afk_info.get("timestamp")
-        
-        # Calculate time spent AFK
-        if afk_timestamp:
-            try:
-                afk_time = datetime.fromisoformat(afk_timestamp)
-                time_spent = datetime.utcnow() - afk_time
-                time_str = str(time_spent).split('.')[0]  # Remove microseconds
-            except:
-                time_str = "Unknown"
-        else:
-            time_str = "Unknown"
-        
-        # Remove AFK status
-        del afk_data[user_id]
-        save_afk_status(afk_data)
+        time_str = format_afk_time(afk_info)
         
         embed = discord.Embed(
             title="👋 Welcome Back!",
@@ -205,7 +184,7 @@ class Misc(commands.Cog):
     async def afk_list(self, interaction: discord.Interaction):
         print(f"[DEBUG] /afklist called by {interaction.user}")
         
-        afk_data = load_afk_status()
+        afk_data = self.afk_registry.items()
         
         if not afk_data:
             embed = discord.Embed(
@@ -221,21 +200,11 @@ class Misc(commands.Cog):
             color=discord.Color.orange()
         )
         
-        for user_id, afk_info in afk_data.items():
+        for user_id, afk_info in afk_data[:25]:
             try:
-                user = await self.bot.fetch_user(int(user_id))
+                user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(int(user_id))
                 message = afk_info.get("message", "AFK")
-                timestamp = afk_info.get("timestamp")
-                
-                if timestamp:
-                    try:
-                        afk_time = datetime.fromisoformat(timestamp)
-                        time_ago = datetime.utcnow() - afk_time
-                        time_str = str(time_ago).split('.')[0]
-                    except:
-                        time_str = "Unknown"
-                else:
-                    time_str = "Unknown"
+                time_str = format_afk_time(afk_info)
                 
                 embed.add_field(
                     name=f"👤 {user.display_name}",
@@ -248,34 +217,17 @@ class Misc(commands.Cog):
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def afk_stage(self, message):
+        """Message pipeline stage: welcome back AFK authors and answer mentions of AFK users"""
         if message.author.bot:
-            return
+            return False
         
-        # Check if user is AFK and remove them
-        afk_data = load_afk_status()
-        user_id = str(message.author.id)
+        # Check if user is AFK and remove them - dict lookups only, nothing is read from disk
+        afk_info = self.afk_registry.pop(message.author.id)
         
-        if user_id in afk_data:
-            afk_info = afk_data[user_id]
+        if afk_info is not None:
             afk_message = afk_info.get("message", "AFK")
-            afk_timestamp = afk_info.get("timestamp")
-            
-            # Calculate time spent AFK
-            if afk_timestamp:
-                try:
-                    afk_time = datetime.fromisoformat(afk_timestamp)
-                    time_spent = datetime.utcnow() - afk_time
-                    time_str = str(time_spent).split('.')[0]
-                except:
-                    time_str = "Unknown"
-            else:
-                time_str = "Unknown"
-            
-            # Remove AFK status
-            del afk_data[user_id]
-            save_afk_status(afk_data)
+            time_str = format_afk_time(afk_info)
             
             # Send welcome back message
             embed = discord.Embed(
@@ -291,22 +243,10 @@ class Misc(commands.Cog):
         
         # Check if message mentions an AFK user
         for mentioned_user in message.mentions:
-            mentioned_user_id = str(mentioned_user.id)
-            if mentioned_user_id in afk_data:
-                afk_info = afk_data[mentioned_user_id]
+            afk_info = self.afk_registry.get(mentioned_user.id)
+            if afk_info is not None:
                 afk_message = afk_info.get("message", "AFK")
-                afk_timestamp = afk_info.get("timestamp")
-                
-                # Calculate time spent AFK
-                if afk_timestamp:
-                    try:
-                        afk_time = datetime.fromisoformat(afk_timestamp)
-                        time_spent = datetime.utcnow() - afk_time
-                        time_str = str(time_spent).split('.')[0]
-                    except:
-                        time_str = "Unknown"
-                else:
-                    time_str = "Unknown"
+                time_str = format_afk_time(afk_info)
                 
                 # Send AFK status message
                 embed = discord.Embed(
@@ -319,9 +259,7 @@ class Misc(commands.Cog):
                 embed.set_footer(text="They'll be back when they send a message!")
                 
                 await message.channel.send(embed=embed, delete_after=15)
-        
-        # Continue processing the message for other events
-        await self.bot.process_commands(message)
+        return False
 
     @app_commands.command(name="ping", description="Check if the bot is alive")
     @slowmode.__func__()
@@ -490,24 +428,7 @@ class Misc(commands.Cog):
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
     async def help_command_autocomplete(self, interaction: discord.Interaction, current: str):
-        # List of all available commands for autocomplete
-        command_names = [
-            "profile", "mission", "daily", "weekly", "leaderboard", "gleaderboard", "quest",
-            "shop", "buy", "inventory", "checkcredits", "equipgun", "equipgear", "upgrade", "removeitem", "gunsmith", "checkgun", "inventoryvalue",
-            "marketplace_list", "marketplace_browse", "marketplace_buy", "marketplace_retrieve", "trade", "confirmtrade", "canceltrade",
-            "adoptpet", "adoptpet10x", "premiumpets", "premiumpets10x", "pets", "equippet", "unequippet", "equippedpets", "petbattle", "petbattleteam", "trainpet", "releasepet", "comparepet",
-            "createteam", "inviteteam", "jointeam", "team", "promote", "demote",
-            "setrole", "listcustomroles",
-            "scp914", "scp294", "scp963", "scp999", "recontainscp", "easyrecontain",
-            "containmentsuit", "claimvault",
-            "afk", "return", "afklist",
-            "poll", "vote", "pollresults", "endpoll", "listpolls",
-            "ping", "botdetails", "serverinfo", "textme", "recommend"
-        ]
-        return [
-            app_commands.Choice(name=cmd, value=cmd)
-            for cmd in command_names if current.lower() in cmd.lower()
-        ][:25]
+        return await autocomplete.complete(interaction, current, HELP_INDEX)
 
     @app_commands.command(name="help", description="Show help for all player commands or a specific command")
     @app_commands.describe(command="(Optional) The command to get detailed help for")
@@ -688,13 +609,8 @@ class Misc(commands.Cog):
     @slowmode.__func__()
     async def enable008(self, interaction: discord.Interaction, channel: discord.TextChannel):
         try:
-            enabled_guilds = load_enabled_008()
-            if not isinstance(enabled_guilds, dict):
-                enabled_guilds = {}
-            guild_id = str(interaction.guild.id)
-            if guild_id not in enabled_guilds or enabled_guilds[guild_id] != channel.id:
-                enabled_guilds[guild_id] = channel.id
-                save_enabled_008(enabled_guilds)
+            if self.bot.breach_events.channel_id(interaction.guild.id) != channel.id:
+                self.bot.breach_events.enable(interaction.guild.id, channel.id)
                 await interaction.response.send_message(f"SCP-008 event enabled for this server in {channel.mention}.")
             else:
                 await interaction.response.send_message("SCP-008 event is already enabled in that channel.")
@@ -707,13 +623,7 @@ class Misc(commands.Cog):
     @slowmode.__func__()
     async def disable008(self, interaction: discord.Interaction):
         try:
-            enabled_guilds = load_enabled_008()
-            if not isinstance(enabled_guilds, dict):
-                enabled_guilds = {}
-            guild_id = str(interaction.guild.id)
-            if guild_id in enabled_guilds:
-                del enabled_guilds[guild_id]
-                save_enabled_008(enabled_guilds)
+            if self.bot.breach_events.disable(interaction.guild.id):
                 await interaction.response.send_message("SCP-008 event disabled for this server.")
             else:
                 await interaction.response.send_message("SCP-008 event is already disabled.")
@@ -724,21 +634,20 @@ class Misc(commands.Cog):
     @app_commands.command(name="containmentsuit", description="Respond to an active SCP-008 breach event.")
     @slowmode.__func__()
     async def containmentsuit(self, interaction: discord.Interaction):
-        state = event_008_breach.get(interaction.guild.id, {"active": False})
-        if not state["active"]:
+        if self.bot.breach_events.active(interaction.guild.id) is None:
             await interaction.response.send_message("There is no active SCP-008 breach event right now.", ephemeral=True)
             return
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user_fields(interaction.user.id, "inventory")
         inventory = user_data.get("inventory", [])
         channel = interaction.channel
         if "Containment Suit" in inventory:
+            if self.bot.breach_events.resolve(interaction.guild.id) is None:
+                await interaction.response.send_message("The SCP-008 breach has already been dealt with.", ephemeral=True)
+                return
             logging.debug(f"[DEBUG] {interaction.user} used a Containment Suit in guild {interaction.guild.id}")
-            user_data["credits"] = user_data.get("credits", 0) + 100
-            user_data["xp"] = user_data.get("xp", 0) + 50
-            update_user(interaction.user.id, credits=user_data["credits"], xp=user_data["xp"])
+            await aadjust_user(interaction.user.id, credits=100, xp=50)
             await interaction.response.send_message("✅ You used your Containment Suit and survived the breach! You gained 100 credits and 50 XP.", ephemeral=True)
             await channel.send(f"{interaction.user.mention} used a Containment Suit and survived the SCP-008 breach! Event is now over.")
-            event_008_breach[interaction.guild.id] = {"active": False, "last": time.time()}
         else:
             await interaction.response.send_message("⚠️ You do not have a Containment Suit in your inventory! Purchase one from the shop to survive breaches.", ephemeral=True)
 
@@ -748,13 +657,8 @@ class Misc(commands.Cog):
     @slowmode.__func__()
     async def enablevault(self, interaction: discord.Interaction, channel: discord.TextChannel):
         try:
-            vault_channels = load_vault_event_channels()
-            if not isinstance(vault_channels, dict):
-                vault_channels = {}
-            guild_id = str(interaction.guild.id)
-            if guild_id not in vault_channels or vault_channels[guild_id] != channel.id:
-                vault_channels[guild_id] = channel.id
-                save_vault_event_channels(vault_channels)
+            if self.bot.vault_events.channel_id(interaction.guild.id) != channel.id:
+                self.bot.vault_events.enable(interaction.guild.id, channel.id)
                 await interaction.response.send_message(f"Vault Airdrop event enabled for this server in {channel.mention}.")
             else:
                 await interaction.response.send_message("Vault Airdrop event is already enabled in that channel.")
@@ -765,41 +669,29 @@ class Misc(commands.Cog):
     @app_commands.command(name="claimvault", description="Claim the currently airdropped vault if you have the right keycard!")
     @slowmode.__func__()
     async def claimvault(self, interaction: discord.Interaction):
-        from db import get_user, update_user, vault_event_state, save_vault_event_state
-        user_data = get_user(interaction.user.id)
-        active_vault = getattr(interaction.client, "active_vault", None)
-        if not active_vault:
-            await interaction.response.send_message("❌ There is no active vault to claim right now.", ephemeral=True)
-            return
-        vault_type = active_vault.get("type")
-        guild_id = active_vault.get("guild_id")
-        if guild_id != interaction.guild.id:
-            await interaction.response.send_message("❌ There is no active vault to claim right now.", ephemeral=True)
-            return
-        if not vault_type:
+        vault = self.bot.vault_events.active(interaction.guild.id)
+        if vault is None:
             await interaction.response.send_message("❌ There is no active vault to claim right now.", ephemeral=True)
             return
+        user_data = await aget_user_fields(interaction.user.id, "inventory")
         inventory = user_data.get("inventory", [])
+        vault_type = vault.get("type", "level1")
         if vault_type == "level1":
             if "Keycard Level 1" in inventory:
-                user_data["credits"] = user_data.get("credits", 0) + 50
-                user_data["xp"] = user_data.get("xp", 0) + 20
-                update_user(interaction.user.id, credits=user_data["credits"], xp=user_data["xp"])
+                if self.bot.vault_events.resolve(interaction.guild.id) is None:
+                    await interaction.response.send_message("❌ Someone else claimed this vault first.", ephemeral=True)
+                    return
+                await aadjust_user(interaction.user.id, credits=50, xp=20)
                 await interaction.response.send_message("✅ You claimed the Level 1 Vault! You received 50 credits and 20 XP.", ephemeral=True)
-                interaction.client.active_vault["type"] = None
-                vault_event_state[interaction.guild.id] = {"active": False, "last": time.time()}
-                save_vault_event_state()
             else:
                 await interaction.response.send_message("❌ You need a Keycard Level 1 to claim this vault.", ephemeral=True)
         elif vault_type == "level2":
             if "Keycard Level 2" in inventory:
-                user_data["credits"] = user_data.get("credits", 0) + 150
-                user_data["xp"] = user_data.get("xp", 0) + 60
-                update_user(interaction.user.id, credits=user_data["credits"], xp=user_data["xp"])
+                if self.bot.vault_events.resolve(interaction.guild.id) is None:
+                    await interaction.response.send_message("❌ Someone else claimed this vault first.", ephemeral=True)
+                    return
+                await aadjust_user(interaction.user.id, credits=150, xp=60)
                 await interaction.response.send_message("✅ You claimed the Level 2 Vault! You received 150 credits and 60 XP.", ephemeral=True)
-                interaction.client.active_vault["type"] = None
-                vault_event_state[interaction.guild.id] = {"active": False, "last": time.time()}
-                save_vault_event_state()
             else:
                 await interaction.response.send_message("❌ You need a Keycard Level 2 to claim this vault.", ephemeral=True)
         else:
@@ -910,49 +802,12 @@ class Misc(commands.Cog):
         # Generate unique poll ID
         poll_id = f"{interaction.guild.id}_{int(time.time())}"
         
-        # Create poll data
-        poll_data = {
-            "question": question,
-            "options": option_list,
-            "votes": {str(i): [] for i in range(len(option_list))},
-            "created_by": str(interaction.user.id),
-            "created_at": datetime.utcnow().isoformat(),
-            "end_time": end_time.isoformat(),
-            "channel_id": str(interaction.channel.id),
-            "message_id": None,
-            "active": True
-        }
-        
-        # Save poll
-        polls = load_polls()
-        polls[poll_id] = poll_data
-        save_polls(polls)
-        
-        # Create poll embed
-        embed = discord.Embed(
-            title="📊 Poll Created",
-            description=f"**{question}**",
-            color=discord.Color.blue()
-        )
-        
-        # Add options with emoji numbers
-        emojis = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
-        options_text = ""
-        for i, option in enumerate(option_list):
-            options_text += f"{emojis[i]} {option}\n"
-        
-        embed.add_field(name="Options", value=options_text, inline=False)
-        embed.add_field(name="Ends", value=f"<t:{int(end_time.timestamp())}:F>", inline=True)
-        embed.add_field(name="In", value=f"<t:{int(end_time.timestamp())}:R>", inline=True)
-        embed.add_field(name="Vote", value=f"Use `/vote {poll_id} <option_number>` to vote", inline=False)
-        embed.set_footer(text=f"Poll ID: {poll_id} • Created by {interaction.user.display_name}")
-        
-        # Send poll message
-        poll_message = await interaction.channel.send(embed=embed)
-        
-        # Update poll with message ID
-        polls[poll_id]["message_id"] = str(poll_message.id)
-        save_polls(polls)
+        # Post the poll with its voting buttons
+        try:
+            await self.poll_engine.create(interaction.channel, interaction.user, question, option_list, end_time, poll_id)
+        except Exception as e:
+            await interaction.response.send_message(f"❌ Failed to post the poll: {e}", ephemeral=True)
+            return
         
         await interaction.response.send_message(f"✅ Poll created! Poll ID: `{poll_id}`", ephemeral=True)
 
@@ -966,40 +821,11 @@ class Misc(commands.Cog):
             await interaction.response.send_message("❌ Option number must be between 1 and 10.", ephemeral=True)
             return
         
-        polls = load_polls()
-        if poll_id not in polls:
-            await interaction.response.send_message("❌ Poll not found.", ephemeral=True)
-            return
-        
-        poll = polls[poll_id]
-        if not poll["active"]:
-            await interaction.response.send_message("❌ This poll has ended.", ephemeral=True)
-            return
-        
-        # Check if poll has ended
-        end_time = datetime.fromisoformat(poll["end_time"])
-        if datetime.utcnow() >= end_time:
-            poll["active"] = False
-            save_polls(polls)
-            await interaction.response.send_message("❌ This poll has ended.", ephemeral=True)
+        error = self.poll_engine.vote(poll_id, interaction.user.id, option_number - 1)
+        if error:
+            await interaction.response.send_message(f"❌ {error}", ephemeral=True)
             return
-        
-        # Check if option exists
-        option_index = str(option_number - 1)
-        if option_index not in poll["votes"]:
-            await interaction.response.send_message("❌ Invalid option number.", ephemeral=True)
-            return
-        
-        user_id = str(interaction.user.id)
-        
-        # Remove user's previous vote if any
-        for votes in poll["votes"].values():
-            if user_id in votes:
-                votes.remove(user_id)
-        
-        # Add new vote
-        poll["votes"][option_index].append(user_id)
-        save_polls(polls)
+        poll = self.poll_engine.polls[poll_id]
         
         embed = discord.Embed(
             title="✅ Vote Cast",
@@ -1017,45 +843,12 @@ class Misc(commands.Cog):
     async def pollresults(self, interaction: discord.Interaction, poll_id: str):
         print(f"[DEBUG] /pollresults called by {interaction.user}")
         
-        polls = load_polls()
-        if poll_id not in polls:
+        poll = self.poll_engine.polls.get(poll_id)
+        if poll is None:
             await interaction.response.send_message("❌ Poll not found.", ephemeral=True)
             return
         
-        poll = polls[poll_id]
-        
-        embed = discord.Embed(
-            title="📊 Poll Results",
-            description=f"**{poll['question']}**",
-            color=discord.Color.blue()
-        )
-        
-        # Calculate total votes
-        total_votes = sum(len(votes) for votes in poll["votes"].values())
-        
-        # Add results for each option
-        emojis = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
-        for i, option in enumerate(poll["options"]):
-            votes = len(poll["votes"][str(i)])
-            percentage = (votes / total_votes * 100) if total_votes > 0 else 0
-            bar_length = int(percentage / 10)  # 10% per bar segment
-            bar = "█" * bar_length + "░" * (10 - bar_length)
-            
-            embed.add_field(
-                name=f"{emojis[i]} {option}",
-                value=f"Votes: {votes} ({percentage:.1f}%)\n{bar}",
-                inline=False
-            )
-        
-        embed.add_field(name="Total Votes", value=str(total_votes), inline=True)
-        embed.add_field(name="Status", value="🟢 Active" if poll["active"] else "🔴 Ended", inline=True)
-        
-        if poll["active"]:
-            end_time = datetime.fromisoformat(poll["end_time"])
-            embed.add_field(name="Ends", value=f"<t:{int(end_time.timestamp())}:R>", inline=True)
-        
-        embed.set_footer(text=f"Poll ID: {poll_id}")
-        
+        embed = build_poll_embed(poll_id, poll, self.poll_engine.tallies[poll_id])
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
     @app_commands.command(name="endpoll", description="End a poll early (creator only)")
@@ -1064,12 +857,11 @@ class Misc(commands.Cog):
     async def endpoll(self, interaction: discord.Interaction, poll_id: str):
         print(f"[DEBUG] /endpoll called by {interaction.user}")
         
-        polls = load_polls()
-        if poll_id not in polls:
+        poll = self.poll_engine.polls.get(poll_id)
+        if poll is None:
             await interaction.response.send_message("❌ Poll not found.", ephemeral=True)
             return
         
-        poll = polls[poll_id]
         if not poll["active"]:
             await interaction.response.send_message("❌ This poll has already ended.", ephemeral=True)
             return
@@ -1079,8 +871,7 @@ class Misc(commands.Cog):
             return
         
         # End the poll
-        poll["active"] = False
-        save_polls(polls)
+        await self.poll_engine.close(poll_id)
         
         embed = discord.Embed(
             title="🔴 Poll Ended",
@@ -1097,11 +888,7 @@ class Misc(commands.Cog):
     async def listpolls(self, interaction: discord.Interaction):
         print(f"[DEBUG] /listpolls called by {interaction.user}")
         
-        polls = load_polls()
-        guild_polls = [
-            (poll_id, poll) for poll_id, poll in polls.items()
-            if poll["channel_id"] == str(interaction.channel.id) and poll["active"]
-        ]
+        guild_polls = self.poll_engine.active_in_channel(interaction.channel.id)
         
         if not guild_polls:
             embed = discord.Embed(
@@ -1139,9 +926,7 @@ class Misc(commands.Cog):
         if amount <= 0:
             await interaction.response.send_message("Amount must be positive.", ephemeral=True)
             return
-        user_data = get_user(user.id)
-        user_data["credits"] = user_data.get("credits", 0) + amount
-        update_user(user.id, credits=user_data["credits"])
+        user_data = await aadjust_user(user.id, credits=amount)
         await interaction.response.send_message(f"Gave {amount} credits to {user.mention}. New balance: {user_data['credits']}", ephemeral=True)
 
 async def setup(bot):
@@ -8,16 +8,16 @@ try:
 except ImportError:
     import config_fallback as config
 
-import json
-import os
 import time
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
 import re
+from message_pipeline import STAGE_AUTOMOD
+from automod import AutomodEngine, SpamTracker, is_caps_spam, is_emoji_spam
+from db import aclear_warnings, aget_warnings, queue_warning
+from mute_scheduler import MuteScheduler
+from state_store import state_store
 
-WARNINGS_FILE = "warnings.json"
 AUTODETECT_FILE = "autodetect.json"
-MUTED_FILE = "muted.json"
 AUTOMOD_CONFIG_FILE = "automod_config.json"
 MODLOG_CONFIG_FILE = "modlog_config.json"
 FORBIDDEN_WORDS = [
@@ -25,55 +25,23 @@ FORBIDDEN_WORDS = [
     "fuck", "shit", "bitch", "nigger", "fag", "faggot", "asshole", "dick", "cunt", "bastard", "slut", "whore", "piss", "cock", "retard", "moron", "douche", "jackass", "twat", "crap", "prick", "wanker", "arse", "dipshit", "dumbass", "jackoff", "jerkoff", "motherfucker", "bullshit", "dildo", "pussy", "tit", "tits", "cum", "suck", "screwed", "screwing", "bimbo", "skank", "tramp", "hoe", "spaz", "spastic"
 ]
 
-def load_warnings():
-    if not os.path.exists(WARNINGS_FILE):
-        return {}
-    with open(WARNINGS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_warnings(warnings):
-    with open(WARNINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(warnings, f, indent=4)
-
 def load_autodetect():
-    if not os.path.exists(AUTODETECT_FILE):
-        return {}
-    with open(AUTODETECT_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return state_store.load(AUTODETECT_FILE, {})
 
 def save_autodetect(data):
-    with open(AUTODETECT_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
-
-def load_muted():
-    if not os.path.exists(MUTED_FILE):
-        return {}
-    with open(MUTED_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_muted(muted):
-    with open(MUTED_FILE, "w", encoding="utf-8") as f:
-        json.dump(muted, f, indent=4)
+    state_store.save(AUTODETECT_FILE, data)
 
 def load_automod_config():
-    if not os.path.exists(AUTOMOD_CONFIG_FILE):
-        return {}
-    with open(AUTOMOD_CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return state_store.load(AUTOMOD_CONFIG_FILE, {})
 
 def save_automod_config(config_data):
-    with open(AUTOMOD_CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(config_data, f, indent=4)
+    state_store.save(AUTOMOD_CONFIG_FILE, config_data)
 
 def load_modlog_config():
-    if not os.path.exists(MODLOG_CONFIG_FILE):
-        return {}
-    with open(MODLOG_CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return state_store.load(MODLOG_CONFIG_FILE, {})
 
 def save_modlog_config(config_data):
-    with open(MODLOG_CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(config_data, f, indent=4)
+    state_store.save(MODLOG_CONFIG_FILE, config_data)
 
 class Moderation(commands.Cog):
     def __init__(self, bot):
@@ -81,12 +49,23 @@ class Moderation(commands.Cog):
         self.autodetect = load_autodetect()
         self.automod_config = load_automod_config()
         self.modlog_config = load_modlog_config()
-        # Spam tracking: {guild_id: {user_id: deque of timestamps}}
-        self.spam_tracker = defaultdict(lambda: defaultdict(lambda: deque(maxlen=10)))
-        # Message tracking for caps and emoji spam
-        self.message_tracker = defaultdict(lambda: defaultdict(lambda: deque(maxlen=5)))
+        # Per-guild rules compiled from automod_config/autodetect; invalidated when they change
+        self.automod_engine = AutomodEngine(FORBIDDEN_WORDS)
+        # Spam tracking: 3+ messages in 10 seconds, only for guilds with spam detection on
+        self.spam_tracker = SpamTracker(limit=3, window=10.0)
+        # Timed mutes, applied as member timeouts and lifted when they run out
+        self.mutes = MuteScheduler(bot, on_expire=self.log_mute_expired)
+
+    async def cog_load(self):
+        self.bot.message_pipeline.register("automod", self.automod_stage, STAGE_AUTOMOD)
+        self.sweep_spam_tracker.start()
+        self.mutes.load()
+        self.mutes.start()
 
     async def cog_unload(self):
+        self.bot.message_pipeline.unregister("automod")
+        self.sweep_spam_tracker.cancel()
+        self.mutes.stop()
         save_autodetect(self.autodetect)
         save_automod_config(self.automod_config)
         save_modlog_config(self.modlog_config)
@@ -105,143 +84,84 @@ class Moderation(commands.Cog):
             "emoji_threshold": guild_config.get("emoji_threshold", 0.5),  # 50% emojis
         }
 
-    def is_spam(self, guild_id, user_id):
-        """Check if user is spamming"""
-        timestamps = self.spam_tracker[guild_id][user_id]
-        if len(timestamps) < 3:
-            return False
-        
-        # Check if 3+ messages in last 10 seconds
-        now = datetime.utcnow()
-        recent_messages = [ts for ts in timestamps if (now - ts).total_seconds() <= 10]
-        return len(recent_messages) >= 3
-
-    def is_caps_spam(self, content):
-        """Check if message is mostly caps"""
-        if len(content) < 10:
-            return False
-        
-        letters = [c for c in content if c.isalpha()]
-        if not letters:
-            return False
-        
-        caps_count = sum(1 for c in letters if c.isupper())
-        return caps_count / len(letters) > 0.7
+    @tasks.loop(minutes=1)
+    async def sweep_spam_tracker(self):
+        # Drop users who have gone quiet so the tracker only holds recently active ones
+        self.spam_tracker.sweep()
 
-    def is_emoji_spam(self, content):
-        """Check if message is mostly emojis"""
-        if len(content) < 5:
-            return False
-        
-        # Count emojis (both unicode and custom)
-        emoji_pattern = re.compile(r'<a?:.+?:\d+>|[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF\U00002600-\U000027BF\U0001F900-\U0001F9FF]')
-        emojis = emoji_pattern.findall(content)
-        
-        # Remove emojis to get text length
-        text_content = emoji_pattern.sub('', content).strip()
-        
-        if not text_content and len(emojis) > 0:
-            return True
-        
-        if len(text_content) > 0:
-            return len(emojis) / (len(emojis) + len(text_content)) > 0.5
-        
-        return False
-
-    def contains_links(self, content):
-        """Check if message contains links"""
-        url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
-        return bool(url_pattern.search(content))
-
-    def is_allowed_link(self, content, allowed_domains):
-        """Check if link is in allowed domains"""
-        if not allowed_domains:
-            return False
-        
-        url_pattern = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
-        urls = url_pattern.findall(content)
-        
-        for url in urls:
-            domain = url.split('/')[2].lower()
-            if not any(allowed_domain.lower() in domain for allowed_domain in allowed_domains):
-                return False
-        return True
+    def get_guild_rules(self, guild_id):
+        """Compiled automod rules for a guild"""
+        return self.automod_engine.rules(
+            guild_id, lambda: (self.get_guild_config(guild_id), self.autodetect.get(guild_id, False))
+        )
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def automod_stage(self, message):
+        """Message pipeline stage: returns True when the message was removed, so later stages skip it"""
         if message.author.bot or not message.guild:
-            return
+            return False
         
         guild_id = str(message.guild.id)
         user_id = str(message.author.id)
         content = message.content
         
-        # Get guild automod config
-        config = self.get_guild_config(guild_id)
-        
-        # Track message for spam detection
-        self.spam_tracker[guild_id][user_id].append(datetime.utcnow())
+        # Get guild automod rules
+        rules = self.get_guild_rules(guild_id)
         
         # Spam detection
-        if config["spam_detection"] and self.is_spam(guild_id, user_id):
+        if rules.spam_detection and self.spam_tracker.hit(guild_id, user_id):
             try:
                 await message.delete()
                 await message.channel.send(f"{message.author.mention}, please slow down your messages.", delete_after=5)
-                return
+                return True
             except Exception:
                 pass
         
+        if not rules.any_content_checks:
+            return False
+        
         # Caps lock detection
-        if config["caps_detection"] and self.is_caps_spam(content):
+        if rules.caps_detection and is_caps_spam(content, rules.caps_threshold):
             try:
                 await message.delete()
                 await message.channel.send(f"{message.author.mention}, please avoid excessive caps lock.", delete_after=5)
-                return
+                return True
             except Exception:
                 pass
         
         # Emoji spam detection
-        if config["emoji_spam_detection"] and self.is_emoji_spam(content):
+        if rules.emoji_spam_detection and is_emoji_spam(content, rules.emoji_threshold):
             try:
                 await message.delete()
                 await message.channel.send(f"{message.author.mention}, please avoid excessive emoji usage.", delete_after=5)
-                return
+                return True
             except Exception:
                 pass
         
         # Link filtering
-        if config["link_filtering"] and self.contains_links(content):
-            if not self.is_allowed_link(content, config["allowed_domains"]):
-                try:
-                    await message.delete()
-                    await message.channel.send(f"{message.author.mention}, links are not allowed in this channel.", delete_after=5)
-                    return
-                except Exception:
-                    pass
+        if rules.link_filtering and rules.has_blocked_link(content):
+            try:
+                await message.delete()
+                await message.channel.send(f"{message.author.mention}, links are not allowed in this channel.", delete_after=5)
+                return True
+            except Exception:
+                pass
         
         # Original word filter
-        enabled = self.autodetect.get(guild_id, False)
-        if enabled:
-            lowered = content.lower()
-            found = [w for w in FORBIDDEN_WORDS if w in lowered]
+        if rules.word_filter:
+            found = self.automod_engine.forbidden_words(content)
             if found:
                 try:
                     await message.delete()
                 except Exception:
                     pass
-                warnings = load_warnings()
-                entry = {
-                    "reason": f"Used bad words: {', '.join(found)}",
-                    "moderator": self.bot.user.id,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                warnings.setdefault(user_id, []).append(entry)
-                save_warnings(warnings)
+                queue_warning(message.guild.id, message.author.id, f"Used bad words: {', '.join(found)}", self.bot.user.id)
                 try:
                     await message.author.send(f"Your message in {message.guild.name} was deleted for using forbidden words: {', '.join(found)}.")
                 except Exception:
                     pass
                 await message.channel.send(f"{message.author.mention}, your message was removed for inappropriate language.", delete_after=5)
+                return True
+        return False
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
@@ -300,14 +220,7 @@ class Moderation(commands.Cog):
     @app_commands.checks.has_permissions(moderate_members=True)
     async def warn(self, interaction: discord.Interaction, user: discord.Member, reason: str):
         print(f"[DEBUG] /warn called by {interaction.user} for {user.display_name} reason: {reason}")
-        warnings = load_warnings()
-        entry = {
-            "reason": reason,
-            "moderator": interaction.user.id,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        warnings.setdefault(str(user.id), []).append(entry)
-        save_warnings(warnings)
+        queue_warning(interaction.guild.id, user.id, reason, interaction.user.id)
         await interaction.response.send_message(f"⚠️ {user.mention} has been warned for: {reason}")
         try:
             await user.send(f"You have been warned in {interaction.guild.name} for: {reason}")
@@ -329,8 +242,7 @@ class Moderation(commands.Cog):
     @app_commands.checks.has_permissions(moderate_members=True)
     async def warnings_cmd(self, interaction: discord.Interaction, user: discord.Member):
         print(f"[DEBUG] /warnings called by {interaction.user} for {user.display_name}")
-        warnings = load_warnings()
-        user_warnings = warnings.get(str(user.id), [])
+        user_warnings, total = await aget_warnings(interaction.guild.id, user.id)
         if not user_warnings:
             await interaction.response.send_message(f"{user.mention} has no warnings.")
             return
@@ -338,17 +250,18 @@ class Moderation(commands.Cog):
             title=f"Warnings for {user.display_name}",
             color=discord.Color.orange()
         )
-        for i, w in enumerate(user_warnings, 1):
-            if isinstance(w, dict):
-                mod = self.bot.get_user(w.get("moderator"))
-                mod_name = mod.display_name if mod else w.get("moderator")
-                embed.add_field(
-                    name=f"#{i} - {w.get('timestamp', 'N/A')}",
-                    value=f"Reason: {w.get('reason', 'N/A')}\nModerator: {mod_name}",
-                    inline=False
-                )
-            else:
-                embed.add_field(name=f"#{i}", value=str(w), inline=False)
+        # Only the latest 25 fit in an embed; number them by their place in the full history
+        first = total - len(user_warnings) + 1
+        for i, w in enumerate(user_warnings, first):
+            mod = self.bot.get_user(w["moderator_id"])
+            mod_name = mod.display_name if mod else w["moderator_id"] or "N/A"
+            embed.add_field(
+                name=f"#{i} - {w['created_at'].isoformat()}",
+                value=f"Reason: {w['reason']}\nModerator: {mod_name}",
+                inline=False
+            )
+        if total > len(user_warnings):
+            embed.set_footer(text=f"Showing the latest {len(user_warnings)} of {total} warnings")
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="clearwarnings", description="Clear all warnings for a user")
@@ -356,10 +269,7 @@ class Moderation(commands.Cog):
     @app_commands.checks.has_permissions(moderate_members=True)
     async def clearwarnings(self, interaction: discord.Interaction, user: discord.Member):
         print(f"[DEBUG] /clearwarnings called by {interaction.user} for {user.display_name}")
-        warnings = load_warnings()
-        if str(user.id) in warnings:
-            del warnings[str(user.id)]
-            save_warnings(warnings)
+        if await aclear_warnings(interaction.guild.id, user.id):
             await interaction.response.send_message(f"✅ Cleared all warnings for {user.mention}.")
             # Log to mod channel
             log_channel = self.get_log_channel(interaction.guild)
@@ -448,6 +358,7 @@ class Moderation(commands.Cog):
             return
         self.autodetect[str(interaction.guild.id)] = (state == "on")
         save_autodetect(self.autodetect)
+        self.automod_engine.invalidate(interaction.guild.id)
         await interaction.response.send_message(f"Auto-detect word filter is now {'enabled' if state == 'on' else 'disabled'} for this server.")
 
     @app_commands.command(name="automod", description="Configure auto-moderation features")
@@ -483,6 +394,9 @@ class Moderation(commands.Cog):
         
         self.automod_config[guild_id][feature_map[feature]] = (state == "on")
         save_automod_config(self.automod_config)
+        self.automod_engine.invalidate(guild_id)
+        if feature == "spam" and state == "off":
+            self.spam_tracker.forget_guild(guild_id)
         
         await interaction.response.send_message(f"Auto-moderation {feature} detection is now {'enabled' if state == 'on' else 'disabled'} for this server.")
 
@@ -500,6 +414,7 @@ class Moderation(commands.Cog):
         
         self.automod_config[guild_id]["allowed_domains"] = domain_list
         save_automod_config(self.automod_config)
+        self.automod_engine.invalidate(guild_id)
         
         embed = discord.Embed(
             title="✅ Allowed Domains Updated",
@@ -571,9 +486,8 @@ class Moderation(commands.Cog):
     @app_commands.checks.has_permissions(moderate_members=True)
     async def mute(self, interaction: discord.Interaction, user: discord.Member, duration: str, reason: str):
         print(f"[DEBUG] /mute called by {interaction.user} for {user.display_name} duration: {duration} reason: {reason}")
-        muted = load_muted()
         # Parse duration
-        match = re.match(r"^(\\d+)([smhdy])$", duration.strip().lower())
+        match = re.match(r"^(\d+)([smhdy])$", duration.strip().lower())
         if not match:
             await interaction.response.send_message(
                 "Invalid duration format. Use number followed by s/m/h/d/y (e.g., 10m, 2h, 1d, 1y, 30s)", ephemeral=True)
@@ -593,14 +507,14 @@ class Moderation(commands.Cog):
             await interaction.response.send_message(
                 "Invalid duration unit. Use s (seconds), m (minutes), h (hours), d (days), or y (years).", ephemeral=True)
             return
-        end_time = (datetime.utcnow() + delta).isoformat()
-        muted[str(user.id)] = {
-            "reason": reason,
-            "moderator": interaction.user.id,
-            "timestamp": datetime.utcnow().isoformat(),
-            "end_time": end_time
-        }
-        save_muted(muted)
+        try:
+            await self.mutes.mute(user, delta, reason, interaction.user.id)
+        except discord.Forbidden:
+            await interaction.response.send_message(f"❌ I don't have permission to time out {user.mention}.", ephemeral=True)
+            return
+        except Exception as e:
+            await interaction.response.send_message(f"Failed to mute {user.mention}: {e}", ephemeral=True)
+            return
         await interaction.response.send_message(
             f"🔇 {user.mention} has been muted for {duration}. Reason: {reason}")
         try:
@@ -623,10 +537,12 @@ class Moderation(commands.Cog):
     @app_commands.checks.has_permissions(moderate_members=True)
     async def unmute(self, interaction: discord.Interaction, user: discord.Member):
         print(f"[DEBUG] /unmute called by {interaction.user} for {user.display_name}")
-        muted = load_muted()
-        if str(user.id) in muted:
-            del muted[str(user.id)]
-            save_muted(muted)
+        try:
+            entry = await self.mutes.unmute(interaction.guild, user.id, reason=f"Unmuted by {interaction.user}")
+        except Exception as e:
+            await interaction.response.send_message(f"Failed to unmute {user.mention}: {e}", ephemeral=True)
+            return
+        if entry is not None:
             await interaction.response.send_message(f"✅ {user.mention} has been unmuted.")
             try:
                 await user.send(f"You have been unmuted in {interaction.guild.name}.")
@@ -654,6 +570,18 @@ class Moderation(commands.Cog):
         save_modlog_config(self.modlog_config)
         await interaction.response.send_message(f"✅ Log channel set to {channel.mention}")
 
+    async def log_mute_expired(self, guild, user_id, entry):
+        """Called by the mute scheduler when a mute runs out"""
+        log_channel = self.get_log_channel(guild)
+        if log_channel:
+            embed = discord.Embed(
+                title="Mute Expired",
+                description=f"<@{user_id}>'s mute has ended\nReason was: {entry.get('reason', 'N/A')}",
+                color=discord.Color.green(),
+                timestamp=datetime.utcnow()
+            )
+            await log_channel.send(embed=embed)
+
     def get_log_channel(self, guild):
         guild_id = str(guild.id)
         channel_id = self.modlog_config.get(guild_id)
@@ -8,12 +8,17 @@ try:
 except ImportError:
     import config_fallback as config
 
-import random
+from collections import Counter
 import json
 import os
 import time
 from datetime import datetime, timedelta
-from db import get_user, update_user
+from db import aget_user, aupdate_user, aadjust_user, aadd_pet, aremove_pet, UserTransaction
+import quests
+import combat
+import gacha
+from pet_catalog import PetCatalog
+from autocomplete import autocomplete
 import asyncio
 
 PETS = [
@@ -148,6 +153,31 @@ PET_RARITIES = {
 PET_ADOPT_COST = 250
 PREMIUM_PET_COST = 1000
 
+# Pity: a pet of these rarities is guaranteed within this many pulls
+ADOPT_PITY_RARITIES = ("Legendary", "Mythic", "Classified")
+ADOPT_PITY_AFTER = 50
+PREMIUM_PITY_RARITIES = ("Classified",)
+PREMIUM_PITY_AFTER = 60
+
+# Raises at import if PETS and PET_RARITIES disagree
+PET_CATALOG = PetCatalog(PETS, PET_RARITIES)
+PREMIUM_PETS = PET_CATALOG.with_rarity("Mythic", "Legendary", "Classified")
+
+ADOPT_BANNER = gacha.Banner(
+    "adopt",
+    PET_CATALOG.pets,
+    [RARITY_WEIGHTS[p.rarity] for p in PET_CATALOG],
+    pity_rarities=ADOPT_PITY_RARITIES,
+    pity_after=ADOPT_PITY_AFTER
+)
+PREMIUM_BANNER = gacha.Banner(
+    "premium",
+    PREMIUM_PETS,
+    [PREMIUM_WEIGHTS[p.rarity] for p in PREMIUM_PETS],
+    pity_rarities=PREMIUM_PITY_RARITIES,
+    pity_after=PREMIUM_PITY_AFTER
+)
+
 PET_RARITY_COLORS = {
     "Common": 0x2ecc40,      # green
     "Uncommon": 0x3498db,    # blue
@@ -159,7 +189,7 @@ PET_RARITY_COLORS = {
 }
 
 def get_pet_by_name(name):
-    return next((p for p in PETS if p['name'] == name), None)
+    return PET_CATALOG.get(name)
 
 def get_pet_rarity_color(rarity):
     return PET_RARITY_COLORS.get(rarity, 0x95a5a6)
@@ -190,7 +220,7 @@ class PetSelect(ui.View):
                 return
         
         # Update equipped pets
-        update_user(self.user_id, equipped_pets=selected_pets)
+        await aupdate_user(self.user_id, equipped_pets=selected_pets)
         
         # Create embed showing equipped pets
         embed = discord.Embed(title="🐾 Pets Equipped!", description="", color=0x00ff00)
@@ -218,22 +248,24 @@ class Pets(commands.Cog):
     @app_commands.command(name="adoptpet", description="Adopt a random pet (gacha)")
     async def adoptpet(self, interaction: discord.Interaction):
         print(f"[DEBUG] /adoptpet called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         if user_data.get("credits", 0) < PET_ADOPT_COST:
             await interaction.response.send_message(f"❌ You need {PET_ADOPT_COST} credits to adopt a pet.", ephemeral=True)
             return
-        available = PETS
-        weights = [RARITY_WEIGHTS[PET_RARITIES.get(p['name'], "Common")] for p in available]
-        pet = random.choices(available, weights=weights, k=1)[0]
+        pulled, pity = ADOPT_BANNER.pull(ADOPT_BANNER.pity_count(user_data))
+        pet = pulled[0]
         if pet['name'] in user_data.get("pets", []):
             # Dupe reward
-            user_data["credits"] += 50
-            update_user(interaction.user.id, credits=user_data["credits"])
+            await aupdate_user(interaction.user.id, gacha_pity=ADOPT_BANNER.with_pity(user_data, pity))
+            await aadjust_user(interaction.user.id, credits=50)
             await interaction.response.send_message(f"You got a duplicate **{pet['name']}**! You received 50 credits instead.")
             return
-        user_data.setdefault("pets", []).append(pet['name'])
-        user_data["credits"] -= PET_ADOPT_COST
-        update_user(interaction.user.id, credits=user_data["credits"], pets=user_data["pets"])
+        if await aadjust_user(interaction.user.id, floor=0, credits=-PET_ADOPT_COST) is None:
+            await interaction.response.send_message(f"❌ You need {PET_ADOPT_COST} credits to adopt a pet.", ephemeral=True)
+            return
+        # Only count the pull towards pity once it has been paid for
+        await aupdate_user(interaction.user.id, gacha_pity=ADOPT_BANNER.with_pity(user_data, pity))
+        await aadd_pet(interaction.user.id, pet['name'])
         embed = discord.Embed(
             title="🐾 New Pet Adopted!",
             description=f"You adopted **{pet['name']}**!",
@@ -241,26 +273,29 @@ class Pets(commands.Cog):
         )
         embed.set_footer(text="Try to collect them all!")
         await interaction.response.send_message(embed=embed)
+        await quests.record(interaction.user.id, quests.EVENT_ADOPT)
 
     @app_commands.command(name="premiumpets", description="Adopt a premium pet (gacha) with higher rare chance for 1000 credits")
     async def premiumpets(self, interaction: discord.Interaction):
         print(f"[DEBUG] /premiumpets called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         if user_data.get("credits", 0) < PREMIUM_PET_COST:
             await interaction.response.send_message(f"❌ You need {PREMIUM_PET_COST} credits to adopt a premium pet.", ephemeral=True)
             return
-        available = [p for p in PETS if p['rarity'] in ("Mythic", "Legendary", "Classified")]
-        weights = [PREMIUM_WEIGHTS[p['rarity']] for p in available]
-        pet = random.choices(available, weights=weights, k=1)[0]
+        pulled, pity = PREMIUM_BANNER.pull(PREMIUM_BANNER.pity_count(user_data))
+        pet = pulled[0]
         if pet['name'] in user_data.get("pets", []):
             # Dupe reward
-            user_data["credits"] += 200
-            update_user(interaction.user.id, credits=user_data["credits"])
+            await aupdate_user(interaction.user.id, gacha_pity=PREMIUM_BANNER.with_pity(user_data, pity))
+            await aadjust_user(interaction.user.id, credits=200)
             await interaction.response.send_message(f"You got a duplicate **{pet['name']}**! You received 200 credits instead.")
             return
-        user_data.setdefault("pets", []).append(pet['name'])
-        user_data["credits"] -= PREMIUM_PET_COST
-        update_user(interaction.user.id, credits=user_data["credits"], pets=user_data["pets"])
+        if await aadjust_user(interaction.user.id, floor=0, credits=-PREMIUM_PET_COST) is None:
+            await interaction.response.send_message(f"❌ You need {PREMIUM_PET_COST} credits to adopt a premium pet.", ephemeral=True)
+            return
+        # Only count the pull towards pity once it has been paid for
+        await aupdate_user(interaction.user.id, gacha_pity=PREMIUM_BANNER.with_pity(user_data, pity))
+        await aadd_pet(interaction.user.id, pet['name'])
         embed = discord.Embed(
             title="🌟 Premium Pet Adopted!",
             description=f"You adopted **{pet['name']}**! (Premium Gacha)",
@@ -268,11 +303,12 @@ class Pets(commands.Cog):
         )
         embed.set_footer(text="Try to collect all the rarest pets!")
         await interaction.response.send_message(embed=embed)
+        await quests.record(interaction.user.id, quests.EVENT_ADOPT)
 
     @app_commands.command(name="pets", description="View your adopted pets")
     async def pets(self, interaction: discord.Interaction):
         print(f"[DEBUG] /pets called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         if not user_data["pets"]:
             await interaction.response.send_message("You have no pets yet. Use /adoptpet!", ephemeral=True)
             return
@@ -300,7 +336,7 @@ class Pets(commands.Cog):
     @app_commands.describe(pet_name="The name of the pet to train")
     async def trainpet(self, interaction: discord.Interaction, pet_name: str):
         print(f"[DEBUG] /trainpet called by {interaction.user} for pet: {pet_name}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         if pet_name not in user_data["pets"]:
             await interaction.response.send_message(f"❌ You do not own a pet named '{pet_name}'.", ephemeral=True)
             return
@@ -317,16 +353,11 @@ class Pets(commands.Cog):
         stats["power"] += 1
         user_data.setdefault("pet_stats", {})[pet_name] = stats
         user_data.setdefault("pet_last_train", {})[pet_name] = now.isoformat()
-        update_user(interaction.user.id, pet_stats=user_data["pet_stats"], pet_last_train=user_data["pet_last_train"])
+        await aupdate_user(interaction.user.id, pet_stats=user_data["pet_stats"], pet_last_train=user_data["pet_last_train"])
         await interaction.response.send_message(f"🐾 {pet_name} trained! Power is now {stats['power']}.")
 
     async def petbattle_autocomplete(self, interaction: discord.Interaction, current: str):
-        user_data = get_user(interaction.user.id)
-        owned_pets = user_data.get("pets", [])
-        return [
-            app_commands.Choice(name=pet, value=pet)
-            for pet in owned_pets if current.lower() in pet.lower()
-        ][:25]  # Discord max autocomplete options
+        return await autocomplete.complete(interaction, current, PET_CATALOG.index, "pets")
 
     @app_commands.command(name="petbattle", description="Battle your pet against another user's equipped pet")
     @app_commands.describe(
@@ -342,8 +373,8 @@ class Pets(commands.Cog):
             await interaction.response.send_message("❌ To delete a battle, please use a different command or contact a moderator.", ephemeral=True)
             return
         
-        user_data = get_user(interaction.user.id)
-        opp_data = get_user(opponent.id)
+        user_data = await aget_user(interaction.user.id)
+        opp_data = await aget_user(opponent.id)
         
         # Check if user owns the pet
         user_pets = user_data.get("pets", [])
@@ -400,65 +431,47 @@ class Pets(commands.Cog):
         await interaction.response.send_message(embed=embed)
         
         # Simulate battle
-        battle_log = []
-        my_pet_hp = my_pet_obj["hp"]
-        opp_pet_hp = opp_pet_obj["hp"]
-        
-        battle_log.append("🎯 Battle begins!")
+        battle_log = ["🎯 Battle begins!"]
+        my_side = combat.side(mypet, my_pet_obj["hp"], (mypet, my_pet_obj["atk"]))
+        opp_side = combat.side(opponent_pet, opp_pet_obj["hp"], (opponent_pet, opp_pet_obj["atk"]))
+        outcome, hits = combat.fight_log(my_side, opp_side, max_turns=10)
+        round_num = 0
+        for hit in hits:
+            if hit.turn != round_num:
+                round_num = hit.turn
+                battle_log.append(f"\n**Round {round_num}**")
+            if hit.side == "a":
+                battle_log.append(f"⚔️ {mypet} attacks {opponent_pet} for {hit.damage} damage!")
+            else:
+                battle_log.append(f"⚔️ {opponent_pet} attacks {mypet} for {hit.damage} damage!")
         
-        # Battle rounds
-        round_num = 1
-        while round_num <= 10:  # Max 10 rounds
-            battle_log.append(f"\n**Round {round_num}**")
-            
-            # Your pet attacks
-            if my_pet_hp > 0:
-                damage = random.randint(int(my_pet_obj["atk"] * 0.8), int(my_pet_obj["atk"] * 1.2))
-                opp_pet_hp = max(0, opp_pet_hp - damage)
-                battle_log.append(f"⚔️ {mypet} attacks {opponent_pet} for {damage} damage!")
-                
-                if opp_pet_hp <= 0:
-                    battle_log.append(f"🏆 **{interaction.user.display_name} wins!**")
-                    break
-            
-            # Opponent pet attacks
-            if opp_pet_hp > 0:
-                damage = random.randint(int(opp_pet_obj["atk"] * 0.8), int(opp_pet_obj["atk"] * 1.2))
-                my_pet_hp = max(0, my_pet_hp - damage)
-                battle_log.append(f"⚔️ {opponent_pet} attacks {mypet} for {damage} damage!")
-                
-                if my_pet_hp <= 0:
-                    battle_log.append(f"🏆 **{opponent.display_name} wins!**")
-                    break
-                
-            round_num += 1
-        
-        if round_num > 10:
+        if outcome.winner == "a":
+            battle_log.append(f"🏆 **{interaction.user.display_name} wins!**")
+        elif outcome.winner == "b":
+            battle_log.append(f"🏆 **{opponent.display_name} wins!**")
+        else:
             battle_log.append("⏰ **Battle ended in a draw!** (Max rounds reached)")
         
         # Create battle result embed
         result_embed = discord.Embed(
             title="🐾 Battle Results",
             description="\n".join(battle_log),
-            color=0x00ff00 if opp_pet_hp <= 0 else 0xff0000
+            color=0x00ff00 if outcome.winner == "a" else 0xff0000
         )
         
         await interaction.followup.send(embed=result_embed)
+        if outcome.winner == "a":
+            await quests.record(interaction.user.id, quests.EVENT_PETBATTLE_WIN)
 
     async def equippet_autocomplete(self, interaction: discord.Interaction, current: str):
-        user_data = get_user(interaction.user.id)
-        owned_pets = user_data.get("pets", [])
-        return [
-            app_commands.Choice(name=pet, value=pet)
-            for pet in owned_pets if current.lower() in pet.lower()
-        ][:25]  # Discord max autocomplete options
+        return await autocomplete.complete(interaction, current, PET_CATALOG.index, "pets")
 
     @app_commands.command(name="equippet", description="Equip up to 2 pets to show on your profile")
     @app_commands.describe(pet="The name of the pet to equip")
     @app_commands.autocomplete(pet=equippet_autocomplete)
     async def equippet(self, interaction: discord.Interaction, pet: str):
         print(f"[DEBUG] /equippet called by {interaction.user} for pet: {pet}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         owned_pets = user_data.get("pets", [])
         equipped_pets = user_data.get("equipped_pets", [])
         
@@ -483,7 +496,7 @@ class Pets(commands.Cog):
         
         # Add pet to equipped pets
         equipped_pets.append(pet)
-        update_user(interaction.user.id, equipped_pets=equipped_pets)
+        await aupdate_user(interaction.user.id, equipped_pets=equipped_pets)
         
         # Create embed showing all equipped pets
         embed = discord.Embed(title="🐾 Pet Equipped!", description="", color=0x00ff00)
@@ -502,7 +515,7 @@ class Pets(commands.Cog):
     @app_commands.describe(pet="The name of the pet to unequip (leave blank to see current pets)")
     async def unequippet(self, interaction: discord.Interaction, pet: str = None):
         print(f"[DEBUG] /unequippet called by {interaction.user} for pet: {pet}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         equipped_pets = user_data.get("equipped_pets", [])
         
         if not equipped_pets:
@@ -530,7 +543,7 @@ class Pets(commands.Cog):
         
         # Remove pet from equipped pets
         equipped_pets.remove(pet)
-        update_user(interaction.user.id, equipped_pets=equipped_pets)
+        await aupdate_user(interaction.user.id, equipped_pets=equipped_pets)
         
         embed = discord.Embed(description=f"🐾 Unequipped **{pet}**.", color=0x95a5a6)
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -540,20 +553,21 @@ class Pets(commands.Cog):
     async def releasepet(self, interaction: discord.Interaction, pet: str):
         print(f"[DEBUG] /releasepet called by {interaction.user} for pet: {pet}")
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user(interaction.user.id)
             if pet not in user_data.get("pets", []):
                 await interaction.response.send_message(f"❌ You do not own '{pet}'.", ephemeral=True)
                 return
             
-            # Remove from pets
-            user_data["pets"].remove(pet)
+            # Remove one copy from pets
+            if not await aremove_pet(interaction.user.id, pet):
+                await interaction.response.send_message(f"❌ You do not own '{pet}'.", ephemeral=True)
+                return
             
             # If equipped, remove from equipped pets
             equipped_pets = user_data.get("equipped_pets", [])
             if pet in equipped_pets:
                 equipped_pets.remove(pet)
-            
-            update_user(interaction.user.id, pets=user_data["pets"], equipped_pets=equipped_pets)
+                await aupdate_user(interaction.user.id, equipped_pets=equipped_pets)
             embed = discord.Embed(
                 description=f"🕊️ You have released **{pet}**. Farewell!",
                 color=discord.Color.light_grey()
@@ -572,12 +586,7 @@ class Pets(commands.Cog):
                 pass
 
     async def comparepet_autocomplete(self, interaction: discord.Interaction, current: str):
-        user_data = get_user(interaction.user.id)
-        owned_pets = user_data.get("pets", [])
-        return [
-            app_commands.Choice(name=pet, value=pet)
-            for pet in owned_pets if current.lower() in pet.lower()
-        ][:25]
+        return await autocomplete.complete(interaction, current, PET_CATALOG.index, "pets")
 
     @app_commands.command(name="comparepet", description="Compare the stats of two pets by name")
     @app_commands.describe(pet1="The name of the first pet", pet2="The name of the second pet")
@@ -605,7 +614,7 @@ class Pets(commands.Cog):
     @app_commands.command(name="equippedpets", description="View and manage your equipped pets (up to 2 slots)")
     async def equippedpets(self, interaction: discord.Interaction):
         print(f"[DEBUG] /equippedpets called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         owned_pets = user_data.get("pets", [])
         equipped_pets = user_data.get("equipped_pets", [])
         
@@ -645,12 +654,7 @@ class Pets(commands.Cog):
         await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
     async def battleteam_autocomplete(self, interaction: discord.Interaction, current: str):
-        user_data = get_user(interaction.user.id)
-        owned_pets = user_data.get("pets", [])
-        return [
-            app_commands.Choice(name=pet, value=pet)
-            for pet in owned_pets if current.lower() in pet.lower()
-        ][:25]
+        return await autocomplete.complete(interaction, current, PET_CATALOG.index, "pets")
 
     @app_commands.command(name="petbattleteam", description="Set up your pet battle team (up to 3 pets)")
     @app_commands.describe(
@@ -661,7 +665,7 @@ class Pets(commands.Cog):
     @app_commands.autocomplete(pet1=battleteam_autocomplete, pet2=battleteam_autocomplete, pet3=battleteam_autocomplete)
     async def petbattleteam(self, interaction: discord.Interaction, pet1: str, pet2: str = None, pet3: str = None):
         print(f"[DEBUG] /petbattleteam called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         owned_pets = user_data.get("pets", [])
         
         # Build team list, filter out None and duplicates
@@ -682,7 +686,7 @@ class Pets(commands.Cog):
                 await interaction.response.send_message(f"❌ Pet '{pet}' not found in the global pet list. Please contact a mod.", ephemeral=True)
                 return
         # Save battle team
-        update_user(interaction.user.id, battle_team=team)
+        await aupdate_user(interaction.user.id, battle_team=team)
         # Create embed showing battle team
         embed = discord.Embed(title="⚔️ Battle Team Set!", description="Your pet battle team:", color=0xff6b6b)
         for i, pet in enumerate(team, 1):
@@ -705,7 +709,7 @@ class Pets(commands.Cog):
     @app_commands.command(name="adoptpet10x", description="Adopt 10 random pets at once (5% discount)")
     async def adoptpet10x(self, interaction: discord.Interaction):
         print(f"[DEBUG] /adoptpet10x called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         
         # Calculate cost with 5% discount
         base_cost = PET_ADOPT_COST * 10  # 10 pets at 250 each = 2,500
@@ -715,19 +719,20 @@ class Pets(commands.Cog):
             await interaction.response.send_message(f"❌ You need {discounted_cost} credits for 10x pet adoption. You have {user_data.get('credits', 0)} credits.", ephemeral=True)
             return
         
-        # Deduct credits
-        update_user(interaction.user.id, credits=user_data.get("credits", 0) - discounted_cost)
-        
         # Get 10 random pets
-        adopted_pets = []
-        for _ in range(10):
-            pet = random.choice(PETS)
-            adopted_pets.append(pet["name"])
-        
-        # Add pets to user's collection
-        user_pets = user_data.get("pets", [])
-        user_pets.extend(adopted_pets)
-        update_user(interaction.user.id, pets=user_pets)
+        pulled, pity = ADOPT_BANNER.pull(ADOPT_BANNER.pity_count(user_data), count=10)
+        adopted_pets = [pet["name"] for pet in pulled]
+        
+        # Charge, add the pets and save the pity counter together (only the pulled pets are written)
+        txn = UserTransaction()
+        txn.adjust(interaction.user.id, floor=0, credits=-discounted_cost)
+        for pet_name, count in Counter(adopted_pets).items():
+            txn.add_pet(interaction.user.id, pet_name, count)
+        txn.set(interaction.user.id, gacha_pity=ADOPT_BANNER.with_pity(user_data, pity))
+        if not await txn.acommit():
+            await interaction.response.send_message(f"❌ You need {discounted_cost} credits for 10x pet adoption.", ephemeral=True)
+            return
+        user_pets = user_data.get("pets", []) + adopted_pets
         
         # Create embed
         embed = discord.Embed(
@@ -737,29 +742,27 @@ class Pets(commands.Cog):
         )
         
         # Group pets by rarity for display
-        rarity_counts = {}
-        for pet_name in adopted_pets:
-            pet = get_pet_by_name(pet_name)
-            if pet:
-                rarity = pet["rarity"]
-                rarity_counts[rarity] = rarity_counts.get(rarity, 0) + 1
+        pets_by_rarity = {}
+        for pet in pulled:
+            pets_by_rarity.setdefault(pet.rarity, []).append(pet.name)
         
         # Display pets by rarity
-        for rarity in ["Common", "Uncommon", "Rare", "Epic", "Legendary", "Mythic"]:
-            if rarity in rarity_counts:
+        for rarity in ["Common", "Uncommon", "Rare", "Epic", "Legendary", "Mythic", "Classified"]:
+            if rarity in pets_by_rarity:
                 embed.add_field(
-                    name=f"{rarity} ({rarity_counts[rarity]})",
-                    value=", ".join([pet for pet in adopted_pets if get_pet_by_name(pet) and get_pet_by_name(pet).get("rarity") == rarity]),
+                    name=f"{rarity} ({len(pets_by_rarity[rarity])})",
+                    value=", ".join(pets_by_rarity[rarity]),
                     inline=False
                 )
         
         embed.set_footer(text=f"Total pets owned: {len(user_pets)}")
         await interaction.response.send_message(embed=embed)
+        await quests.record(interaction.user.id, quests.EVENT_ADOPT, len(adopted_pets))
 
     @app_commands.command(name="premiumpets10x", description="Adopt 10 premium pets at once (5% discount)")
     async def premiumpets10x(self, interaction: discord.Interaction):
         print(f"[DEBUG] /premiumpets10x called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         
         # Calculate cost with 5% discount
         base_cost = PREMIUM_PET_COST * 10  # 10 premium pets at 1000 each = 10,000
@@ -769,19 +772,20 @@ class Pets(commands.Cog):
             await interaction.response.send_message(f"❌ You need {discounted_cost} credits for 10x premium pet adoption. You have {user_data.get('credits', 0)} credits.", ephemeral=True)
             return
         
-        # Deduct credits
-        update_user(interaction.user.id, credits=user_data.get("credits", 0) - discounted_cost)
-        
         # Get 10 random premium pets
-        adopted_pets = []
-        for _ in range(10):
-            pet = random.choice(PETS)
-            adopted_pets.append(pet["name"])
-        
-        # Add pets to user's collection
-        user_pets = user_data.get("pets", [])
-        user_pets.extend(adopted_pets)
-        update_user(interaction.user.id, pets=user_pets)
+        pulled, pity = PREMIUM_BANNER.pull(PREMIUM_BANNER.pity_count(user_data), count=10)
+        adopted_pets = [pet["name"] for pet in pulled]
+        
+        # Charge, add the pets and save the pity counter together (only the pulled pets are written)
+        txn = UserTransaction()
+        txn.adjust(interaction.user.id, floor=0, credits=-discounted_cost)
+        for pet_name, count in Counter(adopted_pets).items():
+            txn.add_pet(interaction.user.id, pet_name, count)
+        txn.set(interaction.user.id, gacha_pity=PREMIUM_BANNER.with_pity(user_data, pity))
+        if not await txn.acommit():
+            await interaction.response.send_message(f"❌ You need {discounted_cost} credits for 10x premium pet adoption.", ephemeral=True)
+            return
+        user_pets = user_data.get("pets", []) + adopted_pets
         
         # Create embed
         embed = discord.Embed(
@@ -791,24 +795,22 @@ class Pets(commands.Cog):
         )
         
         # Group pets by rarity for display
-        rarity_counts = {}
-        for pet_name in adopted_pets:
-            pet = get_pet_by_name(pet_name)
-            if pet:
-                rarity = pet["rarity"]
-                rarity_counts[rarity] = rarity_counts.get(rarity, 0) + 1
+        pets_by_rarity = {}
+        for pet in pulled:
+            pets_by_rarity.setdefault(pet.rarity, []).append(pet.name)
         
         # Display pets by rarity
         for rarity in ["Common", "Uncommon", "Rare", "Epic", "Legendary", "Mythic", "Classified"]:
-            if rarity in rarity_counts:
+            if rarity in pets_by_rarity:
                 embed.add_field(
-                    name=f"{rarity} ({rarity_counts[rarity]})",
-                    value=", ".join([pet for pet in adopted_pets if get_pet_by_name(pet) and get_pet_by_name(pet).get("rarity") == rarity]),
+                    name=f"{rarity} ({len(pets_by_rarity[rarity])})",
+                    value=", ".join(pets_by_rarity[rarity]),
                     inline=False
                 )
         
         embed.set_footer(text=f"Total pets owned: {len(user_pets)}")
         await interaction.response.send_message(embed=embed)
+        await quests.record(interaction.user.id, quests.EVENT_ADOPT, len(adopted_pets))
 
 async def setup(bot):
     await bot.add_cog(Pets(bot)) 
\ No newline at end of file
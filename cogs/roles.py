@@ -2,9 +2,8 @@ import discord
 from discord.ext import commands
 from discord import app_commands, Colour
 from discord.ui import View, Button
-import json
-import os
 import traceback
+from state_store import state_store
 
 ROLES_FILE = "custom_roles.json"
 ROLE_CHANNELS_FILE = "role_channels.json"
@@ -29,24 +28,16 @@ COLOR_NAMES = {
 }
 
 def load_roles():
-    if not os.path.exists(ROLES_FILE):
-        return {}
-    with open(ROLES_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return state_store.load(ROLES_FILE, {})
 
 def save_roles(data):
-    with open(ROLES_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    state_store.save(ROLES_FILE, data)
 
 def load_role_channels():
-    if not os.path.exists(ROLE_CHANNELS_FILE):
-        return {}
-    with open(ROLE_CHANNELS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return state_store.load(ROLE_CHANNELS_FILE, {})
 
 def save_role_channels(data):
-    with open(ROLE_CHANNELS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    state_store.save(ROLE_CHANNELS_FILE, data)
 
 class RoleButton(Button):
     def __init__(self, role_name: str, role_color: discord.Color, custom_id: str):
@@ -1,6 +1,6 @@
 from discord.ext import commands, tasks
 import discord
-from discord import app_commands
+from discord import app_commands, ui
 
 # Try to import config, fall back to config_fallback if not available
 try:
@@ -9,11 +9,14 @@ except ImportError:
     import config_fallback as config
 
 import random
-import json
-import os
 import time
 from datetime import datetime, timedelta
-from db import get_user, update_user
+from db import (
+    aget_user, aget_user_fields, aupdate_user, aadjust_user, aadd_item, aremove_item, ahas_item, UserTransaction,
+    aget_listing, abrowse_listings, alisted_items, aget_trade, acreate_trade, adelete_trade
+)
+from autocomplete import autocomplete, PrefixIndex
+from cogs.pets import PET_CATALOG
 import asyncio
 
 # Expanded shop items: utility, guns, and more
@@ -46,6 +49,8 @@ SHOP_ITEMS = [
     {"name": "Containment Specialist Title", "price": 50000, "desc": "A prestigious title for your profile."},
 ]
 
+SHOP_INDEX = PrefixIndex(item["name"] for item in SHOP_ITEMS)
+
 SHOP_CATEGORIES = {
     "Weapons": [
         "Stun Baton", "Pistol", "SMG", "Shotgun", "Rifle"
@@ -61,28 +66,79 @@ SHOP_CATEGORIES = {
     ]
 }
 
-MARKETPLACE_FILE = "marketplace.json"
-TRADE_FILE = "trades.json"
+MARKETPLACE_PAGE_SIZE = 10
+MARKETPLACE_SORTS = {"newest": "Newest first", "price_asc": "Cheapest first", "price_desc": "Most expensive first"}
+
+# Seller display names shown on marketplace pages: (guild_id, user_id) -> (name, cached_at)
+SELLER_NAME_TTL = 600
+SELLER_NAME_CACHE_SIZE = 2000
+seller_names = {}
+
+def get_seller_name(bot, guild, user_id):
+    key = (guild.id if guild else None, user_id)
+    cached = seller_names.get(key)
+    if cached and time.monotonic() - cached[1] < SELLER_NAME_TTL:
+        return cached[0]
+    user = (guild.get_member(user_id) if guild else None) or bot.get_user(user_id)
+    name = user.display_name if user else f"User {user_id}"
+    if len(seller_names) >= SELLER_NAME_CACHE_SIZE:
+        # Drop the oldest entry; dicts keep insertion order
+        seller_names.pop(next(iter(seller_names)))
+    seller_names[key] = (name, time.monotonic())
+    return name
+
+class MarketplaceBrowser(ui.View):
+    """Previous/next buttons over keyset-paged marketplace listings"""
+    def __init__(self, bot, user_id, guild, item=None, sort="newest"):
+        super().__init__(timeout=120)
+        self.bot = bot
+        self.user_id = user_id
+        self.guild = guild
+        self.item = item
+        self.sort = sort
+        # Cursor that starts each page visited so far; the last one is the current page
+        self.cursors = [None]
+        self.next_cursor = None
+        self.listings = []
 
-def load_marketplace():
-    if not os.path.exists(MARKETPLACE_FILE):
-        return []
-    with open(MARKETPLACE_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    async def load(self):
+        self.listings, self.next_cursor = await abrowse_listings(self.item, self.sort, MARKETPLACE_PAGE_SIZE, self.cursors[-1])
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.next_cursor is None
 
-def save_marketplace(data):
-    with open(MARKETPLACE_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    def build_embed(self):
+        title = f"🛒 Marketplace Listings - {self.item}" if self.item else "🛒 Marketplace Listings"
+        embed = discord.Embed(title=title, color=discord.Color.blurple())
+        for l in self.listings:
+            embed.add_field(
+                name=f"ID: {l['id']} | {l['item']}",
+                value=f"Price: {l['price']} credits\nSeller: {get_seller_name(self.bot, self.guild, l['seller_id'])}",
+                inline=False
+            )
+        embed.set_footer(text=f"Page {len(self.cursors)} | {MARKETPLACE_SORTS[self.sort]} | Buy with /marketplace_buy listing_id:<ID>")
+        return embed
 
-def load_trades():
-    if not os.path.exists(TRADE_FILE):
-        return []
-    with open(TRADE_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("❌ Run /marketplace_browse to get your own view.", ephemeral=True)
+            return False
+        return True
 
-def save_trades(data):
-    with open(TRADE_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
+    async def show_page(self, interaction):
+        await self.load()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    @ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await self.show_page(interaction)
+
+    @ui.button(label="Next ▶", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: ui.Button):
+        if self.next_cursor is not None:
+            self.cursors.append(self.next_cursor)
+        await self.show_page(interaction)
 
 class Shop(commands.Cog):
     def __init__(self, bot):
@@ -106,7 +162,7 @@ class Shop(commands.Cog):
         await interaction.response.send_message(embed=embed)
 
     async def buy_autocomplete(self, interaction: discord.Interaction, current: str):
-        return [app_commands.Choice(name=item["name"], value=item["name"]) for item in SHOP_ITEMS if current.lower() in item["name"].lower()][:25]
+        return await autocomplete.complete(interaction, current, SHOP_INDEX)
 
     @app_commands.command(name="buy", description="Buy an item from the shop by number or name")
     @app_commands.describe(item="The item number or name to buy")
@@ -114,7 +170,7 @@ class Shop(commands.Cog):
     @commands.cooldown(1, 5, commands.BucketType.user)
     async def buy(self, interaction: discord.Interaction, item: str):
         print(f"[DEBUG] /buy called by {interaction.user} for item: {item}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         # Try to buy by number first
         item_obj = None
         if item.isdigit():
@@ -127,38 +183,44 @@ class Shop(commands.Cog):
             embed = discord.Embed(description=f"❌ Item '{item}' not found in the shop.\nUsage: /buy item:<item name>", color=discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
-        if user_data.get("credits", 0) < item_obj["price"]:
+        if await aadjust_user(interaction.user.id, floor=0, credits=-item_obj["price"]) is None:
             embed = discord.Embed(description=f"❌ You don't have enough credits to buy {item_obj['name']}.", color=discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
-        user_data["credits"] -= item_obj["price"]
-        # Handle boosts and cosmetics
-        if item_obj["name"] == "Double XP (1h)":
-            user_data["xp_boost"] = time.time() + 3600
-            msg = "✅ Double XP boost activated for 1 hour!"
-        elif item_obj["name"] == "Double Credits (1h)":
-            user_data["credit_boost"] = time.time() + 3600
-            msg = "✅ Double Credits boost activated for 1 hour!"
-        elif item_obj["name"] == "VIP Badge":
-            badges = user_data.get("badges", [])
-            if "VIP" not in badges:
-                badges.append("VIP")
-            user_data["badges"] = badges
-            msg = "✅ VIP Badge added to your profile!"
-        elif item_obj["name"] == "Containment Specialist Title":
-            user_data["title"] = "Containment Specialist"
-            msg = "✅ Title 'Containment Specialist' added to your profile!"
-        else:
-            user_data["inventory"].append(item_obj["name"])
-            msg = f"✅ You bought **{item_obj['name']}** for {item_obj['price']} credits!"
-        update_user(interaction.user.id, **user_data)
+        # Credits were already taken atomically above; only write the fields this purchase sets
+        changes = {}
+        try:
+            # Handle boosts and cosmetics
+            if item_obj["name"] == "Double XP (1h)":
+                changes["xp_boost"] = time.time() + 3600
+                msg = "✅ Double XP boost activated for 1 hour!"
+            elif item_obj["name"] == "Double Credits (1h)":
+                changes["credit_boost"] = time.time() + 3600
+                msg = "✅ Double Credits boost activated for 1 hour!"
+            elif item_obj["name"] == "VIP Badge":
+                badges = list(user_data.get("badges") or [])
+                if "VIP" not in badges:
+                    badges.append("VIP")
+                changes["badges"] = badges
+                msg = "✅ VIP Badge added to your profile!"
+            elif item_obj["name"] == "Containment Specialist Title":
+                changes["title"] = "Containment Specialist"
+                msg = "✅ Title 'Containment Specialist' added to your profile!"
+            else:
+                await aadd_item(interaction.user.id, item_obj["name"])
+                msg = f"✅ You bought **{item_obj['name']}** for {item_obj['price']} credits!"
+            if changes:
+                await aupdate_user(interaction.user.id, **changes)
+        except Exception:
+            await aadjust_user(interaction.user.id, credits=item_obj["price"])
+            raise
         embed = discord.Embed(description=msg, color=discord.Color.green())
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command(name="inventory", description="View your inventory")
     async def inventory(self, interaction: discord.Interaction):
         print(f"[DEBUG] /inventory called by {interaction.user}")
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         embed = discord.Embed(
             title=f"\U0001f392 Inventory: {interaction.user.display_name}",
             color=config.EMBED_COLORS["info"]
@@ -173,26 +235,28 @@ class Shop(commands.Cog):
     @app_commands.describe(item="The item to upgrade")
     async def upgrade(self, interaction: discord.Interaction, item: str):
         print(f"[DEBUG] /upgrade called by {interaction.user} for item: {item}")
-        user_data = get_user(interaction.user.id)
         upgrades = {"Stun Baton": ("Enhanced Stun Baton", 100)}
         item_name = next((i for i in upgrades if i.lower() == item.lower()), None)
         if not item_name:
             embed = discord.Embed(description=f"❌ '{item}' cannot be upgraded.", color=discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
-        if item_name not in user_data["inventory"]:
+        if not await ahas_item(interaction.user.id, item_name):
             embed = discord.Embed(description=f"❌ You do not own a '{item_name}' in your inventory.", color=discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
         new_name, cost = upgrades[item_name]
-        if user_data["credits"] < cost:
+        if await aadjust_user(interaction.user.id, floor=0, credits=-cost) is None:
             embed = discord.Embed(description=f"❌ You need {cost} credits to upgrade '{item_name}'.", color=discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
-        user_data["credits"] -= cost
-        user_data["inventory"].remove(item_name)
-        user_data["inventory"].append(new_name)
-        update_user(interaction.user.id, credits=user_data["credits"], inventory=user_data["inventory"])
+        if not await aremove_item(interaction.user.id, item_name):
+            # The item went elsewhere while we were charging; give the credits back
+            await aadjust_user(interaction.user.id, credits=cost)
+            embed = discord.Embed(description=f"❌ You do not own a '{item_name}' in your inventory.", color=discord.Color.red())
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+        await aadd_item(interaction.user.id, new_name)
         embed = discord.Embed(description=f"✅ Upgraded **{item_name}** to **{new_name}** for {cost} credits!", color=discord.Color.green())
         await interaction.response.send_message(embed=embed)
 
@@ -200,117 +264,97 @@ class Shop(commands.Cog):
     @app_commands.describe(item="The name of the item to remove")
     async def removeitem(self, interaction: discord.Interaction, item: str):
         print(f"[DEBUG] /removeitem called by {interaction.user} for item: {item}")
-        user_data = get_user(interaction.user.id)
-        if item not in user_data["inventory"]:
+        if not await aremove_item(interaction.user.id, item):
             embed = discord.Embed(description=f"❌ You do not have '{item}' in your inventory.", color=discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
-        user_data["inventory"].remove(item)
-        update_user(interaction.user.id, inventory=user_data["inventory"])
         embed = discord.Embed(description=f"✅ Removed **{item}** from your inventory.", color=discord.Color.green())
         await interaction.response.send_message(embed=embed)
 
     async def market_item_autocomplete(self, interaction: discord.Interaction, current: str):
-        user_data = get_user(interaction.user.id)
-        return [app_commands.Choice(name=i, value=i) for i in user_data["inventory"] if current.lower() in i.lower()][:25]
+        return await autocomplete.complete(interaction, current, SHOP_INDEX, "inventory")
 
     @app_commands.command(name="marketplace_list", description="List an item from your inventory for sale on the marketplace.")
     @app_commands.describe(item="The name of the item to list", price="Sale price in credits")
     @app_commands.autocomplete(item=market_item_autocomplete)
     async def marketplace_list(self, interaction: discord.Interaction, item: str, price: int):
-        user_data = get_user(interaction.user.id)
-        if item not in user_data["inventory"]:
-            await interaction.response.send_message(f"❌ You do not have '{item}' in your inventory.", ephemeral=True)
-            return
         if price <= 0:
             await interaction.response.send_message("❌ Price must be positive.", ephemeral=True)
             return
         # Remove item from inventory and add to marketplace
-        user_data["inventory"].remove(item)
-        update_user(interaction.user.id, inventory=user_data["inventory"])
-        listings = load_marketplace()
-        listing_id = int(time.time() * 1000)
-        listings.append({
-            "id": listing_id,
-            "seller_id": interaction.user.id,
-            "item": item,
-            "price": price,
-            "timestamp": time.time()
-        })
-        save_marketplace(listings)
+        txn = UserTransaction()
+        txn.remove_item(interaction.user.id, item)
+        txn.insert("marketplace_listings", seller_id=interaction.user.id, item=item, price=price)
+        if not await txn.acommit():
+            await interaction.response.send_message(f"❌ You do not have '{item}' in your inventory.", ephemeral=True)
+            return
+        listing_id = txn.inserted[0]
         await interaction.response.send_message(f"✅ Listed '{item}' for {price} credits on the marketplace! (Listing ID: {listing_id})", ephemeral=True)
 
+    async def listed_item_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=i, value=i) for i in await alisted_items(current)]
+
     @app_commands.command(name="marketplace_browse", description="Browse all items for sale on the marketplace.")
-    async def marketplace_browse(self, interaction: discord.Interaction):
-        listings = load_marketplace()
-        if not listings:
-            await interaction.response.send_message("No items are currently listed on the marketplace.", ephemeral=True)
-            return
-        embed = discord.Embed(title="🛒 Marketplace Listings", color=discord.Color.blurple())
-        for l in listings:
-            seller = interaction.guild.get_member(l["seller_id"]) if interaction.guild else None
-            seller_name = seller.display_name if seller else f"User {l['seller_id']}"
-            embed.add_field(
-                name=f"ID: {l['id']} | {l['item']}",
-                value=f"Price: {l['price']} credits\nSeller: {seller_name}",
-                inline=False
-            )
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+    @app_commands.describe(item="Only show listings of this item", sort="How to order the listings")
+    @app_commands.choices(sort=[app_commands.Choice(name=label, value=value) for value, label in MARKETPLACE_SORTS.items()])
+    @app_commands.autocomplete(item=listed_item_autocomplete)
+    async def marketplace_browse(self, interaction: discord.Interaction, item: str = None, sort: app_commands.Choice[str] = None):
+        view = MarketplaceBrowser(self.bot, interaction.user.id, interaction.guild, item, sort.value if sort else "newest")
+        await view.load()
+        if not view.listings:
+            message = f"No '{item}' listings are currently on the marketplace." if item else "No items are currently listed on the marketplace."
+            await interaction.response.send_message(message, ephemeral=True)
+            return
+        await interaction.response.send_message(embed=view.build_embed(), view=view, ephemeral=True)
 
     @app_commands.command(name="marketplace_buy", description="Buy an item from the marketplace by listing ID.")
     @app_commands.describe(listing_id="The ID of the listing to buy")
     async def marketplace_buy(self, interaction: discord.Interaction, listing_id: int):
-        listings = load_marketplace()
-        listing = next((l for l in listings if l["id"] == listing_id), None)
+        listing = await aget_listing(listing_id)
         if not listing:
             await interaction.response.send_message(f"❌ Listing ID {listing_id} not found.", ephemeral=True)
             return
         if listing["seller_id"] == interaction.user.id:
             await interaction.response.send_message("❌ You cannot buy your own listing.", ephemeral=True)
             return
-        buyer_data = get_user(interaction.user.id)
-        if buyer_data.get("credits", 0) < listing["price"]:
-            await interaction.response.send_message("❌ You do not have enough credits to buy this item.", ephemeral=True)
-            return
-        # Transfer credits and item
-        seller_data = get_user(listing["seller_id"])
-        buyer_data["credits"] -= listing["price"]
-        buyer_data["inventory"].append(listing["item"])
-        seller_data["credits"] = seller_data.get("credits", 0) + listing["price"]
-        update_user(interaction.user.id, credits=buyer_data["credits"], inventory=buyer_data["inventory"])
-        update_user(listing["seller_id"], credits=seller_data["credits"])
-        # Remove listing
-        listings = [l for l in listings if l["id"] != listing_id]
-        save_marketplace(listings)
+        # Take the listing, transfer credits and item together
+        txn = UserTransaction()
+        txn.claim("marketplace_listings", id=listing_id)
+        txn.adjust(interaction.user.id, floor=0, credits=-listing["price"])
+        txn.adjust(listing["seller_id"], credits=listing["price"])
+        txn.add_item(interaction.user.id, listing["item"])
+        if not await txn.acommit():
+            if await aget_listing(listing_id) is None:
+                await interaction.response.send_message(f"❌ Listing ID {listing_id} has already been sold or retrieved.", ephemeral=True)
+            else:
+                await interaction.response.send_message("❌ You do not have enough credits to buy this item.", ephemeral=True)
+            return
         await interaction.response.send_message(f"✅ You bought '{listing['item']}' from <@{listing['seller_id']}> for {listing['price']} credits!", ephemeral=True)
 
     @app_commands.command(name="marketplace_retrieve", description="Retrieve your item from the marketplace by listing ID.")
     @app_commands.describe(listing_id="The ID of the listing to retrieve")
     async def marketplace_retrieve(self, interaction: discord.Interaction, listing_id: int):
-        listings = load_marketplace()
-        listing = next((l for l in listings if l["id"] == listing_id), None)
+        listing = await aget_listing(listing_id)
         if not listing:
             await interaction.response.send_message(f"❌ Listing ID {listing_id} not found.", ephemeral=True)
             return
         if listing["seller_id"] != interaction.user.id:
             await interaction.response.send_message("❌ Only the seller can retrieve this item.", ephemeral=True)
             return
-        # Return item to seller
-        user_data = get_user(interaction.user.id)
-        user_data["inventory"].append(listing["item"])
-        update_user(interaction.user.id, inventory=user_data["inventory"])
-        # Remove listing
-        listings = [l for l in listings if l["id"] != listing_id]
-        save_marketplace(listings)
+        # Remove listing and return item to seller
+        txn = UserTransaction()
+        txn.claim("marketplace_listings", id=listing_id, seller_id=interaction.user.id)
+        txn.add_item(interaction.user.id, listing["item"])
+        if not await txn.acommit():
+            await interaction.response.send_message(f"❌ Listing ID {listing_id} has already been sold or retrieved.", ephemeral=True)
+            return
         await interaction.response.send_message(f"✅ Retrieved '{listing['item']}' from the marketplace and returned it to your inventory.", ephemeral=True)
 
     async def trade_item_autocomplete(self, interaction: discord.Interaction, current: str):
-        user_data = get_user(interaction.user.id)
-        return [app_commands.Choice(name=i, value=i) for i in user_data["inventory"] if current.lower() in i.lower()][:25]
+        return await autocomplete.complete(interaction, current, SHOP_INDEX, "inventory")
 
     async def trade_pet_autocomplete(self, interaction: discord.Interaction, current: str):
-        user_data = get_user(interaction.user.id)
-        return [app_commands.Choice(name=p, value=p) for p in user_data.get("pets", []) if current.lower() in p.lower()][:25]
+        return await autocomplete.complete(interaction, current, PET_CATALOG.index, "pets")
 
     @app_commands.command(name="trade", description="Propose a trade to another user (items, pets, or credits)")
     @app_commands.describe(user="The user to trade with", offer_item="Item from your inventory to offer", offer_pet="Pet from your collection to offer", request_item="Item you want in return", request_pet="Pet you want in return", request_credits="Credits you want in return")
@@ -320,8 +364,8 @@ class Shop(commands.Cog):
         if user.id == interaction.user.id:
             await interaction.response.send_message("❌ You cannot trade with yourself.", ephemeral=True)
             return
-        user_data = get_user(interaction.user.id)
-        target_data = get_user(user.id)
+        user_data = await aget_user(interaction.user.id)
+        target_data = await aget_user(user.id)
         # Check offer item
         if offer_item and offer_item not in user_data["inventory"]:
             await interaction.response.send_message(f"❌ You do not have '{offer_item}' in your inventory.", ephemeral=True)
@@ -343,21 +387,14 @@ class Shop(commands.Cog):
             await interaction.response.send_message(f"❌ {user.display_name} does not have enough credits.", ephemeral=True)
             return
         # Store pending trade
-        trades = load_trades()
-        trade_id = int(time.time() * 1000)
-        trade = {
-            "id": trade_id,
-            "from_id": interaction.user.id,
-            "to_id": user.id,
-            "offer_item": offer_item,
-            "offer_pet": offer_pet,
-            "request_item": request_item,
-            "request_pet": request_pet,
-            "request_credits": request_credits,
-            "status": "pending"
-        }
-        trades.append(trade)
-        save_trades(trades)
+        trade_id = await acreate_trade(
+            interaction.user.id, user.id,
+            offer_item=offer_item,
+            offer_pet=offer_pet,
+            request_item=request_item,
+            request_pet=request_pet,
+            request_credits=request_credits
+        )
         # Notify initiator only (ephemeral)
         await interaction.response.send_message(f"✅ Trade proposed to {user.display_name}! (Trade ID: {trade_id})\nThey must confirm with `/confirmtrade trade_id:{trade_id}`.", ephemeral=True)
         # DM the recipient
@@ -381,8 +418,7 @@ class Shop(commands.Cog):
     @app_commands.command(name="confirmtrade", description="Confirm and execute a pending trade by trade ID.")
     @app_commands.describe(trade_id="The ID of the trade to confirm")
     async def confirmtrade(self, interaction: discord.Interaction, trade_id: int):
-        trades = load_trades()
-        trade = next((t for t in trades if t["id"] == trade_id), None)
+        trade = await aget_trade(trade_id)
         if not trade:
             await interaction.response.send_message(f"❌ Trade ID {trade_id} not found.", ephemeral=True)
             return
@@ -390,8 +426,8 @@ class Shop(commands.Cog):
             await interaction.response.send_message("❌ Only the recipient can confirm this trade.", ephemeral=True)
             return
         # Check both users still have the required items/pets/credits
-        from_data = get_user(trade["from_id"])
-        to_data = get_user(trade["to_id"])
+        from_data = await aget_user_fields(trade["from_id"], "inventory", "pets")
+        to_data = await aget_user_fields(trade["to_id"], "inventory", "pets", "credits")
         # Offer checks
         if trade["offer_item"] and trade["offer_item"] not in from_data["inventory"]:
             await interaction.response.send_message(f"❌ The offerer no longer has '{trade['offer_item']}'.", ephemeral=True)
@@ -409,32 +445,23 @@ class Shop(commands.Cog):
         if trade["request_credits"] and to_data.get("credits", 0) < trade["request_credits"]:
             await interaction.response.send_message(f"❌ You do not have enough credits.", ephemeral=True)
             return
-        # Execute trade
-        # Transfer offer item
+        # Execute trade - the trade is consumed and every transfer applied together, or nothing happens
+        txn = UserTransaction()
+        txn.claim("trades", id=trade_id, to_id=interaction.user.id)
         if trade["offer_item"]:
-            from_data["inventory"].remove(trade["offer_item"])
-            to_data["inventory"].append(trade["offer_item"])
-        # Transfer offer pet
+            txn.move_item(trade["from_id"], trade["to_id"], trade["offer_item"])
         if trade["offer_pet"]:
-            from_data["pets"].remove(trade["offer_pet"])
-            to_data.setdefault("pets", []).append(trade["offer_pet"])
-        # Transfer request item
+            txn.move_pet(trade["from_id"], trade["to_id"], trade["offer_pet"])
         if trade["request_item"]:
-            to_data["inventory"].remove(trade["request_item"])
-            from_data["inventory"].append(trade["request_item"])
-        # Transfer request pet
+            txn.move_item(trade["to_id"], trade["from_id"], trade["request_item"])
         if trade["request_pet"]:
-            to_data["pets"].remove(trade["request_pet"])
-            from_data.setdefault("pets", []).append(trade["request_pet"])
-        # Transfer credits
+            txn.move_pet(trade["to_id"], trade["from_id"], trade["request_pet"])
         if trade["request_credits"]:
-            to_data["credits"] -= trade["request_credits"]
-            from_data["credits"] = from_data.get("credits", 0) + trade["request_credits"]
-        update_user(trade["from_id"], **from_data)
-        update_user(trade["to_id"], **to_data)
-        # Remove trade
-        trades = [t for t in trades if t["id"] != trade_id]
-        save_trades(trades)
+            txn.adjust(trade["to_id"], floor=0, credits=-trade["request_credits"])
+            txn.adjust(trade["from_id"], credits=trade["request_credits"])
+        if not await txn.acommit():
+            await interaction.response.send_message("❌ The trade could not be completed - one of you no longer has the traded items, pets, or credits.", ephemeral=True)
+            return
         await interaction.response.send_message(f"✅ Trade completed between <@{trade['from_id']}> and <@{trade['to_id']}>! Items, pets, and credits have been exchanged.", ephemeral=False)
         # Optionally notify the offerer
         try:
@@ -447,37 +474,30 @@ class Shop(commands.Cog):
     @app_commands.command(name="canceltrade", description="Cancel a pending trade you initiated by trade ID.")
     @app_commands.describe(trade_id="The ID of the trade to cancel")
     async def canceltrade(self, interaction: discord.Interaction, trade_id: int):
-        trades = load_trades()
-        trade = next((t for t in trades if t["id"] == trade_id), None)
+        trade = await aget_trade(trade_id)
         if not trade:
             await interaction.response.send_message(f"❌ Trade ID {trade_id} not found.", ephemeral=True)
             return
         if trade["from_id"] != interaction.user.id:
             await interaction.response.send_message("❌ Only the trade initiator can cancel this trade.", ephemeral=True)
             return
-        # Return offered item/pet to initiator if not already traded
-        from_data = get_user(trade["from_id"])
-        if trade["offer_item"]:
-            from_data["inventory"].append(trade["offer_item"])
-        if trade["offer_pet"]:
-            from_data.setdefault("pets", []).append(trade["offer_pet"])
-        update_user(trade["from_id"], **from_data)
-        # Remove trade
-        trades = [t for t in trades if t["id"] != trade_id]
-        save_trades(trades)
-        await interaction.response.send_message(f"✅ Trade cancelled and your offered items/pets have been returned.", ephemeral=True)
+        # Offered items/pets stay with the initiator until the trade is confirmed, so there is nothing to return
+        if not await adelete_trade(trade_id, from_id=interaction.user.id):
+            await interaction.response.send_message(f"❌ Trade ID {trade_id} has already been completed or cancelled.", ephemeral=True)
+            return
+        await interaction.response.send_message(f"✅ Trade cancelled.", ephemeral=True)
 
     @app_commands.command(name="equipgun", description="Equip a gun from your inventory.")
     @app_commands.describe(gun="The name of the gun to equip")
     async def equipgun(self, interaction: discord.Interaction, gun: str):
-        user_data = get_user(interaction.user.id)
+        user_data = await aget_user(interaction.user.id)
         # List of guns (should match your shop's gun names)
         gun_names = ["Pistol", "SMG", "Shotgun", "Rifle"]
         if gun not in user_data["inventory"] or gun not in gun_names:
             await interaction.response.send_message(f"❌ You do not have '{gun}' in your inventory or it is not a valid gun.", ephemeral=True)
             return
         user_data["equipped_gun"] = gun
-        update_user(interaction.user.id, equipped_gun=gun)
+        await aupdate_user(interaction.user.id, equipped_gun=gun)
         await interaction.response.send_message(f"✅ You have equipped '{gun}'.", ephemeral=True)
 
 async def setup(bot):
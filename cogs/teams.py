@@ -14,7 +14,7 @@ import json
 import os
 import time
 from datetime import datetime, timedelta
-from db import get_user, update_user, get_team, update_team, get_all_users
+from db import aget_user, aupdate_user, aget_team, aupdate_team, aget_all_users
 
 TEAM_ROLES = ["Owner", "Deputy", "Officer", "Member"]
 
@@ -27,18 +27,18 @@ class Teams(commands.Cog):
     async def createteam(self, interaction: discord.Interaction, name: str):
         print(f"[DEBUG] /createteam called by {interaction.user} for team: {name}")
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user(interaction.user.id)
             if user_data.get("team"):
                 await interaction.response.send_message("❌ You are already in a team. Leave it first with /leaveteam.", ephemeral=True)
                 return
-            if get_team(name):
+            if await aget_team(name):
                 await interaction.response.send_message("❌ A team with that name already exists.", ephemeral=True)
                 return
             # Create team
             members = [interaction.user.id]
             now = discord.utils.utcnow().isoformat()
-            update_team(name, owner=interaction.user.id, members=members, created=now, points=0)
-            update_user(interaction.user.id, team=name, team_role="Owner")
+            await aupdate_team(name, owner=interaction.user.id, members=members, created=now, points=0)
+            await aupdate_user(interaction.user.id, team=name, team_role="Owner")
             await interaction.response.send_message(f"✅ Team '{name}' created! You are the owner.")
         except Exception as e:
             print(f"[ERROR] /createteam error: {e}")
@@ -50,12 +50,12 @@ class Teams(commands.Cog):
     async def inviteteam(self, interaction: discord.Interaction, user: discord.Member):
         print(f"[DEBUG] /inviteteam called by {interaction.user} for user: {user.display_name}")
         try:
-            inviter_data = get_user(interaction.user.id)
+            inviter_data = await aget_user(interaction.user.id)
             team_name = inviter_data.get("team")
             if not team_name:
                 await interaction.response.send_message("You are not in a team.", ephemeral=True)
                 return
-            team = get_team(team_name)
+            team = await aget_team(team_name)
             if not team:
                 await interaction.response.send_message("Your team does not exist.", ephemeral=True)
                 return
@@ -68,7 +68,7 @@ class Teams(commands.Cog):
                 await interaction.response.send_message(f"{user.display_name} has already been invited.", ephemeral=True)
                 return
             invites.append(user.id)
-            update_team(team_name, invites=invites)
+            await aupdate_team(team_name, invites=invites)
             try:
                 await user.send(f"You have been invited to join the team '{team_name}' in {interaction.guild.name}! Use /jointeam {team_name} to accept.")
             except Exception:
@@ -84,11 +84,11 @@ class Teams(commands.Cog):
     async def jointeam(self, interaction: discord.Interaction, name: str):
         print(f"[DEBUG] /jointeam called by {interaction.user} for team: {name}")
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user(interaction.user.id)
             if user_data.get("team"):
                 await interaction.response.send_message("❌ You are already in a team. Leave it first with /leaveteam.", ephemeral=True)
                 return
-            team = get_team(name)
+            team = await aget_team(name)
             if not team:
                 await interaction.response.send_message("❌ No team with that name exists.", ephemeral=True)
                 return
@@ -101,8 +101,8 @@ class Teams(commands.Cog):
                 return
             team["members"].append(interaction.user.id)
             team["invites"].remove(interaction.user.id)
-            update_team(name, members=team["members"], invites=team["invites"])
-            update_user(interaction.user.id, team=name, team_role="Member")
+            await aupdate_team(name, members=team["members"], invites=team["invites"])
+            await aupdate_user(interaction.user.id, team=name, team_role="Member")
             await interaction.response.send_message(f"✅ You joined the team '{name}'!")
         except Exception as e:
             print(f"[ERROR] /jointeam error: {e}")
@@ -118,7 +118,7 @@ class Teams(commands.Cog):
             if role not in ["Officer", "Deputy"]:
                 await interaction.response.send_message("Role must be Officer or Deputy.", ephemeral=True)
                 return
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user(interaction.user.id)
             if user_data.get("team_role") not in ["Owner", "Deputy"]:
                 await interaction.response.send_message("Only the Owner or Deputy can promote members.", ephemeral=True)
                 return
@@ -126,18 +126,18 @@ class Teams(commands.Cog):
             if not team_name:
                 await interaction.response.send_message("You are not in a team.", ephemeral=True)
                 return
-            team = get_team(team_name)
+            team = await aget_team(team_name)
             if user.id not in team["members"]:
                 await interaction.response.send_message("That user is not in your team.", ephemeral=True)
                 return
             if role == "Deputy":
                 # Only one Deputy per team
-                all_users = get_all_users()
+                all_users = await aget_all_users()
                 for u in all_users:
                     if u.get("team") == team_name and u.get("team_role") == "Deputy":
                         await interaction.response.send_message("There is already a Deputy in your team.", ephemeral=True)
                         return
-            update_user(user.id, team_role=role)
+            await aupdate_user(user.id, team_role=role)
             await interaction.response.send_message(f"✅ Promoted {user.display_name} to {role}.")
         except Exception as e:
             print(f"[ERROR] /promote error: {e}")
@@ -149,7 +149,7 @@ class Teams(commands.Cog):
     async def demote(self, interaction: discord.Interaction, user: discord.Member):
         print(f"[DEBUG] /demote called by {interaction.user} for user: {user.display_name}")
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user(interaction.user.id)
             if user_data.get("team_role") not in ["Owner", "Deputy"]:
                 await interaction.response.send_message("Only the Owner or Deputy can demote members.", ephemeral=True)
                 return
@@ -157,11 +157,11 @@ class Teams(commands.Cog):
             if not team_name:
                 await interaction.response.send_message("You are not in a team.", ephemeral=True)
                 return
-            team = get_team(team_name)
+            team = await aget_team(team_name)
             if user.id not in team["members"]:
                 await interaction.response.send_message("That user is not in your team.", ephemeral=True)
                 return
-            update_user(user.id, team_role="Member")
+            await aupdate_user(user.id, team_role="Member")
             await interaction.response.send_message(f"✅ Demoted {user.display_name} to Member.")
         except Exception as e:
             print(f"[ERROR] /demote error: {e}")
@@ -172,16 +172,16 @@ class Teams(commands.Cog):
     async def team(self, interaction: discord.Interaction):
         print(f"[DEBUG] /team called by {interaction.user}")
         try:
-            user_data = get_user(interaction.user.id)
+            user_data = await aget_user(interaction.user.id)
             team_name = user_data.get("team")
             if not team_name:
                 await interaction.response.send_message("You are not in a team.", ephemeral=True)
                 return
-            team = get_team(team_name)
+            team = await aget_team(team_name)
             if not team:
                 await interaction.response.send_message(f"Team '{team_name}' does not exist.", ephemeral=True)
                 return
-            all_users = get_all_users()
+            all_users = await aget_all_users()
             member_roles = {}
             for u in all_users:
                 if u.get("team") == team_name:
@@ -0,0 +1,125 @@
+# combat.py
+"""
+Turn-based combat shared by /recontainscp and /petbattle.
+
+A fight is between two sides. Each side has one HP pool and one or more
+attackers (the player and their pets, an SCP, a single pet). Every turn side
+A's attackers hit in order, then side B's, each for a roll between 80% and
+120% of its ATK, until one pool is empty or the turn limit is reached (a
+draw). resolve() only works out who won; fight_log() also returns every hit
+so commands can narrate it. Both take an optional random.Random so fights can
+be replayed from a seed. simulate() plays thousands of fights at once with
+NumPy for balancing SCP_LIST / PETS offline; NumPy is only needed for that.
+"""
+
+from collections import namedtuple
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# One side of a fight: display name, HP pool and a tuple of Attacker
+Side = namedtuple("Side", "name hp attackers")
+Attacker = namedtuple("Attacker", "name atk")
+# winner is "a", "b" or None for a draw; turns is how many turns were started
+Outcome = namedtuple("Outcome", "winner a_hp b_hp turns")
+# One hit: side ("a"/"b") and index of the attacker, damage dealt and the target's HP afterwards (floored at 0)
+Hit = namedtuple("Hit", "turn side attacker damage target_hp")
+
+DAMAGE_SPREAD = (0.8, 1.2)
+
+
+def side(name, hp, *attackers):
+    """Side(name, hp, ((name, atk), ...)) from (name, atk) pairs"""
+    return Side(name, hp, tuple(Attacker(*attacker) for attacker in attackers))
+
+
+def damage_range(atk):
+    """Lowest and highest damage an attacker can roll"""
+    return int(atk * DAMAGE_SPREAD[0]), int(atk * DAMAGE_SPREAD[1])
+
+
+def _fight(a, b, max_turns, rng, hits):
+    randint = (rng or random).randint
+    a_rolls = [damage_range(attacker.atk) for attacker in a.attackers]
+    b_rolls = [damage_range(attacker.atk) for attacker in b.attackers]
+    a_hp, b_hp = a.hp, b.hp
+    turn = 1
+    while a_hp > 0 and b_hp > 0 and turn <= max_turns:
+        for index, (low, high) in enumerate(a_rolls):
+            damage = randint(low, high)
+            b_hp -= damage
+            if hits is not None:
+                hits.append(Hit(turn, "a", index, damage, max(b_hp, 0)))
+            if b_hp <= 0:
+                break
+        if b_hp <= 0:
+            break
+        for index, (low, high) in enumerate(b_rolls):
+            damage = randint(low, high)
+            a_hp -= damage
+            if hits is not None:
+                hits.append(Hit(turn, "b", index, damage, max(a_hp, 0)))
+            if a_hp <= 0:
+                break
+        if a_hp <= 0:
+            break
+        turn += 1
+    if b_hp <= 0 and a_hp > 0:
+        winner = "a"
+    elif a_hp <= 0 and b_hp > 0:
+        winner = "b"
+    else:
+        winner = None
+    return Outcome(winner, max(a_hp, 0), max(b_hp, 0), min(turn, max_turns))
+
+
+def resolve(a, b, max_turns=20, rng=None):
+    """Play a fight out and return only the Outcome"""
+    return _fight(a, b, max_turns, rng, None)
+
+
+def fight_log(a, b, max_turns=20, rng=None):
+    """Play a fight out; returns (Outcome, [Hit, ...]) for narrating it"""
+    hits = []
+    outcome = _fight(a, b, max_turns, rng, hits)
+    return outcome, hits
+
+
+def simulate(a, b, fights=10000, max_turns=20, seed=None):
+    """Play many copies of one matchup at once with NumPy; returns win/loss/draw rates and average turns
+
+    Follows the same rules as resolve(), so the rates match what players see.
+    """
+    if np is None:
+        raise RuntimeError("simulate() needs numpy (pip install numpy)")
+    rng = np.random.default_rng(seed)
+    a_hp = np.full(fights, a.hp, dtype=np.int64)
+    b_hp = np.full(fights, b.hp, dtype=np.int64)
+    turns = np.zeros(fights, dtype=np.int64)
+    running = np.ones(fights, dtype=bool)
+    a_rolls = [damage_range(attacker.atk) for attacker in a.attackers]
+    b_rolls = [damage_range(attacker.atk) for attacker in b.attackers]
+    for turn in range(1, max_turns + 1):
+        if not running.any():
+            break
+        turns[running] = turn
+        for low, high in a_rolls:
+            hitting = running & (b_hp > 0)
+            b_hp -= np.where(hitting, rng.integers(low, high + 1, size=fights), 0)
+        running &= b_hp > 0
+        for low, high in b_rolls:
+            hitting = running & (a_hp > 0)
+            a_hp -= np.where(hitting, rng.integers(low, high + 1, size=fights), 0)
+        running &= a_hp > 0
+    wins = int(((b_hp <= 0) & (a_hp > 0)).sum())
+    losses = int(((a_hp <= 0) & (b_hp > 0)).sum())
+    return {
+        "fights": fights,
+        "win_rate": wins / fights,
+        "loss_rate": losses / fights,
+        "draw_rate": (fights - wins - losses) / fights,
+        "avg_turns": float(turns.mean()),
+    }
@@ -1,8 +1,17 @@
 # db.py
 import psycopg2
 import psycopg2.extras
+from psycopg2 import pool as pg_pool
+import hashlib
 import json
 import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from user_cache import UserCache
 
 # Try to import config, fall back to config_fallback if not available
 try:
@@ -40,6 +49,7 @@ SCHEMA = {
         'daily_streak': 'INTEGER DEFAULT 0',
         'weekly_streak': 'INTEGER DEFAULT 0',
         'inventory_value': 'INTEGER DEFAULT 0',
+        'gacha_pity': 'TEXT',
         'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
     },
     'teams': {
@@ -61,134 +71,527 @@ SCHEMA = {
         'created_by': 'BIGINT NOT NULL',
         'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
     },
+    # guild_id is NULL for warnings imported from the old global warnings.json
     'warnings': {
         'id': 'SERIAL PRIMARY KEY',
+        'guild_id': 'BIGINT',
         'user_id': 'BIGINT NOT NULL',
         'reason': 'TEXT NOT NULL',
         'moderator_id': 'BIGINT NOT NULL',
         'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+    },
+    # One row per (user, item) with a count, replacing the users.inventory JSON array
+    'user_items': {
+        'user_id': 'BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE',
+        'item': 'VARCHAR(255) NOT NULL',
+        'quantity': 'INTEGER NOT NULL DEFAULT 1 CHECK (quantity >= 0)',
+        'acquired_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+        'PRIMARY KEY': '(user_id, item)'
+    },
+    # One row per (user, pet) with a count, replacing the users.pets JSON array
+    'user_pets': {
+        'user_id': 'BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE',
+        'pet': 'VARCHAR(100) NOT NULL',
+        'quantity': 'INTEGER NOT NULL DEFAULT 1 CHECK (quantity >= 0)',
+        'acquired_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
+        'PRIMARY KEY': '(user_id, pet)'
+    },
+    'marketplace_listings': {
+        'id': 'BIGSERIAL PRIMARY KEY',
+        'seller_id': 'BIGINT NOT NULL',
+        'item': 'VARCHAR(255) NOT NULL',
+        'price': 'INTEGER NOT NULL CHECK (price > 0)',
+        'listed_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+    },
+    'trades': {
+        'id': 'BIGSERIAL PRIMARY KEY',
+        'from_id': 'BIGINT NOT NULL',
+        'to_id': 'BIGINT NOT NULL',
+        'offer_item': 'VARCHAR(255)',
+        'offer_pet': 'VARCHAR(100)',
+        'request_item': 'VARCHAR(255)',
+        'request_pet': 'VARCHAR(100)',
+        'request_credits': 'INTEGER DEFAULT 0',
+        'status': 'VARCHAR(20) DEFAULT \'pending\'',
+        'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+    },
+    'schema_version': {
+        'id': 'INTEGER PRIMARY KEY CHECK (id = 1)',
+        'version': 'INTEGER NOT NULL',
+        'fingerprint': 'VARCHAR(64)',
+        'applied_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+    },
+    # Progress on each repeating quest: one row per (user, period), reset when period_key moves on
+    'quest_progress': {
+        'user_id': 'BIGINT NOT NULL',
+        'period': 'VARCHAR(20) NOT NULL',
+        'period_key': 'VARCHAR(20) NOT NULL',
+        'progress': 'INTEGER NOT NULL DEFAULT 0',
+        'claimed': 'BOOLEAN NOT NULL DEFAULT FALSE',
+        'PRIMARY KEY': '(user_id, period)'
+    },
+    # Names of one-off data migrations that have already run
+    'schema_migrations': {
+        'name': 'VARCHAR(100) PRIMARY KEY',
+        'applied_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
     }
 }
 
+# Secondary indexes, created after the tables exist
+INDEXES = {
+    # Serves the ranked leaderboard scan: ORDER BY level, xp, credits with LIMIT/OFFSET
+    'idx_users_leaderboard': 'users (level DESC NULLS LAST, xp DESC NULLS LAST, credits DESC NULLS LAST, id)',
+    # "Who owns X" lookups; per-user access goes through the primary keys
+    'idx_user_items_item': 'user_items (item)',
+    'idx_user_pets_pet': 'user_pets (pet)',
+    # Marketplace: a seller's own listings, and the cheapest copies of an item
+    'idx_marketplace_seller': 'marketplace_listings (seller_id)',
+    'idx_marketplace_item': 'marketplace_listings (item, price, id)',
+    'idx_marketplace_price': 'marketplace_listings (price, id)',
+    # Pending trades by either side
+    'idx_trades_from': 'trades (from_id)',
+    'idx_trades_to': 'trades (to_id)',
+    # A member's warnings in one guild (plus their imported guild-less ones), oldest first
+    'idx_warnings_user_guild': 'warnings (user_id, guild_id, created_at)'
+}
+
+# Connection pool bounds - the bot borrows from this pool instead of reconnecting per call
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+_pool = None
+_pool_lock = threading.Lock()
+# Callers block here instead of getting PoolError when every connection is checked out
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+# One worker per pooled connection so queries queue in the executor, not on the event loop
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="hanuko-db")
+
+# User rows are cached in-process; async updates are flushed USER_FLUSH_DELAY seconds later as one UPDATE
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+USER_FLUSH_DELAY = float(os.getenv("USER_FLUSH_DELAY", "0.5"))
+USER_FLUSH_MAX_DELAY = 30.0
+
+user_cache = UserCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# user_id -> pending flush task
+_user_flush_tasks = {}
+# Called with a user id after that user's inventory or pets change (see on_owned_change)
+_owned_change_listeners = []
+
+# Warnings are queued and inserted WARNING_FLUSH_DELAY seconds later (or once WARNING_BATCH_SIZE pile up)
+WARNING_FLUSH_DELAY = float(os.getenv("WARNING_FLUSH_DELAY", "2.0"))
+WARNING_BATCH_SIZE = 100
+_pending_warnings = []
+_warning_flush_task = None
+_warning_flush_lock = asyncio.Lock()
+
+# JSON-encoded TEXT columns and the empty value used when they are NULL or invalid
+USER_JSON_LIST_FIELDS = ['achievements', 'damaged_items', 'equipped_pets', 'battle_team']
+USER_JSON_DICT_FIELDS = ['pet_stats', 'pet_last_train', 'mission_progress', 'gacha_pity']
+TEAM_JSON_LIST_FIELDS = ['members', 'achievements']
+TEAM_JSON_DICT_FIELDS = ['quest']
+# User list fields stored as counted rows in child tables: field -> (table, name column).
+# The old users.inventory / users.pets TEXT columns are left in place but no longer read or written.
+USER_CHILD_TABLES = {
+    'inventory': ('user_items', 'item'),
+    'pets': ('user_pets', 'pet'),
+}
+# Integer columns that adjust_user() can change atomically
+USER_COUNTER_FIELDS = ['credits', 'xp', 'level', 'team_points', 'inventory_value']
+# Most ids get_leaderboard() sends in one ANY(%s) array; bigger member lists are ranked chunk by chunk
+LEADERBOARD_ID_CHUNK = 5000
+
 def get_db_connection():
+    """Open a standalone connection (used by the one-off maintenance scripts)"""
     return psycopg2.connect(**db_config)
 
+def get_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pg_pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **db_config)
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    """Borrow a pooled connection; commits on success and rolls back on error"""
+    _pool_slots.acquire()
+    try:
+        db_pool = get_pool()
+        conn = db_pool.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Dropped TLS session or server restart - don't hand this connection out again
+            discard = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            db_pool.putconn(conn, close=discard or bool(conn.closed))
+    finally:
+        _pool_slots.release()
+
+@contextmanager
+def db_cursor(dict_rows=False):
+    """Cursor on a pooled connection, committed when the block exits cleanly"""
+    with pooled_connection() as conn:
+        cursor_factory = psycopg2.extras.RealDictCursor if dict_rows else None
+        cursor = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking db helper on the db executor so the event loop keeps serving the gateway"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def close_pool():
+    """Close every pooled connection (called on bot shutdown)"""
+    global _pool
+    _executor.shutdown(wait=True)
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def _decode_json_value(value, empty):
+    if not value:
+        return empty
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            # If it's not valid JSON, treat as empty
+            return empty
+    return value
+
+def _decode_json_fields(row, list_fields, dict_fields):
+    """Convert TEXT fields that contain JSON data to Python objects in place"""
+    for field in list_fields + dict_fields:
+        empty = [] if field in list_fields else {}
+        row[field] = _decode_json_value(row.get(field), empty)
+    return row
+
+class LazyRow(dict):
+    """Row whose JSON TEXT columns are only decoded the first time they are read"""
+
+    def __init__(self, row, list_fields, dict_fields):
+        super().__init__(row)
+        self._pending = {field: [] for field in list_fields if field in row}
+        self._pending.update({field: {} for field in dict_fields if field in row})
+
+    def _decode(self, key):
+        empty = self._pending.pop(key)
+        value = _decode_json_value(dict.__getitem__(self, key), empty)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            return self._decode(key)
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self._pending.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def decode_all(self):
+        for key in list(self._pending):
+            self._decode(key)
+        return self
+
+    def values(self):
+        self.decode_all()
+        return dict.values(self)
+
+    def items(self):
+        self.decode_all()
+        return dict.items(self)
+
+def _build_update(table, key_column, key, fields):
+    """Build an UPDATE statement for the given column values, JSON-encoding lists and dicts"""
+    assignments = []
+    values = []
+    for k, v in fields.items():
+        if isinstance(v, (list, dict)):
+            v = json.dumps(v)
+        assignments.append(f"{k} = %s")
+        values.append(v)
+    values.append(key)
+    return f"UPDATE {table} SET {', '.join(assignments)} WHERE {key_column} = %s", values
+
 def create_tables():
-    """Create all tables if they don't exist - your bot knows the structure here"""
+    """Create or upgrade all tables; a single version check when the schema is already current"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    for table_name, columns in SCHEMA.items():
-        # Build CREATE TABLE statement
-        column_definitions = []
-        for col_name, col_type in columns.items():
-            column_definitions.append(f"{col_name} {col_type}")
-        
-        create_sql = f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            {', '.join(column_definitions)}
-        );
-        """
-        
+    try:
+        return migrate_schema(conn)
+    finally:
+        conn.close()
+
+def create_table(cursor, table_name):
+    """CREATE TABLE IF NOT EXISTS from the SCHEMA definition"""
+    column_definitions = [f"{col_name} {col_type}" for col_name, col_type in SCHEMA[table_name].items()]
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(column_definitions)})")
+
+def sync_schema(cursor):
+    """Create every table in SCHEMA and add any columns missing from existing ones"""
+    for table_name in SCHEMA:
         try:
-            cursor.execute(create_sql)
+            create_table(cursor, table_name)
             print(f"Table {table_name} created/verified successfully")
         except Exception as e:
             print(f"Error creating table {table_name}: {e}")
-    
-    # Run migrations to add missing columns
     migrate_tables(cursor)
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
 
 def migrate_tables(cursor):
     """Add missing columns to existing tables"""
     try:
-        # Check if equipped_pets column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'equipped_pets'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN equipped_pets TEXT DEFAULT '[]'")
-            print("Added equipped_pets column to users table")
-        
-        # Check if battle_team column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'battle_team'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN battle_team TEXT DEFAULT '[]'")
-            print("Added battle_team column to users table")
-        
-        # Check if damaged_items column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'damaged_items'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN damaged_items TEXT DEFAULT '[]'")
-            print("Added damaged_items column to users table")
-        
-        # Check if equipped_gun column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'equipped_gun'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN equipped_gun VARCHAR(255)")
-            print("Added equipped_gun column to users table")
-        
-        # Check if daily_streak column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'daily_streak'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN daily_streak INTEGER DEFAULT 0")
-            print("Added daily_streak column to users table")
-        
-        # Check if weekly_streak column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'weekly_streak'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN weekly_streak INTEGER DEFAULT 0")
-            print("Added weekly_streak column to users table")
-        
-        # Check if inventory_value column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'inventory_value'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN inventory_value INTEGER DEFAULT 0")
-            print("Added inventory_value column to users table")
-        
-        # Check if created_at column exists in users table
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'created_at'
-        """)
-        if not cursor.fetchone():
-            cursor.execute("ALTER TABLE users ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-            print("Added created_at column to users table")
-            
+        # One catalog query for every table instead of one per column
+        cursor.execute(
+            "SELECT table_name, column_name FROM information_schema.columns"
+            " WHERE table_schema = current_schema() AND table_name = ANY(%s)",
+            (list(SCHEMA),)
+        )
+        existing = set(cursor.fetchall())
+        for table_name, columns in SCHEMA.items():
+            for col_name, col_type in columns.items():
+                # Table constraints such as 'PRIMARY KEY' aren't columns
+                if ' ' in col_name or (table_name, col_name) in existing:
+                    continue
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col_name} {col_type}")
+                print(f"Added {col_name} column to {table_name} table")
     except Exception as e:
         print(f"Error during migration: {e}")
 
+def create_indexes(cursor):
+    """Create the secondary indexes listed in INDEXES if they don't exist"""
+    for index_name, definition in INDEXES.items():
+        try:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition}")
+        except Exception as e:
+            print(f"Error creating index {index_name}: {e}")
+
+def migrate_child_tables(cursor):
+    """Copy the legacy inventory/pets JSON arrays into user_items/user_pets (runs once)"""
+    name = 'inventory_pets_to_child_tables'
+    try:
+        cursor.execute("SELECT 1 FROM schema_migrations WHERE name = %s", (name,))
+        if cursor.fetchone():
+            return
+        cursor.execute("SELECT id, inventory, pets FROM users")
+        rows = {'inventory': [], 'pets': []}
+        for user_id, inventory, pets in cursor.fetchall():
+            for field, value in (('inventory', inventory), ('pets', pets)):
+                counts = {}
+                for entry in _decode_json_value(value, []):
+                    counts[str(entry)] = counts.get(str(entry), 0) + 1
+                rows[field].extend((user_id, entry, count) for entry, count in counts.items())
+        for field, values in rows.items():
+            table, column = USER_CHILD_TABLES[field]
+            if values:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    f"INSERT INTO {table} (user_id, {column}, quantity) VALUES %s ON CONFLICT DO NOTHING",
+                    values
+                )
+            print(f"Migrated {len(values)} {field} rows into {table}")
+        cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+    except Exception as e:
+        print(f"Error migrating inventory/pets to child tables: {e}")
+
+# JSON files that used to hold marketplace listings and pending trades: file -> (table, columns)
+LEGACY_JSON_TABLES = {
+    'marketplace.json': ('marketplace_listings', ['id', 'seller_id', 'item', 'price']),
+    'trades.json': ('trades', ['id', 'from_id', 'to_id', 'offer_item', 'offer_pet',
+                               'request_item', 'request_pet', 'request_credits', 'status'])
+}
+
+def migrate_json_files(cursor):
+    """Import marketplace.json / trades.json into their tables (runs once per file)"""
+    for path, (table, columns) in LEGACY_JSON_TABLES.items():
+        name = f"import_{path}"
+        try:
+            cursor.execute("SELECT 1 FROM schema_migrations WHERE name = %s", (name,))
+            if cursor.fetchone():
+                continue
+            entries = []
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            values = [tuple(entry.get(column) for column in columns) for entry in entries]
+            if values:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s ON CONFLICT DO NOTHING",
+                    values
+                )
+                # Keep new ids clear of the imported (timestamp-based) ones
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+            print(f"Imported {len(values)} rows from {path} into {table}")
+            cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+        except Exception as e:
+            print(f"Error importing {path}: {e}")
+
+def migrate_warnings_file(cursor, path='warnings.json'):
+    """Import warnings.json into the warnings table (runs once)"""
+    name = f"import_{path}"
+    try:
+        cursor.execute("SELECT 1 FROM schema_migrations WHERE name = %s", (name,))
+        if cursor.fetchone():
+            return
+        warnings = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                warnings = json.load(f)
+        values = []
+        for user_id, entries in warnings.items():
+            for entry in entries:
+                # Very old entries are bare reason strings
+                if not isinstance(entry, dict):
+                    entry = {"reason": str(entry)}
+                values.append((int(user_id), entry.get("reason") or "N/A", entry.get("moderator") or 0,
+                               entry.get("timestamp")))
+        if values:
+            psycopg2.extras.execute_values(
+                cursor,
+                "INSERT INTO warnings (user_id, reason, moderator_id, created_at) VALUES %s",
+                values,
+                template="(%s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))"
+            )
+        print(f"Imported {len(values)} warnings from {path}")
+        cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+    except Exception as e:
+        print(f"Error importing {path}: {e}")
+
+# Old quests.json layout: period -> (period key field, progress counter field)
+LEGACY_QUEST_FIELDS = {
+    'daily': ('date', 'recontain'),
+    'weekly': ('week', 'petbattle'),
+    'monthly': ('month', 'adopt'),
+}
+
+def migrate_quests_file(cursor, path='quests.json'):
+    """Import quests.json into quest_progress (runs once)"""
+    name = f"import_{path}"
+    try:
+        cursor.execute("SELECT 1 FROM schema_migrations WHERE name = %s", (name,))
+        if cursor.fetchone():
+            return
+        quests = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                quests = json.load(f)
+        values = []
+        for user_id, user_quests in quests.items():
+            for period, (key_field, counter_field) in LEGACY_QUEST_FIELDS.items():
+                entry = user_quests.get(period)
+                if entry and entry.get(key_field):
+                    values.append((int(user_id), period, entry[key_field], entry.get(counter_field, 0),
+                                   bool(entry.get("claimed"))))
+        if values:
+            psycopg2.extras.execute_values(
+                cursor,
+                """INSERT INTO quest_progress (user_id, period, period_key, progress, claimed) VALUES %s
+                ON CONFLICT (user_id, period) DO NOTHING""",
+                values
+            )
+        print(f"Imported {len(values)} quest rows from {path}")
+        cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+    except Exception as e:
+        print(f"Error importing {path}: {e}")
+
+# --- SCHEMA VERSIONING ---
+# Ordered and append-only: (version, description, step). Steps take a cursor and must be safe to re-run.
+# Table/column/index changes only need SCHEMA/INDEXES edited - the fingerprint check picks them up;
+# add a step here for anything that moves or rewrites data.
+MIGRATIONS = [
+    (1, "create tables and add missing columns", sync_schema),
+    (2, "secondary indexes", create_indexes),
+    (3, "inventory/pets into user_items/user_pets", migrate_child_tables),
+    (4, "import marketplace.json/trades.json", migrate_json_files),
+    (5, "import warnings.json", migrate_warnings_file),
+    (6, "import quests.json", migrate_quests_file),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+# Session advisory lock key so two processes starting at once don't migrate concurrently
+SCHEMA_LOCK_ID = 0x48414e55
+
+def schema_fingerprint():
+    """Hash of the declared tables and indexes"""
+    return hashlib.sha256(json.dumps([SCHEMA, INDEXES], sort_keys=True).encode()).hexdigest()
+
+def _read_schema_version(cursor):
+    cursor.execute("SELECT version, fingerprint FROM schema_version WHERE id = 1")
+    return cursor.fetchone() or (0, None)
+
+def _write_schema_version(cursor, version, fingerprint):
+    cursor.execute(
+        """INSERT INTO schema_version (id, version, fingerprint) VALUES (1, %s, %s)
+        ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, fingerprint = EXCLUDED.fingerprint,
+        applied_at = CURRENT_TIMESTAMP""",
+        (version, fingerprint)
+    )
+
+def migrate_schema(conn):
+    """Bring the database up to SCHEMA_VERSION and the current SCHEMA; returns the resulting version
+
+    When nothing has changed this is one query. Otherwise pending steps run in order, each
+    committed together with the version it reaches, so a failed step is retried on the next start.
+    """
+    fingerprint = schema_fingerprint()
+    cursor = conn.cursor()
+    try:
+        try:
+            version, stored_fingerprint = _read_schema_version(cursor)
+        except Exception:
+            # No schema_version table yet
+            conn.rollback()
+            version, stored_fingerprint = 0, None
+        if version >= SCHEMA_VERSION and stored_fingerprint == fingerprint:
+            conn.commit()
+            return version
+
+        cursor.execute("SELECT pg_advisory_lock(%s)", (SCHEMA_LOCK_ID,))
+        try:
+            create_table(cursor, 'schema_version')
+            conn.commit()
+            # Another process may have finished the work while we waited for the lock
+            version, stored_fingerprint = _read_schema_version(cursor)
+            for step_version, description, step in MIGRATIONS:
+                if step_version <= version:
+                    continue
+                print(f"Applying schema migration {step_version}: {description}")
+                step(cursor)
+                _write_schema_version(cursor, step_version, stored_fingerprint)
+                conn.commit()
+                version = step_version
+            if stored_fingerprint != fingerprint:
+                # SCHEMA or INDEXES were edited without a new step - create what's missing
+                sync_schema(cursor)
+                create_indexes(cursor)
+                _write_schema_version(cursor, version, fingerprint)
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Schema migration stopped at version {version}: {e}")
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_LOCK_ID,))
+            conn.commit()
+        return version
+    finally:
+        cursor.close()
+
 def get_table_structure(table_name):
     """Get the actual structure of a table from the database"""
     conn = get_db_connection()
@@ -261,146 +664,1036 @@ def update_inventory_value(user_id):
     return inventory_value
 
 # --- USER HELPERS ---
-def get_user(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-    user = cursor.fetchone()
-    if not user:
-        # Create new user if not found - use a simpler INSERT that only includes basic fields
-        try:
-            cursor.execute(
-                """INSERT INTO users (id, xp, level, credits, pets, inventory) 
-                VALUES (%s, %s, %s, %s, %s, %s)""",
-                (user_id, 0, 1, 0, '[]', '[]')
-            )
-            conn.commit()
-            cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-            user = cursor.fetchone()
-        except Exception as e:
-            print(f"Error creating user: {e}")
-            # If INSERT fails, try to create with minimal fields
-            cursor.execute(
-                """INSERT INTO users (id) VALUES (%s)""",
-                (user_id,)
-            )
-            conn.commit()
-            cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+_INSERT_DEFAULT_USER_SQL = """INSERT INTO users (id, xp, level, credits, pets, inventory)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (id) DO NOTHING"""
+
+def _insert_default_user(cursor, user_id):
+    # Create new user if not found - only the basic fields, the rest use column defaults
+    cursor.execute(_INSERT_DEFAULT_USER_SQL, (user_id, 0, 1, 0, '[]', '[]'))
+
+def _select_user_columns(fields=None):
+    """SELECT list for a user row, composing inventory/pets from their child tables"""
+    if fields is None:
+        columns = ["users.*"]
+        child_fields = list(USER_CHILD_TABLES)
+    else:
+        columns = [field for field in fields if field not in USER_CHILD_TABLES]
+        child_fields = [field for field in fields if field in USER_CHILD_TABLES]
+    for field in child_fields:
+        table, column = USER_CHILD_TABLES[field]
+        # One element per owned copy, oldest first
+        columns.append(
+            f"ARRAY(SELECT c.{column} FROM {table} c, generate_series(1, c.quantity)"
+            f" WHERE c.user_id = users.id ORDER BY c.acquired_at, c.{column}) AS child_{field}"
+        )
+    return ", ".join(columns)
+
+def _take_child_fields(row):
+    # Replace the legacy JSON columns with the lists composed from the child tables
+    for field in USER_CHILD_TABLES:
+        if f"child_{field}" in row:
+            row[field] = list(row.pop(f"child_{field}") or [])
+    return row
+
+def _load_user(user_id):
+    """Read (or create) a user row from the database and cache it"""
+    sql = f"SELECT {_select_user_columns()} FROM users WHERE id = %s"
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute(sql, (user_id,))
+        user = cursor.fetchone()
+        if not user:
+            _insert_default_user(cursor, user_id)
+            cursor.execute(sql, (user_id,))
             user = cursor.fetchone()
-    
-    # Convert TEXT fields that contain JSON data to Python objects
-    json_fields = ['pets', 'inventory', 'achievements', 'pet_stats', 'pet_last_train', 'mission_progress', 'damaged_items', 'equipped_pets', 'battle_team']
-    for field in json_fields:
-        if field in user and user[field]:
-            try:
-                user[field] = json.loads(user[field]) if isinstance(user[field], str) else user[field]
-            except json.JSONDecodeError:
-                # If it's not valid JSON, treat as empty
-                user[field] = [] if field in ['pets', 'inventory', 'achievements', 'damaged_items', 'equipped_pets', 'battle_team'] else {}
-        else:
-            user[field] = [] if field in ['pets', 'inventory', 'achievements', 'damaged_items', 'equipped_pets', 'battle_team'] else {}
-    
-    cursor.close()
-    conn.close()
+    user = _take_child_fields(dict(user))
+    _decode_json_fields(user, USER_JSON_LIST_FIELDS, USER_JSON_DICT_FIELDS)
+    return user_cache.put(user_id, user)
+
+def _check_user_fields(fields):
+    unknown = [field for field in fields if field not in SCHEMA['users']]
+    if unknown:
+        raise KeyError(f"Unknown users column(s): {', '.join(unknown)}")
+
+def _load_user_fields(user_id, fields):
+    """Read (or create) a user and select only the given columns; the partial row is not cached"""
+    sql = f"SELECT {_select_user_columns(fields)} FROM users WHERE id = %s"
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute(sql, (user_id,))
+        row = cursor.fetchone()
+        if not row:
+            _insert_default_user(cursor, user_id)
+            cursor.execute(sql, (user_id,))
+            row = cursor.fetchone()
+    return LazyRow(_take_child_fields(dict(row)), USER_JSON_LIST_FIELDS, USER_JSON_DICT_FIELDS)
+
+def _child_sync_statements(user_id, field, values):
+    """Make a user's child rows match a full list, touching only the rows whose count changed"""
+    table, column = USER_CHILD_TABLES[field]
+    names = [str(value) for value in values or []]
+    return [
+        (f"DELETE FROM {table} WHERE user_id = %s AND NOT ({column} = ANY(%s::text[]))", [user_id, names]),
+        (f"INSERT INTO {table} (user_id, {column}, quantity)"
+         f" SELECT %s, name, COUNT(*) FROM unnest(%s::text[]) AS name GROUP BY name"
+         f" ON CONFLICT (user_id, {column}) DO UPDATE SET quantity = EXCLUDED.quantity"
+         f" WHERE {table}.quantity <> EXCLUDED.quantity", [user_id, names]),
+    ]
+
+def _user_write_statements(user_id, fields):
+    """(sql, params) pairs that save the given user fields"""
+    statements = []
+    columns = {k: v for k, v in fields.items() if k not in USER_CHILD_TABLES}
+    if columns:
+        statements.append(_build_update("users", "id", user_id, columns))
+    for field in USER_CHILD_TABLES:
+        if field in fields:
+            statements.extend(_child_sync_statements(user_id, field, fields[field]))
+    return statements
+
+def _join_statements(statements):
+    # Several statements in one execute() share a single round-trip; fetch*() sees the last one
+    sql = "; ".join(statement for statement, _ in statements)
+    params = [param for _, statement_params in statements for param in statement_params]
+    return sql, params
+
+def _write_user_fields(user_id, fields):
+    statements = _user_write_statements(user_id, fields)
+    if not statements:
+        return
+    with db_cursor() as cursor:
+        cursor.execute(*_join_statements(statements))
+
+def _take_pending(user_ids):
+    """Statements that save the users' pending cached changes (or create missing rows), and what was taken"""
+    statements, pending = [], {}
+    for user_id in user_ids:
+        fields = user_cache.take_dirty(user_id)
+        if fields:
+            # Changes still waiting in the cache must land first
+            pending[user_id] = fields
+            statements.extend(_user_write_statements(user_id, fields))
+        elif not user_cache.is_cached(user_id):
+            # A cached user is known to have a row; otherwise make sure one exists
+            statements.append((_INSERT_DEFAULT_USER_SQL, [user_id, 0, 1, 0, '[]', '[]']))
+    return statements, pending
+
+def _finish_pending(pending, ok=True):
+    for user_id, fields in pending.items():
+        user_cache.finish_flush(user_id, fields, ok=ok)
+
+def _run_after_pending(user_id, statements, dict_rows=False):
+    """Execute statements after saving the users' pending cached changes; returns the last row
+
+    user_id may be a single id or a list of ids.
+    """
+    user_ids = user_id if isinstance(user_id, (list, tuple)) else [user_id]
+    prelude, pending = _take_pending(user_ids)
+    try:
+        with db_cursor(dict_rows=dict_rows) as cursor:
+            cursor.execute(*_join_statements(prelude + statements))
+            row = cursor.fetchone()
+    except Exception:
+        _finish_pending(pending, ok=False)
+        raise
+    _finish_pending(pending)
+    return row
+
+def get_user(user_id):
+    user = user_cache.get(user_id)
+    if user is None:
+        user = _load_user(user_id)
     return user
 
+def get_user_fields(user_id, *fields):
+    """Fetch only the named columns for a user (e.g. get_user_fields(uid, "credits"))"""
+    _check_user_fields(fields)
+    row = user_cache.project(user_id, fields)
+    if row is None:
+        row = _load_user_fields(user_id, fields)
+    return row
+
 def update_user(user_id, **kwargs):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    fields = []
-    values = []
-    for k, v in kwargs.items():
-        if isinstance(v, (list, dict)):
-            v = json.dumps(v)
-        fields.append(f"{k} = %s")
-        values.append(v)
-    values.append(user_id)
-    sql = f"UPDATE users SET {', '.join(fields)} WHERE id = %s"
-    cursor.execute(sql, values)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    """Write-through update: the row is saved before this returns, along with any pending cached changes"""
+    if not kwargs:
+        return
+    user_cache.apply(user_id, kwargs, dirty=False)
+    pending = user_cache.take_dirty(user_id)
+    fields = dict(pending)
+    fields.update(kwargs)
+    try:
+        _write_user_fields(user_id, fields)
+    except Exception:
+        user_cache.finish_flush(user_id, fields, ok=False)
+        raise
+    user_cache.finish_flush(user_id, fields)
+    if any(field in USER_CHILD_TABLES for field in kwargs):
+        _owned_changed([user_id])
+
+def _guard_for(guard, field):
+    return guard.get(field) if isinstance(guard, dict) else guard
+
+def adjust_user(user_id, floor=None, ceiling=None, clamp=False, **deltas):
+    """Atomically add deltas to counter columns, e.g. adjust_user(uid, credits=-50, floor=0)
+
+    floor/ceiling bound the resulting values (a number for every column, or a dict per column).
+    By default a change that would cross a bound is refused and None is returned; with
+    clamp=True the values are pinned to the bound instead. Returns the new values on success.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta is not None}
+    if not deltas:
+        return {}
+    unknown = [field for field in deltas if field not in USER_COUNTER_FIELDS]
+    if unknown:
+        raise KeyError(f"Not a counter column: {', '.join(unknown)}")
+    assignments, set_params = [], []
+    conditions, where_params = [], []
+    for field, delta in deltas.items():
+        low, high = _guard_for(floor, field), _guard_for(ceiling, field)
+        expr = f"COALESCE({field}, 0) + %s"
+        set_params.append(delta)
+        if clamp:
+            if high is not None:
+                expr = f"LEAST({expr}, %s)"
+                set_params.append(high)
+            if low is not None:
+                expr = f"GREATEST({expr}, %s)"
+                set_params.append(low)
+        else:
+            if low is not None:
+                conditions.append(f"COALESCE({field}, 0) + %s >= %s")
+                where_params.extend([delta, low])
+            if high is not None:
+                conditions.append(f"COALESCE({field}, 0) + %s <= %s")
+                where_params.extend([delta, high])
+        assignments.append(f"{field} = {expr}")
+    sql = f"UPDATE users SET {', '.join(assignments)} WHERE {' AND '.join(['id = %s'] + conditions)}"
+    sql += f" RETURNING {', '.join(deltas)}"
+    params = set_params + [user_id] + where_params
+    row = _run_after_pending(user_id, [(sql, params)], dict_rows=True)
+    if row is None:
+        return None
+    row = dict(row)
+    user_cache.apply(user_id, row, dirty=False)
+    return row
+
+def settle_bet(user_id, bet, payout):
+    """Take a bet and pay out in one statement; returns the new balance, or None if the user can't cover the bet"""
+    # credits >= bet  <=>  credits - bet + payout >= payout
+    row = adjust_user(user_id, floor={'credits': payout}, credits=payout - bet)
+    return row['credits'] if row else None
+
+def claim_reward(user_id, claimed_field, streak_field, previous, now, cooldown, streak, credits):
+    """Stamp a timed claim (e.g. last_daily), save its streak and pay credits in one statement
+
+    The claim only goes through if claimed_field still holds `previous` (the value the caller
+    checked) and that is at least `cooldown` before `now`, so overlapping claims pay out once.
+    Returns the new balance, or None if the claim was refused.
+    """
+    _check_user_fields([claimed_field, streak_field])
+    sql = (f"UPDATE users SET {claimed_field} = %s, {streak_field} = %s, credits = COALESCE(credits, 0) + %s"
+           f" WHERE id = %s AND {claimed_field} IS NOT DISTINCT FROM %s"
+           f" AND ({claimed_field} IS NULL OR {claimed_field} <= %s) RETURNING credits")
+    row = _run_after_pending(user_id, [(sql, [now, streak, credits, user_id, previous, now - cooldown])])
+    if row is None:
+        return None
+    user_cache.apply(user_id, {claimed_field: now.isoformat(), streak_field: streak, 'credits': row[0]}, dirty=False)
+    return row[0]
+
+# --- INVENTORY / PET HELPERS ---
+def _add_copies(owned, name, quantity):
+    owned = list(owned or [])
+    # Keep copies of the same entry together, like the composed list from the database
+    index = max((i for i, entry in enumerate(owned) if entry == name), default=len(owned) - 1) + 1
+    owned[index:index] = [name] * quantity
+    return owned
+
+def _remove_copies(owned, name, quantity):
+    owned = list(owned or [])
+    for _ in range(quantity):
+        if name in owned:
+            owned.remove(name)
+    return owned
+
+def on_owned_change(listener):
+    """Register listener(user_id), called whenever a user's inventory or pets change; may run on a db worker thread
+
+    That covers the item/pet helpers, UserTransaction.commit() and update_user()/aupdate_user() with a full list.
+    """
+    _owned_change_listeners.append(listener)
+    return listener
+
+def _owned_changed(user_ids):
+    for user_id in user_ids:
+        for listener in _owned_change_listeners:
+            try:
+                listener(user_id)
+            except Exception as e:
+                print(f"[ERROR] Owned change listener failed for {user_id}: {e}")
+
+def _add_owned(field, user_id, name, quantity=1):
+    table, column = USER_CHILD_TABLES[field]
+    row = _run_after_pending(user_id, [(
+        f"INSERT INTO {table} (user_id, {column}, quantity) VALUES (%s, %s, %s)"
+        f" ON CONFLICT (user_id, {column}) DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity"
+        f" RETURNING quantity",
+        [user_id, name, quantity]
+    )])
+    user_cache.update_field(user_id, field, lambda owned: _add_copies(owned, name, quantity))
+    _owned_changed([user_id])
+    return row[0]
+
+def _remove_owned(field, user_id, name, quantity=1):
+    table, column = USER_CHILD_TABLES[field]
+    # Lock the row, then either delete it (last copies) or decrement it - one statement, one round-trip
+    row = _run_after_pending(user_id, [(
+        f"""WITH target AS (
+            SELECT quantity FROM {table} WHERE user_id = %s AND {column} = %s AND quantity >= %s FOR UPDATE
+        ), removed AS (
+            DELETE FROM {table} t WHERE t.user_id = %s AND t.{column} = %s
+            AND EXISTS (SELECT 1 FROM target WHERE target.quantity = %s)
+            RETURNING 0 AS quantity
+        ), decremented AS (
+            UPDATE {table} t SET quantity = t.quantity - %s WHERE t.user_id = %s AND t.{column} = %s
+            AND EXISTS (SELECT 1 FROM target WHERE target.quantity > %s)
+            RETURNING t.quantity
+        )
+        SELECT quantity FROM removed UNION ALL SELECT quantity FROM decremented""",
+        [user_id, name, quantity, user_id, name, quantity, quantity, user_id, name, quantity]
+    )])
+    if row is None:
+        return False
+    user_cache.update_field(user_id, field, lambda owned: _remove_copies(owned, name, quantity))
+    _owned_changed([user_id])
+    return True
+
+def _count_owned(field, user_id, name):
+    cached = user_cache.project(user_id, [field])
+    if cached is not None:
+        return cached[field].count(name)
+    return _count_owned_db(field, user_id, name)
+
+def _count_owned_db(field, user_id, name):
+    table, column = USER_CHILD_TABLES[field]
+    with db_cursor() as cursor:
+        cursor.execute(f"SELECT quantity FROM {table} WHERE user_id = %s AND {column} = %s", (user_id, name))
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+def _owners(field, name):
+    table, column = USER_CHILD_TABLES[field]
+    with db_cursor() as cursor:
+        cursor.execute(f"SELECT user_id FROM {table} WHERE {column} = %s AND quantity > 0", (name,))
+        return [row[0] for row in cursor.fetchall()]
+
+def add_item(user_id, item, quantity=1):
+    """Give a user copies of an item; returns how many they now own"""
+    return _add_owned('inventory', user_id, item, quantity)
+
+def remove_item(user_id, item, quantity=1):
+    """Take copies of an item; returns False (and changes nothing) if the user has fewer than that"""
+    return _remove_owned('inventory', user_id, item, quantity)
+
+def count_item(user_id, item):
+    return _count_owned('inventory', user_id, item)
+
+def has_item(user_id, item):
+    return count_item(user_id, item) > 0
+
+def item_owners(item):
+    """Ids of every user holding at least one of an item"""
+    return _owners('inventory', item)
+
+def add_pet(user_id, pet, quantity=1):
+    return _add_owned('pets', user_id, pet, quantity)
+
+def remove_pet(user_id, pet, quantity=1):
+    return _remove_owned('pets', user_id, pet, quantity)
+
+def count_pet(user_id, pet):
+    return _count_owned('pets', user_id, pet)
+
+def has_pet(user_id, pet):
+    return count_pet(user_id, pet) > 0
+
+def pet_owners(pet):
+    return _owners('pets', pet)
+
+# --- MULTI-USER TRANSACTIONS ---
+class UserTransaction:
+    """Changes to several users that are saved together or not at all
+
+    Queue credit/xp deltas, column values and item/pet moves, then commit(). Rows of other
+    tables can ride along: claim() deletes one (failing the commit if it is already gone) and
+    insert() adds one. Everything runs as one statement: the affected rows are locked, every
+    floor, ownership and claim check is evaluated, and the writes only happen if all of them
+    pass. Unchanged values are never written.
+
+        txn = UserTransaction()
+        txn.adjust(buyer_id, floor=0, credits=-price)
+        txn.adjust(seller_id, credits=price)
+        txn.move_item(seller_id, buyer_id, "Pistol")
+        if not await txn.acommit():
+            ...  # someone was short on credits or items; nothing was changed
+    """
+
+    def __init__(self):
+        self._deltas = {}   # user_id -> {counter column: delta}
+        self._floors = {}   # user_id -> {counter column: lowest allowed result}
+        self._fields = {}   # user_id -> {column: new value}
+        self._owned = {}    # (field, user_id, name) -> net change in quantity
+        self._claims = []   # (table, {column: value}) rows that must exist and are deleted
+        self._inserts = []  # (table, {column: value}) rows to add
+        self.inserted = []  # ids of the inserted rows, filled in by a successful commit()
+
+    def adjust(self, user_id, floor=None, **deltas):
+        """Add to counter columns; with floor, the commit fails if a result would drop below it"""
+        unknown = [field for field in deltas if field not in USER_COUNTER_FIELDS]
+        if unknown:
+            raise KeyError(f"Not a counter column: {', '.join(unknown)}")
+        user_deltas = self._deltas.setdefault(user_id, {})
+        for field, delta in deltas.items():
+            if delta is None:
+                continue
+            user_deltas[field] = user_deltas.get(field, 0) + delta
+            low = _guard_for(floor, field)
+            if low is not None:
+                floors = self._floors.setdefault(user_id, {})
+                floors[field] = max(low, floors.get(field, low))
+        return self
+
+    def set(self, user_id, **fields):
+        """Set plain users columns; values equal to the cached ones are skipped at commit"""
+        _check_user_fields(fields)
+        misplaced = [field for field in fields if field in USER_CHILD_TABLES or field in self._deltas.get(user_id, {})]
+        if misplaced:
+            raise KeyError(f"Use the item/pet or adjust() helpers for: {', '.join(misplaced)}")
+        self._fields.setdefault(user_id, {}).update(fields)
+        return self
+
+    def _change_owned(self, field, user_id, name, quantity):
+        key = (field, user_id, name)
+        self._owned[key] = self._owned.get(key, 0) + quantity
+        return self
+
+    def add_item(self, user_id, item, quantity=1):
+        return self._change_owned('inventory', user_id, item, quantity)
+
+    def remove_item(self, user_id, item, quantity=1):
+        """Take copies of an item; the commit fails if the user doesn't have them"""
+        return self._change_owned('inventory', user_id, item, -quantity)
+
+    def move_item(self, from_id, to_id, item, quantity=1):
+        self.remove_item(from_id, item, quantity)
+        return self.add_item(to_id, item, quantity)
+
+    def add_pet(self, user_id, pet, quantity=1):
+        return self._change_owned('pets', user_id, pet, quantity)
+
+    def remove_pet(self, user_id, pet, quantity=1):
+        return self._change_owned('pets', user_id, pet, -quantity)
+
+    def move_pet(self, from_id, to_id, pet, quantity=1):
+        self.remove_pet(from_id, pet, quantity)
+        return self.add_pet(to_id, pet, quantity)
+
+    def claim(self, table, **match):
+        """Delete the row of another table matching these columns; the commit fails if there is none"""
+        self._claims.append((table, match))
+        return self
+
+    def insert(self, table, **values):
+        """Insert a row into another table; its id lands in self.inserted after the commit"""
+        self._inserts.append((table, values))
+        return self
+
+    def _changed_fields(self):
+        # Drop values the cached row already holds
+        changed = {}
+        for user_id, fields in self._fields.items():
+            cached = user_cache.project(user_id, list(fields)) or {}
+            fields = {k: v for k, v in fields.items() if k not in cached or cached[k] != v}
+            if fields:
+                changed[user_id] = fields
+        return changed
+
+    def _build(self, fields):
+        """The single guarded statement for this transaction, plus its parameters"""
+        deltas = {user_id: {k: v for k, v in d.items() if v} for user_id, d in self._deltas.items()}
+        deltas = {user_id: d for user_id, d in deltas.items() if d}
+        owned = {key: quantity for key, quantity in self._owned.items() if quantity}
+        user_ids = sorted(set(deltas) | set(fields) | set(self._floors) | {key[1] for key in owned})
+        counters = sorted({field for d in deltas.values() for field in d}
+                          | {field for f in self._floors.values() for field in f})
+        ctes, params, checks = [], [], []
+
+        # Lock every user row up front, always in id order so two transactions can't deadlock
+        ctes.append(f"locked AS (SELECT {', '.join(['id'] + counters)} FROM users"
+                    f" WHERE id = ANY(%s) ORDER BY id FOR UPDATE)")
+        params.append(user_ids)
+        checks.append("(SELECT COUNT(*) FROM locked) = %s")
+        params.append(len(user_ids))
+        for user_id, floors in self._floors.items():
+            for field, low in floors.items():
+                checks.append(f"(SELECT COALESCE({field}, 0) FROM locked WHERE id = %s) + %s >= %s")
+                params.extend([user_id, deltas.get(user_id, {}).get(field, 0), low])
+
+        # Lock and check the child rows copies are taken from
+        for field, (table, column) in USER_CHILD_TABLES.items():
+            taken = [(key[1], key[2], -quantity) for key, quantity in owned.items() if key[0] == field and quantity < 0]
+            if not taken:
+                continue
+            ctes.append(f"locked_{field} AS (SELECT user_id, {column}, quantity FROM {table}"
+                        f" WHERE {' OR '.join([f'(user_id = %s AND {column} = %s)'] * len(taken))}"
+                        f" ORDER BY user_id, {column} FOR UPDATE)")
+            for user_id, name, _ in taken:
+                params.extend([user_id, name])
+            for user_id, name, quantity in taken:
+                checks.append(f"COALESCE((SELECT quantity FROM locked_{field} WHERE user_id = %s AND {column} = %s), 0) >= %s")
+                params.extend([user_id, name, quantity])
+
+        for index, (table, match) in enumerate(self._claims):
+            conditions = " AND ".join(f"{column} = %s" for column in match)
+            ctes.append(f"claimable_{index} AS (SELECT 1 FROM {table} WHERE {conditions} FOR UPDATE)")
+            params.extend(match.values())
+            checks.append(f"EXISTS (SELECT 1 FROM claimable_{index})")
+
+        ctes.append(f"ok AS (SELECT {' AND '.join(checks)} AS ok)")
+
+        # Writes, each gated on the checks above
+        returned = []
+        for index, user_id in enumerate(user_ids):
+            assignments, set_params = [], []
+            for field, delta in deltas.get(user_id, {}).items():
+                assignments.append(f"{field} = COALESCE({field}, 0) + %s")
+                set_params.append(delta)
+            for field, value in fields.get(user_id, {}).items():
+                assignments.append(f"{field} = %s")
+                set_params.append(json.dumps(value) if isinstance(value, (list, dict)) else value)
+            if not assignments:
+                continue
+            returning = ', '.join(['id'] + counters)
+            ctes.append(f"user_{index} AS (UPDATE users SET {', '.join(assignments)}"
+                        f" WHERE id = %s AND (SELECT ok FROM ok) RETURNING {returning})")
+            params.extend(set_params + [user_id])
+            returned.append(f"user_{index}")
+        for index, ((field, user_id, name), quantity) in enumerate(owned.items()):
+            table, column = USER_CHILD_TABLES[field]
+            if quantity > 0:
+                ctes.append(f"owned_{index} AS (INSERT INTO {table} (user_id, {column}, quantity)"
+                            f" SELECT %s, %s, %s WHERE (SELECT ok FROM ok)"
+                            f" ON CONFLICT (user_id, {column}) DO UPDATE SET quantity = {table}.quantity + EXCLUDED.quantity)")
+                params.extend([user_id, name, quantity])
+            else:
+                # Last copies go away; otherwise the count drops
+                ctes.append(f"owned_{index} AS (DELETE FROM {table} WHERE user_id = %s AND {column} = %s"
+                            f" AND quantity = %s AND (SELECT ok FROM ok))")
+                ctes.append(f"owned_{index}_left AS (UPDATE {table} SET quantity = quantity - %s"
+                            f" WHERE user_id = %s AND {column} = %s AND quantity > %s AND (SELECT ok FROM ok))")
+                params.extend([user_id, name, -quantity, -quantity, user_id, name, -quantity])
+
+        for index, (table, match) in enumerate(self._claims):
+            conditions = " AND ".join(f"{column} = %s" for column in match)
+            ctes.append(f"claimed_{index} AS (DELETE FROM {table} WHERE {conditions} AND (SELECT ok FROM ok))")
+            params.extend(match.values())
+        for index, (table, values) in enumerate(self._inserts):
+            ctes.append(f"inserted_{index} AS (INSERT INTO {table} ({', '.join(values)})"
+                        f" SELECT {', '.join(['%s'] * len(values))} WHERE (SELECT ok FROM ok) RETURNING id)")
+            params.extend(values.values())
+
+        # One row back: the verdict, the new counter values and any inserted ids
+        outputs = ["ok.ok"]
+        if returned:
+            rows = " UNION ALL ".join(f"SELECT * FROM {name}" for name in returned)
+            outputs.append(f"(SELECT json_agg(changed) FROM ({rows}) changed) AS users")
+        outputs.extend(f"(SELECT id FROM inserted_{index}) AS inserted_{index}" for index in range(len(self._inserts)))
+        return user_ids, owned, f"WITH {', '.join(ctes)} SELECT {', '.join(outputs)} FROM ok", params
+
+    def commit(self):
+        """Apply everything atomically; returns False (changing nothing) if a floor, ownership or claim check fails"""
+        fields = self._changed_fields()
+        user_ids, owned, sql, params = self._build(fields)
+        if not user_ids and not self._claims and not self._inserts:
+            return True
+        row = _run_after_pending(user_ids, [(sql, params)], dict_rows=True)
+        if not row or not row['ok']:
+            return False
+        self.inserted = [row[f"inserted_{index}"] for index in range(len(self._inserts))]
+        # The database has the new values; bring cached rows in line without re-marking them dirty
+        for changed in row.get('users') or []:
+            user_id = changed.pop('id')
+            user_cache.apply(user_id, {k: v for k, v in changed.items() if v is not None}, dirty=False)
+        for user_id, user_fields in fields.items():
+            user_cache.apply(user_id, user_fields, dirty=False)
+        for (field, user_id, name), quantity in owned.items():
+            if quantity > 0:
+                user_cache.update_field(user_id, field, lambda current: _add_copies(current, name, quantity))
+            else:
+                user_cache.update_field(user_id, field, lambda current: _remove_copies(current, name, -quantity))
+        _owned_changed(dict.fromkeys(user_id for _, user_id, _ in owned))
+        return True
+
+    async def acommit(self):
+        return await run_db(self.commit)
+
+# --- MARKETPLACE / TRADE HELPERS ---
+def get_listing(listing_id):
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute("SELECT * FROM marketplace_listings WHERE id = %s", (listing_id,))
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+# Browse orders: sort -> (ORDER BY, comparison that continues after the cursor, cursor columns)
+LISTING_SORTS = {
+    'newest': ("id DESC", "id < %s", ['id']),
+    'price_asc': ("price ASC, id ASC", "(price, id) > (%s, %s)", ['price', 'id']),
+    'price_desc': ("price DESC, id DESC", "(price, id) < (%s, %s)", ['price', 'id']),
+}
+
+def browse_listings(item=None, sort='newest', limit=10, after=None):
+    """One page of listings with keyset paging; returns (rows, cursor for the next page or None)
+
+    after is the cursor returned with the previous page, so each page is a bounded index scan
+    however deep the caller has paged.
+    """
+    order, seek, cursor_columns = LISTING_SORTS[sort]
+    conditions, params = [], []
+    if item is not None:
+        conditions.append("item = %s")
+        params.append(item)
+    if after is not None:
+        conditions.append(seek)
+        params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with db_cursor(dict_rows=True) as cursor:
+        # One extra row tells us whether there is a next page
+        cursor.execute(
+            f"SELECT id, seller_id, item, price FROM marketplace_listings {where} ORDER BY {order} LIMIT %s",
+            params + [limit + 1]
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = tuple(rows[-1][column] for column in cursor_columns)
+    return rows, next_cursor
+
+def listed_items(search="", limit=25):
+    """Distinct item names currently on the marketplace (for autocomplete)"""
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT item FROM marketplace_listings WHERE item ILIKE %s ORDER BY item LIMIT %s",
+            (f"%{search}%", limit)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def get_trade(trade_id):
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute("SELECT * FROM trades WHERE id = %s", (trade_id,))
+        row = cursor.fetchone()
+    return dict(row) if row else None
+
+def create_trade(from_id, to_id, **terms):
+    """Record a pending trade and return its id"""
+    columns = ['from_id', 'to_id'] + list(terms)
+    with db_cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO trades ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) RETURNING id",
+            [from_id, to_id] + list(terms.values())
+        )
+        return cursor.fetchone()[0]
+
+def delete_trade(trade_id, **match):
+    """Delete a trade (optionally only if columns match, e.g. from_id=...); returns whether it existed"""
+    conditions = ["id = %s"] + [f"{column} = %s" for column in match]
+    with db_cursor() as cursor:
+        cursor.execute(f"DELETE FROM trades WHERE {' AND '.join(conditions)}", [trade_id] + list(match.values()))
+        return cursor.rowcount > 0
+
+# --- WARNING HELPERS ---
+def insert_warnings(rows):
+    """Insert (guild_id, user_id, reason, moderator_id, created_at) rows in one statement"""
+    with db_cursor() as cursor:
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO warnings (guild_id, user_id, reason, moderator_id, created_at) VALUES %s",
+            rows
+        )
+
+def get_warnings(guild_id, user_id, limit=25):
+    """A member's latest warnings in a guild, oldest first; returns (rows, total count)
+
+    Warnings imported from the old global file have no guild and show up in every guild.
+    """
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute(
+            """SELECT id, reason, moderator_id, created_at, COUNT(*) OVER () AS total FROM warnings
+            WHERE user_id = %s AND (guild_id = %s OR guild_id IS NULL)
+            ORDER BY created_at DESC, id DESC LIMIT %s""",
+            (user_id, guild_id, limit)
+        )
+        rows = [dict(row) for row in cursor.fetchall()]
+    total = rows[0]['total'] if rows else 0
+    return rows[::-1], total
+
+def clear_warnings(guild_id, user_id):
+    """Delete a member's warnings in a guild (and their guild-less ones); returns how many went"""
+    with db_cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM warnings WHERE user_id = %s AND (guild_id = %s OR guild_id IS NULL)",
+            (user_id, guild_id)
+        )
+        return cursor.rowcount
+
+# --- QUEST HELPERS ---
+def advance_quests(user_id, periods, amount=1):
+    """Add to a user's progress on each (period, period_key), starting over when the key has moved on
+
+    One upsert for all periods; returns {period: new progress}.
+    """
+    values = [(user_id, period, period_key, amount) for period, period_key in periods]
+    with db_cursor() as cursor:
+        rows = psycopg2.extras.execute_values(
+            cursor,
+            """INSERT INTO quest_progress (user_id, period, period_key, progress) VALUES %s
+            ON CONFLICT (user_id, period) DO UPDATE SET
+                progress = CASE WHEN quest_progress.period_key = EXCLUDED.period_key
+                    THEN quest_progress.progress + EXCLUDED.progress ELSE EXCLUDED.progress END,
+                claimed = quest_progress.claimed AND quest_progress.period_key = EXCLUDED.period_key,
+                period_key = EXCLUDED.period_key
+            RETURNING period, progress""",
+            values,
+            fetch=True
+        )
+    return dict(rows)
+
+def get_quest_progress(user_id):
+    """{period: (period_key, progress, claimed)} for every quest the user has started"""
+    with db_cursor() as cursor:
+        cursor.execute(
+            "SELECT period, period_key, progress, claimed FROM quest_progress WHERE user_id = %s",
+            (user_id,)
+        )
+        return {period: (period_key, progress, claimed) for period, period_key, progress, claimed in cursor.fetchall()}
+
+def claim_quests(user_id, targets):
+    """Mark finished, unclaimed quests claimed and pay their rewards; targets are (period, period_key, target, reward)
+
+    The claim and the payout are one statement, and a quest can only be claimed once per period
+    even if /quest runs twice at the same moment. Returns (claimed periods, new balance or None).
+    """
+    values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(targets))
+    params = [param for period, period_key, target, reward in targets for param in (user_id, period, period_key, target, reward)]
+    sql = f"""WITH claimed AS (
+            UPDATE quest_progress q SET claimed = TRUE
+            FROM (VALUES {values}) AS t (user_id, period, period_key, target, reward)
+            WHERE q.user_id = t.user_id AND q.period = t.period AND q.period_key = t.period_key
+                AND NOT q.claimed AND q.progress >= t.target
+            RETURNING q.period, t.reward
+        ), paid AS (
+            UPDATE users SET credits = COALESCE(credits, 0) + (SELECT SUM(reward) FROM claimed)
+            WHERE id = %s AND EXISTS (SELECT 1 FROM claimed)
+            RETURNING credits
+        )
+        SELECT (SELECT array_agg(period) FROM claimed), (SELECT credits FROM paid)"""
+    row = _run_after_pending(user_id, [(sql, params + [user_id])])
+    claimed, balance = (row[0] or []), row[1]
+    if balance is not None:
+        user_cache.apply(user_id, {'credits': balance}, dirty=False)
+    return claimed, balance
 
 # --- TEAM HELPERS ---
 def get_team(team_name):
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cursor.execute("SELECT * FROM teams WHERE name = %s", (team_name,))
-    team = cursor.fetchone()
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute("SELECT * FROM teams WHERE name = %s", (team_name,))
+        team = cursor.fetchone()
     if team:
-        # Parse TEXT fields that contain JSON data
-        for field in ['members', 'achievements', 'quest']:
-            if team[field]:
-                try:
-                    team[field] = json.loads(team[field]) if isinstance(team[field], str) else team[field]
-                except json.JSONDecodeError:
-                    # If it's not valid JSON, treat as empty
-                    team[field] = [] if field in ['members', 'achievements'] else {}
-            else:
-                team[field] = [] if field in ['members', 'achievements'] else {}
-    cursor.close()
-    conn.close()
+        _decode_json_fields(team, TEAM_JSON_LIST_FIELDS, TEAM_JSON_DICT_FIELDS)
     return team
 
 def update_team(team_name, **kwargs):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    fields = []
-    values = []
-    for k, v in kwargs.items():
-        if isinstance(v, (list, dict)):
-            v = json.dumps(v)
-        fields.append(f"{k} = %s")
-        values.append(v)
-    values.append(team_name)
-    sql = f"UPDATE teams SET {', '.join(fields)} WHERE name = %s"
-    cursor.execute(sql, values)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    if not kwargs:
+        return
+    sql, values = _build_update("teams", "name", team_name, kwargs)
+    with db_cursor() as cursor:
+        cursor.execute(sql, values)
 
 # --- ADMIN HELPERS ---
 def get_all_teams():
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cursor.execute("SELECT * FROM teams")
-    teams = cursor.fetchall()
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute("SELECT * FROM teams")
+        teams = cursor.fetchall()
     for team in teams:
-        # Parse TEXT fields that contain JSON data
-        for field in ['members', 'achievements', 'quest']:
-            if team[field]:
-                try:
-                    team[field] = json.loads(team[field]) if isinstance(team[field], str) else team[field]
-                except json.JSONDecodeError:
-                    # If it's not valid JSON, treat as empty
-                    team[field] = [] if field in ['members', 'achievements'] else {}
-            else:
-                team[field] = [] if field in ['members', 'achievements'] else {}
-    cursor.close()
-    conn.close()
+        _decode_json_fields(team, TEAM_JSON_LIST_FIELDS, TEAM_JSON_DICT_FIELDS)
     return teams
 
 def get_all_users():
-    conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cursor.execute("SELECT * FROM users")
-    users = cursor.fetchall()
+    with db_cursor(dict_rows=True) as cursor:
+        cursor.execute(f"SELECT {_select_user_columns()} FROM users")
+        users = [_take_child_fields(dict(user)) for user in cursor.fetchall()]
     for user in users:
-        # Convert TEXT fields that contain JSON data to Python objects
-        json_fields = ['pets', 'inventory', 'achievements', 'pet_stats', 'pet_last_train', 'mission_progress', 'damaged_items', 'equipped_pets', 'battle_team']
-        for field in json_fields:
-            if field in user and user[field]:
-                try:
-                    user[field] = json.loads(user[field]) if isinstance(user[field], str) else user[field]
-                except json.JSONDecodeError:
-                    # If it's not valid JSON, treat as empty
-                    user[field] = [] if field in ['pets', 'inventory', 'achievements', 'damaged_items', 'equipped_pets', 'battle_team'] else {}
-            else:
-                user[field] = [] if field in ['pets', 'inventory', 'achievements', 'damaged_items', 'equipped_pets', 'battle_team'] else {}
-    cursor.close()
-    conn.close()
+        _decode_json_fields(user, USER_JSON_LIST_FIELDS, USER_JSON_DICT_FIELDS)
+        # Changes still waiting in the cache are newer than what the table holds
+        user_cache.overlay(user['id'], user)
     return users
 
+def random_user_id():
+    """Id of one user picked at random (or None if there are none), without loading the table"""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT id FROM users OFFSET floor(random() * (SELECT COUNT(*) FROM users)) LIMIT 1")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+# --- LEADERBOARD ---
+_LEADERBOARD_ORDER = " ORDER BY level DESC NULLS LAST, xp DESC NULLS LAST, credits DESC NULLS LAST, id"
+
+def _leaderboard_key(user):
+    # Same order as _LEADERBOARD_ORDER, for merging chunks in Python
+    return tuple(part for column in ('level', 'xp', 'credits') for part in (user[column] is None, -(user[column] or 0))) + (user['id'],)
+
+def get_leaderboard(limit=10, offset=0, user_ids=None):
+    """Ranked page of users by level, then XP, then credits; user_ids limits it to e.g. one guild's members"""
+    sql = "SELECT id, level, xp, credits FROM users"
+    if user_ids is None:
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute(sql + _LEADERBOARD_ORDER + " LIMIT %s OFFSET %s", (limit, offset))
+            return cursor.fetchall()
+    user_ids = list(user_ids)
+    if len(user_ids) <= LEADERBOARD_ID_CHUNK:
+        with db_cursor(dict_rows=True) as cursor:
+            cursor.execute(sql + " WHERE id = ANY(%s)" + _LEADERBOARD_ORDER + " LIMIT %s OFFSET %s", (user_ids, limit, offset))
+            return cursor.fetchall()
+    # The page can only come from each chunk's own top offset + limit rows
+    candidates = []
+    with db_cursor(dict_rows=True) as cursor:
+        for start in range(0, len(user_ids), LEADERBOARD_ID_CHUNK):
+            cursor.execute(sql + " WHERE id = ANY(%s)" + _LEADERBOARD_ORDER + " LIMIT %s",
+                           (user_ids[start:start + LEADERBOARD_ID_CHUNK], offset + limit))
+            candidates.extend(cursor.fetchall())
+    candidates.sort(key=_leaderboard_key)
+    return candidates[offset:offset + limit]
+
+# --- ASYNC API ---
+# Cogs await these; each runs the matching helper above on the pooled db executor.
+async def aget_user(user_id):
+    # Cache hits are answered on the event loop without touching the executor
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await run_db(_load_user, user_id)
+    return user
+
+async def aget_user_fields(user_id, *fields):
+    # Served from the cached full row when there is one, otherwise a projected SELECT
+    _check_user_fields(fields)
+    row = user_cache.project(user_id, fields)
+    if row is None:
+        row = await run_db(_load_user_fields, user_id, fields)
+    return row
+
+async def aupdate_user(user_id, **kwargs):
+    """Apply the change to the cached row and schedule a coalesced flush"""
+    if not kwargs:
+        return
+    if user_cache.apply(user_id, kwargs) is None:
+        # Nothing cached to hold the change - write it straight through
+        return await run_db(update_user, user_id, **kwargs)
+    if user_cache.is_dirty(user_id):
+        _schedule_user_flush(user_id)
+    if any(field in USER_CHILD_TABLES for field in kwargs):
+        # Readers already see the cached list, even before the flush
+        _owned_changed([user_id])
+
+async def aadjust_user(user_id, floor=None, ceiling=None, clamp=False, **deltas):
+    return await run_db(adjust_user, user_id, floor=floor, ceiling=ceiling, clamp=clamp, **deltas)
+
+async def asettle_bet(user_id, bet, payout):
+    return await run_db(settle_bet, user_id, bet, payout)
+
+async def aclaim_reward(user_id, claimed_field, streak_field, previous, now, cooldown, streak, credits):
+    return await run_db(claim_reward, user_id, claimed_field, streak_field, previous, now, cooldown, streak, credits)
+
+async def aadd_item(user_id, item, quantity=1):
+    return await run_db(add_item, user_id, item, quantity)
+
+async def aremove_item(user_id, item, quantity=1):
+    return await run_db(remove_item, user_id, item, quantity)
+
+async def acount_item(user_id, item):
+    # Cached users are answered without a round-trip
+    cached = user_cache.project(user_id, ['inventory'])
+    if cached is not None:
+        return cached['inventory'].count(item)
+    return await run_db(_count_owned_db, 'inventory', user_id, item)
+
+async def ahas_item(user_id, item):
+    return await acount_item(user_id, item) > 0
+
+async def aitem_owners(item):
+    return await run_db(item_owners, item)
+
+async def aadd_pet(user_id, pet, quantity=1):
+    return await run_db(add_pet, user_id, pet, quantity)
+
+async def aremove_pet(user_id, pet, quantity=1):
+    return await run_db(remove_pet, user_id, pet, quantity)
+
+async def acount_pet(user_id, pet):
+    cached = user_cache.project(user_id, ['pets'])
+    if cached is not None:
+        return cached['pets'].count(pet)
+    return await run_db(_count_owned_db, 'pets', user_id, pet)
+
+async def ahas_pet(user_id, pet):
+    return await acount_pet(user_id, pet) > 0
+
+async def apet_owners(pet):
+    return await run_db(pet_owners, pet)
+
+async def aget_listing(listing_id):
+    return await run_db(get_listing, listing_id)
+
+async def abrowse_listings(item=None, sort='newest', limit=10, after=None):
+    return await run_db(browse_listings, item, sort, limit, after)
+
+async def alisted_items(search="", limit=25):
+    return await run_db(listed_items, search, limit)
+
+async def aget_trade(trade_id):
+    return await run_db(get_trade, trade_id)
+
+async def acreate_trade(from_id, to_id, **terms):
+    return await run_db(create_trade, from_id, to_id, **terms)
+
+async def adelete_trade(trade_id, **match):
+    return await run_db(delete_trade, trade_id, **match)
+
+async def aget_warnings(guild_id, user_id, limit=25):
+    # Queued warnings count too
+    await flush_warnings()
+    return await run_db(get_warnings, guild_id, user_id, limit)
+
+async def aclear_warnings(guild_id, user_id):
+    await flush_warnings()
+    return await run_db(clear_warnings, guild_id, user_id)
+
+async def aadvance_quests(user_id, periods, amount=1):
+    return await run_db(advance_quests, user_id, periods, amount)
+
+async def aget_quest_progress(user_id):
+    return await run_db(get_quest_progress, user_id)
+
+async def aclaim_quests(user_id, targets):
+    return await run_db(claim_quests, user_id, targets)
+
+async def aget_team(team_name):
+    return await run_db(get_team, team_name)
+
+async def aupdate_team(team_name, **kwargs):
+    return await run_db(update_team, team_name, **kwargs)
+
+async def aget_all_teams():
+    return await run_db(get_all_teams)
+
+async def aget_all_users():
+    return await run_db(get_all_users)
+
+async def arandom_user_id():
+    return await run_db(random_user_id)
+
+async def aget_leaderboard(limit=10, offset=0, user_ids=None):
+    if user_ids is not None and not user_ids:
+        return []
+    # Rank on what's been saved, including changes still sitting in the user cache
+    await asyncio.gather(*(flush_user(user_id) for user_id in user_cache.dirty_users()))
+    return await run_db(get_leaderboard, limit, offset, user_ids)
+
+async def aupdate_inventory_value(user_id):
+    user = await aget_user(user_id)
+    inventory_value = calculate_inventory_value(user.get('inventory', []))
+    await aupdate_user(user_id, inventory_value=inventory_value)
+    return inventory_value
+
+# --- USER CACHE FLUSHING ---
+def _schedule_user_flush(user_id):
+    task = _user_flush_tasks.get(user_id)
+    if task is None or task.done():
+        _user_flush_tasks[user_id] = asyncio.get_running_loop().create_task(_flush_user_later(user_id))
+
+async def _flush_user_later(user_id):
+    delay = USER_FLUSH_DELAY
+    try:
+        # Keep going until the row is clean so changes made during a flush aren't stranded
+        while True:
+            await asyncio.sleep(delay)
+            if await flush_user(user_id):
+                delay = USER_FLUSH_DELAY
+            else:
+                delay = min(delay * 2, USER_FLUSH_MAX_DELAY)
+            if not user_cache.is_dirty(user_id):
+                break
+    finally:
+        if _user_flush_tasks.get(user_id) is asyncio.current_task():
+            del _user_flush_tasks[user_id]
+
+async def flush_user(user_id):
+    """Write a user's pending cached changes now; returns False if the write failed"""
+    fields = user_cache.take_dirty(user_id)
+    if not fields:
+        return True
+    try:
+        await run_db(_write_user_fields, user_id, fields)
+    except Exception as e:
+        user_cache.finish_flush(user_id, fields, ok=False)
+        print(f"[ERROR] Failed to flush cached user {user_id}: {e}")
+        return False
+    user_cache.finish_flush(user_id, fields)
+    return True
+
+async def flush_all_users():
+    """Write every pending cached change (called on bot shutdown)"""
+    for task in list(_user_flush_tasks.values()):
+        task.cancel()
+    _user_flush_tasks.clear()
+    results = await asyncio.gather(*(flush_user(user_id) for user_id in user_cache.dirty_users()))
+    return all(results)
+
+# --- WARNING BATCHING ---
+def queue_warning(guild_id, user_id, reason, moderator_id):
+    """Record a warning without waiting on the database; queued rows are inserted together"""
+    global _warning_flush_task
+    _pending_warnings.append((guild_id, user_id, reason, moderator_id, datetime.utcnow()))
+    loop = asyncio.get_running_loop()
+    if len(_pending_warnings) >= WARNING_BATCH_SIZE:
+        loop.create_task(flush_warnings())
+    elif _warning_flush_task is None or _warning_flush_task.done():
+        _warning_flush_task = loop.create_task(_flush_warnings_later())
+
+async def _flush_warnings_later():
+    delay = WARNING_FLUSH_DELAY
+    while True:
+        await asyncio.sleep(delay)
+        if await flush_warnings():
+            delay = WARNING_FLUSH_DELAY
+        else:
+            delay = min(delay * 2, USER_FLUSH_MAX_DELAY)
+        if not _pending_warnings:
+            break
+
+async def flush_warnings():
+    """Insert every queued warning now; returns False if the write failed (rows stay queued)"""
+    # One flush at a time, so a read that flushes first also waits for a batch already in flight
+    async with _warning_flush_lock:
+        if not _pending_warnings:
+            return True
+        rows = _pending_warnings[:]
+        del _pending_warnings[:]
+        try:
+            await run_db(insert_warnings, rows)
+        except Exception as e:
+            _pending_warnings[:0] = rows
+            print(f"[ERROR] Failed to save {len(rows)} warnings: {e}")
+            return False
+        return True
+
 # Initialize database tables when module is imported
 if __name__ == "__main__":
     create_tables()
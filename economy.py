@@ -0,0 +1,106 @@
+# economy.py
+"""
+Odds, payouts and reward formulas for the credit economy.
+
+The game commands roll against these tables, and simulate_economy.py feeds
+the very same tables to NumPy to measure expected value, variance and how
+fast credits enter circulation. A tuning change made here therefore shows up
+in the bot and in the simulator at once.
+
+Gambling tables are lists of (outcome, chance, payout multiplier of the bet);
+the chances of a table add up to 1.
+"""
+
+import random
+
+SCP914_SETTINGS = {
+    "rough": {"win_chance": 0.10, "multiplier": 10, "desc": "You risk it all for a huge reward!"},
+    "coarse": {"win_chance": 0.25, "multiplier": 4, "desc": "A dangerous gamble for a big payout."},
+    "1:1": {"win_chance": 0.5, "multiplier": 2, "desc": "A fair 50/50 shot."},
+    "fine": {"win_chance": 0.7, "multiplier": 1.5, "desc": "Safer, but smaller reward."},
+    "very fine": {"win_chance": 0.9, "multiplier": 1.2, "desc": "Almost safe, but not much gain."}
+}
+
+SCP294_OUTCOMES = [
+    ("win", 0.25, 2),     # 25% win double
+    ("lose", 0.5, 0),     # 50% lose all
+    ("item", 0.15, 0),    # 15% get a random item
+    ("funny", 0.1, 0)     # 10% funny message
+]
+
+# Dr. Bright's coin: guessing the side doubles the bet, the edge pays 10x whatever was called
+SCP963_SIDES = [("heads", 0.48), ("tails", 0.48), ("edge", 0.04)]
+SCP963_MATCH_MULTIPLIER = 2
+SCP963_EDGE_MULTIPLIER = 10
+
+SCP999_OUTCOMES = [
+    ("hug", 0.7, 1.2),
+    ("nothing", 0.2, 0),
+    ("bouncy", 0.1, 5)
+]
+
+# /recontainscp: 10% of battles are against SCP-682; loss is what a defeat costs
+RECONTAIN_DANGEROUS_CHANCE = 0.10
+RECONTAIN_REWARDS = {
+    False: {"xp": 20, "credits": 75, "loss": 30},
+    True: {"xp": 50, "credits": 200, "loss": 100},
+}
+
+# /daily and /weekly: base * (1 + (streak - 1) * step), capped at max_multiplier, plus milestone bonuses
+DAILY_STREAK = {
+    "base": 100,
+    "step": 0.1,
+    "max_multiplier": 2.0,
+    "milestones": {7: 200, 14: 500, 30: 1000, 100: 5000},
+}
+WEEKLY_STREAK = {
+    "base": 500,
+    "step": 0.2,
+    "max_multiplier": 3.0,
+    "milestones": {4: 1000, 8: 2500, 12: 5000, 52: 25000},
+}
+
+
+def scp914_outcomes(setting):
+    odds = SCP914_SETTINGS[setting]
+    return [("win", odds["win_chance"], odds["multiplier"]), ("lose", 1 - odds["win_chance"], 0)]
+
+
+def scp963_outcomes(side):
+    """The coin table as seen by someone who called `side`"""
+    return [
+        (result, chance, SCP963_EDGE_MULTIPLIER if result == "edge" else SCP963_MATCH_MULTIPLIER if result == side else 0)
+        for result, chance in SCP963_SIDES
+    ]
+
+
+def roll(outcomes, rng=None):
+    """Pick an outcome from a table; returns (outcome, multiplier)"""
+    value = (rng or random).random()
+    acc = 0
+    for outcome, chance, multiplier in outcomes:
+        acc += chance
+        if value < acc:
+            return outcome, multiplier
+    # Float rounding can leave the chances summing to just under 1
+    outcome, _, multiplier = outcomes[-1]
+    return outcome, multiplier
+
+
+def payout(bet, multiplier):
+    """Credits paid back for a bet (the stake is already gone)"""
+    return int(bet * multiplier)
+
+
+def expected_value(outcomes):
+    """Mean and variance of the net result per credit bet"""
+    mean = sum(chance * (multiplier - 1) for _, chance, multiplier in outcomes)
+    variance = sum(chance * (multiplier - 1 - mean) ** 2 for _, chance, multiplier in outcomes)
+    return mean, variance
+
+
+def streak_reward(schedule, streak):
+    """(multiplier, milestone bonus, total credits) for claiming at the given streak"""
+    multiplier = min(1 + (streak - 1) * schedule["step"], schedule["max_multiplier"])
+    bonus = schedule["milestones"].get(streak, 0)
+    return multiplier, bonus, int(schedule["base"] * multiplier) + bonus
@@ -0,0 +1,154 @@
+# event_scheduler.py
+"""
+Per-guild random events (vault airdrops, SCP-008 breaches).
+
+Each kind of event gets a GuildEventScheduler holding the guilds that enabled
+it (guild id -> announcement channel id) and each guild's event state, both
+kept in memory and saved through the shared state store. Guilds waiting for
+their next event sit in a heap keyed by the time they become eligible, so the
+scheduler sleeps until the earliest one and only ever touches guilds that are
+due. A guild's event stays active until resolve() is called (someone claimed
+the vault or answered the breach); its cooldown starts from then.
+"""
+
+import asyncio
+import heapq
+import time
+
+from state_store import state_store
+
+
+class GuildEventScheduler:
+    def __init__(self, bot, name, config_path, state_path, cooldown, fire):
+        self.bot = bot
+        self.name = name
+        self.config_path = config_path
+        self.state_path = state_path
+        self.cooldown = cooldown
+        # async fire(guild, channel_id) -> extra state for the active event, or None if it couldn't run
+        self.fire = fire
+        # str(guild_id) -> channel id
+        self.channels = {}
+        # str(guild_id) -> {"active": bool, "last": epoch, ...whatever fire() returned}
+        self.states = {}
+        # (due epoch, guild key); _due holds the live item per guild so stale ones are skipped
+        self._heap = []
+        self._due = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def load(self):
+        channels = state_store.load(self.config_path, {})
+        if not isinstance(channels, dict):
+            # Very old files were a bare list of guild ids with no channel
+            channels = {}
+        self.channels = channels
+        self.states = state_store.load(self.state_path, {})
+        self._heap = []
+        self._due = {}
+        for guild_key in self.channels:
+            self._schedule(guild_key)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _schedule(self, guild_key, due=None):
+        """Queue a guild for its next event unless one is already running"""
+        state = self.states.get(guild_key, {})
+        if state.get("active"):
+            return
+        if due is None:
+            due = state.get("last", 0) + self.cooldown
+        self._due[guild_key] = due
+        heapq.heappush(self._heap, (due, guild_key))
+        self._wakeup.set()
+
+    def enable(self, guild_id, channel_id):
+        guild_key = str(guild_id)
+        self.channels[guild_key] = channel_id
+        state_store.save(self.config_path, self.channels)
+        if guild_key not in self._due:
+            self._schedule(guild_key)
+
+    def disable(self, guild_id):
+        """Stop events for a guild; returns False if they weren't enabled"""
+        guild_key = str(guild_id)
+        if self.channels.pop(guild_key, None) is None:
+            return False
+        state_store.save(self.config_path, self.channels)
+        self._due.pop(guild_key, None)
+        return True
+
+    def channel_id(self, guild_id):
+        return self.channels.get(str(guild_id))
+
+    def active(self, guild_id):
+        """The guild's running event state, or None"""
+        state = self.states.get(str(guild_id))
+        return state if state and state.get("active") else None
+
+    def resolve(self, guild_id):
+        """End the guild's running event and start its cooldown; returns the event, or None if none was running
+
+        Callers check the result before paying out, so two people can't both claim one event.
+        """
+        guild_key = str(guild_id)
+        state = self.active(guild_id)
+        if state is None:
+            return None
+        self.states[guild_key] = {"active": False, "last": time.time()}
+        state_store.save(self.state_path, self.states)
+        if guild_key in self.channels:
+            self._schedule(guild_key)
+        return state
+
+    def stats(self):
+        return {
+            "enabled": len(self.channels),
+            "active": sum(1 for state in self.states.values() if state.get("active")),
+            "queued": len(self._due),
+        }
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - time.time())
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due, guild_key = heapq.heappop(self._heap)
+            if self._due.get(guild_key) != due:
+                continue
+            del self._due[guild_key]
+            try:
+                await self._trigger(guild_key)
+            except Exception as e:
+                print(f"[ERROR] {self.name} event failed for guild {guild_key}: {e}")
+                self._schedule(guild_key, time.time() + self.cooldown)
+
+    async def _trigger(self, guild_key):
+        channel_id = self.channels.get(guild_key)
+        guild = self.bot.get_guild(int(guild_key))
+        if channel_id is None or guild is None:
+            # Disabled meanwhile, or the bot is no longer in the guild
+            return
+        now = time.time()
+        data = await self.fire(guild, channel_id)
+        if data is None:
+            # Nowhere to announce it; try again after another cooldown
+            self._schedule(guild_key, now + self.cooldown)
+            return
+        self.states[guild_key] = {"active": True, "last": now, **data}
+        state_store.save(self.state_path, self.states)
@@ -0,0 +1,104 @@
+# gacha.py
+"""
+Weighted pet draws for the adoption commands.
+
+A Banner (regular or premium adoption) compiles its pets and weights once
+into a Walker alias table, so every draw costs one random index and one coin
+flip however many pets there are. Build a new Banner when the pet catalogue
+changes. A banner can also have pity: once a player has gone pity_after - 1
+pulls without a pet of one of its pity rarities, the next pull is drawn only
+from those rarities (keeping their relative weights). Players' pity counters
+are kept in users.gacha_pity as {banner name: pulls since the last hit}.
+Every draw takes an optional random.Random so results can be reproduced from
+a seed.
+"""
+
+import random
+
+
+class AliasTable:
+    """Items with weights, preprocessed for O(1) weighted draws (Vose's alias method)"""
+
+    __slots__ = ("items", "_prob", "_alias")
+
+    def __init__(self, items, weights):
+        items = list(items)
+        weights = [float(weight) for weight in weights]
+        if not items or len(items) != len(weights):
+            raise ValueError("AliasTable needs one weight per item and at least one item")
+        if any(weight < 0 for weight in weights) or sum(weights) <= 0:
+            raise ValueError("AliasTable weights must be non-negative and not all zero")
+        count = len(items)
+        total = sum(weights)
+        scaled = [weight * count / total for weight in weights]
+        prob = [1.0] * count
+        alias = list(range(count))
+        small = [i for i, value in enumerate(scaled) if value < 1]
+        large = [i for i, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            prob[low] = scaled[low]
+            alias[low] = high
+            scaled[high] += scaled[low] - 1
+            (small if scaled[high] < 1 else large).append(high)
+        # Whatever is left over is 1 up to float rounding
+        self.items = items
+        self._prob = prob
+        self._alias = alias
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng=None):
+        rng = rng or random
+        column = rng.randrange(len(self.items))
+        if rng.random() < self._prob[column]:
+            return self.items[column]
+        return self.items[self._alias[column]]
+
+    def draw_many(self, count, rng=None):
+        return [self.draw(rng) for _ in range(count)]
+
+    def probabilities(self):
+        """Chance of drawing each item, in item order (for checks and the simulator)"""
+        chances = [0.0] * len(self.items)
+        for column, prob in enumerate(self._prob):
+            chances[column] += prob / len(self.items)
+            chances[self._alias[column]] += (1 - prob) / len(self.items)
+        return chances
+
+
+class Banner:
+    """One adoption command's pool of pets"""
+
+    def __init__(self, name, pets, weights, pity_rarities=(), pity_after=0):
+        self.name = name
+        self.pets = list(pets)
+        self.weights = list(weights)
+        self.table = AliasTable(self.pets, self.weights)
+        self.pity_rarities = frozenset(pity_rarities)
+        self.pity_after = pity_after
+        guaranteed = [(pet, weight) for pet, weight in zip(self.pets, self.weights) if pet["rarity"] in self.pity_rarities]
+        self.pity_table = AliasTable(*zip(*guaranteed)) if guaranteed and pity_after > 0 else None
+
+    def pull(self, pity=0, count=1, rng=None):
+        """Draw `count` pets starting from a pity counter; returns (pets, pity counter afterwards)"""
+        pets = []
+        for _ in range(count):
+            if self.pity_table is not None and pity + 1 >= self.pity_after:
+                pet = self.pity_table.draw(rng)
+            else:
+                pet = self.table.draw(rng)
+            pity = 0 if pet["rarity"] in self.pity_rarities else pity + 1
+            pets.append(pet)
+        return pets, pity
+
+    def pity_count(self, user_data):
+        """The player's current pity counter on this banner"""
+        return int((user_data.get("gacha_pity") or {}).get(self.name, 0))
+
+    def with_pity(self, user_data, pity):
+        """The player's gacha_pity dict with this banner's counter replaced, ready to save"""
+        counters = dict(user_data.get("gacha_pity") or {})
+        counters[self.name] = pity
+        return counters
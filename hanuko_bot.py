@@ -1,5 +1,5 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 # Try to import config, fall back to config_fallback if not available
 try:
     import config
@@ -8,10 +8,12 @@ except ImportError:
 import os
 import asyncio
 import random
-from db import get_user, update_user, get_all_users
+from db import aget_user_fields, aadjust_user, close_pool, flush_all_users, flush_warnings, user_cache
+from message_pipeline import MessagePipeline, STAGE_REPLIES, STAGE_COMMANDS
+from state_store import state_store
+from autocomplete import autocomplete
+from event_scheduler import GuildEventScheduler
 from discord import app_commands
-import time
-import json
 import logging
 from datetime import datetime, timedelta
 import aiohttp
@@ -36,7 +38,26 @@ if "cogs.music" in initial_extensions:
     initial_extensions.remove("cogs.music")
 
 class HanukoBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Every message goes through this once; cogs add their own stages when they load
+        self.message_pipeline = MessagePipeline()
+
     async def setup_hook(self):
+        self.message_pipeline.register("replies", personnel_and_mention_replies, STAGE_REPLIES)
+        self.message_pipeline.register("commands", self.process_commands, STAGE_COMMANDS)
+
+        # Per-guild vault airdrops and SCP-008 breaches, each guild on its own timer
+        self.vault_events = GuildEventScheduler(
+            self, "Vault airdrop", "vault_event_channels.json", "vault_event_state.json", VAULT_COOLDOWN, announce_vault
+        )
+        self.breach_events = GuildEventScheduler(
+            self, "SCP-008 breach", enabled_008_file, event_008_breach_file, BREACH_COOLDOWN, announce_breach
+        )
+        for scheduler in (self.vault_events, self.breach_events):
+            scheduler.load()
+            scheduler.start()
+
         # Setup database tables
         print("[DEBUG] Setting up database...")
         try:
@@ -59,12 +80,14 @@ class HanukoBot(commands.Bot):
         except Exception as e:
             print(f"[ERROR] Failed to sync commands: {e}")
 
-        # Global vault state
-        self.active_vault = {"type": None}
-
-        # Background tasks: START THEM HERE!
-        vault_airdrop_announcement.start()
-        scp_008_breach_event.start()
+    async def close(self):
+        await super().close()
+        # Save cached user changes, queued warnings and JSON state that haven't been flushed yet,
+        # then release pooled connections
+        await flush_all_users()
+        await flush_warnings()
+        await state_store.flush_all()
+        close_pool()
 
 intents = discord.Intents.all()
 bot = HanukoBot(command_prefix=config.DEFAULT_PREFIX, intents=intents)
@@ -109,7 +132,10 @@ async def on_ready():
 async def on_message(message):
     if message.author == bot.user:
         return
+    await bot.message_pipeline.dispatch(message)
 
+async def personnel_and_mention_replies(message):
+    """Pipeline stage: personnel file lookups and replies to mentions; stops the pipeline when it answers"""
     # Remove bot mention from start of message for easier parsing
     content = message.content
     mention_str = f'<@{bot.user.id}>'
@@ -122,7 +148,7 @@ async def on_message(message):
         name = content_lower.replace("who's ", "").replace("who is ", "").strip().replace("?", "")
         personnel = ["gamer", "kel", "rafi", "jaggy", "jag", "shyshi", "jason", "fah"]
         if name in personnel:
-            user_data = get_user(message.author.id)
+            user_data = await aget_user_fields(message.author.id, "inventory")
             has_keycard = "Keycard Level 05" in user_data.get("inventory", [])
             if has_keycard:
                 personnel_files = {
@@ -241,14 +267,14 @@ async def on_message(message):
                 embed.add_field(name="Notes", value="[REDACTED] - This information requires Level 05 clearance.", inline=False)
                 embed.set_footer(text="Purchase Keycard Level 05 from /shop to access classified personnel files")
                 await message.channel.send(embed=embed)
-            return
+            return True
 
     # --- Enhanced mention handling ---
     if bot.user.mentioned_in(message):
-        user_data = get_user(message.author.id)
+        await aget_user_fields(message.author.id, "id")
         if message.content.startswith(f'<@{bot.user.id}>'):
             await message.channel.send("🔍 Type `/help` to see all available commands!")
-            return
+            return True
         if "help" in content_lower:
             await message.channel.send("🛡️ Need assistance? Try `/help` for command list!")
         elif any(word in content_lower for word in ["hi", "hello", "hey"]):
@@ -269,9 +295,8 @@ async def on_message(message):
                 f"🛡️ {message.author.mention} The Foundation is listening. Use `/commands` for options."
             ]
             await message.channel.send(random.choice(responses))
-        return
-
-    await bot.process_commands(message)
+        return True
+    return False
 
 @bot.event
 async def on_reaction_add(reaction, user):
@@ -315,161 +340,66 @@ async def on_reaction_add(reaction, user):
             ]
             await reaction.message.channel.send(random.choice(happy_responses))
 
-def load_vault_event_channels():
-    if not os.path.exists("vault_event_channels.json"):
-        return {}
-    with open("vault_event_channels.json", "r", encoding="utf-8") as f:
-        return json.load(f)
+# Minimum time between vault airdrops in a guild, counted from the last claim
+VAULT_COOLDOWN = 10 * 60
 
-vault_event_state_file = "vault_event_state.json"
-
-def save_vault_event_state():
-    with open(vault_event_state_file, "w", encoding="utf-8") as f:
-        json.dump(vault_event_state, f, indent=4)
-
-def load_vault_event_state():
-    global vault_event_state
-    if os.path.exists(vault_event_state_file):
-        with open(vault_event_state_file, "r", encoding="utf-8") as f:
-            vault_event_state = {int(k): v for k, v in json.load(f).items()}
+async def announce_vault(guild, channel_id):
+    """Drop a vault in the guild's vault channel; returns the event state, or None if the channel is gone"""
+    channel = guild.get_channel(channel_id)
+    if channel is None:
+        return None
+    vault_type = random.choice(["level1", "level2"])
+    if vault_type == "level1":
+        await channel.send(
+            "🚨 **A Random Vault has been airdropped! Only those with a Keycard Level 1 can access it! First to claim gets the reward!**"
+        )
     else:
-        vault_event_state = {}
-
-# Load vault_event_state on startup
-load_vault_event_state()
-
-@tasks.loop(minutes=2)
-async def vault_airdrop_announcement():
-    await bot.wait_until_ready()
-    vault_channels = load_vault_event_channels()
-    now = time.time()
-    for guild in bot.guilds:
-        guild_id = str(guild.id)
-        if guild_id not in vault_channels:
-            continue
-        channel_id = vault_channels[guild_id]
-        channel = guild.get_channel(channel_id)
-        if channel is None:
-            continue
-        state = vault_event_state.get(guild.id, {"active": False, "last": 0})
-        # Only trigger if NOT active and enough time has passed since the last vault
-        if state["active"]:
-            continue  # Don't trigger if already active
-        if now - state["last"] < 10 * 60:
-            continue  # Don't trigger if last vault was less than 10 minutes ago
-        # Otherwise, trigger a new vault event
-        vault_type = random.choice(["level1", "level2"])
-        bot.active_vault["type"] = vault_type
-        bot.active_vault["guild_id"] = guild.id
-        if vault_type == "level1":
-            await channel.send(
-                "🚨 **A Random Vault has been airdropped! Only those with a Keycard Level 1 can access it! First to claim gets the reward!**"
-            )
-        else:
-            await channel.send(
-                "🚨 **A Random Vault has been airdropped! Only those with a Keycard Level 2 can access it! First to claim gets the reward!**"
-            )
-        vault_event_state[guild.id] = {"active": True, "last": now}
-        save_vault_event_state()
+        await channel.send(
+            "🚨 **A Random Vault has been airdropped! Only those with a Keycard Level 2 can access it! First to claim gets the reward!**"
+        )
+    return {"type": vault_type}
 
 @app_commands.command(name="claimvault", description="Claim the currently airdropped vault if you have the right keycard!")
 async def claimvault(interaction):
-    user_data = get_user(interaction.user.id)
-    vault_type = bot.active_vault.get("type")
-    guild_id = bot.active_vault.get("guild_id")
-    if guild_id != interaction.guild.id:
-        await interaction.response.send_message("❌ There is no active vault to claim right now.", ephemeral=True)
-        return
-    if not vault_type:
+    vault = interaction.client.vault_events.active(interaction.guild.id)
+    if vault is None:
         await interaction.response.send_message("❌ There is no active vault to claim right now.", ephemeral=True)
         return
+    user_data = await aget_user_fields(interaction.user.id, "inventory")
     inventory = user_data.get("inventory", [])
-    if vault_type == "level1":
-        if "Keycard Level 1" in inventory:
-            user_data["credits"] = user_data.get("credits", 0) + 50
-            user_data["xp"] = user_data.get("xp", 0) + 20
-            update_user(interaction.user.id, credits=user_data["credits"], xp=user_data["xp"])
-            await interaction.response.send_message("✅ You claimed the Level 1 Vault! You received 50 credits and 20 XP.", ephemeral=True)
-            bot.active_vault["type"] = None
-            vault_event_state[interaction.guild.id] = {"active": False, "last": time.time()}
-            save_vault_event_state()
-        else:
-            await interaction.response.send_message("❌ You need a Keycard Level 1 to claim this vault.", ephemeral=True)
-    elif vault_type == "level2":
-        if "Keycard Level 2" in inventory:
-            user_data["credits"] = user_data.get("credits", 0) + 150
-            user_data["xp"] = user_data.get("xp", 0) + 60
-            update_user(interaction.user.id, credits=user_data["credits"], xp=user_data["xp"])
-            await interaction.response.send_message("✅ You claimed the Level 2 Vault! You received 150 credits and 60 XP.", ephemeral=True)
-            bot.active_vault["type"] = None
-            vault_event_state[interaction.guild.id] = {"active": False, "last": time.time()}
-            save_vault_event_state()
-        else:
-            await interaction.response.send_message("❌ You need a Keycard Level 2 to claim this vault.", ephemeral=True)
-    else:
-        await interaction.response.send_message("❌ Unknown vault type.", ephemeral=True)
+    vault_type = vault.get("type", "level1")
+    keycard, credits, xp = ("Keycard Level 1", 50, 20) if vault_type == "level1" else ("Keycard Level 2", 150, 60)
+    if keycard not in inventory:
+        await interaction.response.send_message(f"❌ You need a {keycard} to claim this vault.", ephemeral=True)
+        return
+    if interaction.client.vault_events.resolve(interaction.guild.id) is None:
+        await interaction.response.send_message("❌ Someone else claimed this vault first.", ephemeral=True)
+        return
+    await aadjust_user(interaction.user.id, credits=credits, xp=xp)
+    await interaction.response.send_message(f"✅ You claimed the {keycard[8:]} Vault! You received {credits} credits and {xp} XP.", ephemeral=True)
 
 # File to store enabled guilds for 008 event
 enabled_008_file = "008_enabled_guilds.json"
-def load_enabled_008():
-    if not os.path.exists(enabled_008_file):
-        return {}
-    with open(enabled_008_file, "r", encoding="utf-8") as f:
-        return json.load(f)
-def save_enabled_008(guild_ids):
-    with open(enabled_008_file, "w", encoding="utf-8") as f:
-        json.dump(guild_ids, f, indent=4)
 
 # Per-guild 008 breach state
 event_008_breach_file = "event_008_breach.json"
-
-def save_event_008_breach():
-    with open(event_008_breach_file, "w", encoding="utf-8") as f:
-        json.dump(event_008_breach, f, indent=4)
-
-def load_event_008_breach():
-    global event_008_breach
-    if os.path.exists(event_008_breach_file):
-        with open(event_008_breach_file, "r", encoding="utf-8") as f:
-            event_008_breach = {int(k): v for k, v in json.load(f).items()}
-    else:
-        event_008_breach = {}
-
-# Load event_008_breach on startup
-load_event_008_breach()
-
-@tasks.loop(minutes=10)
-async def scp_008_breach_event():
-    await bot.wait_until_ready()
-    enabled_guilds = load_enabled_008()  # Now a dict: {guild_id: channel_id}
-    now = time.time()
-    for guild in bot.guilds:
-        guild_id = str(guild.id)
-        if guild_id not in enabled_guilds:
-            continue
-        channel_id = enabled_guilds[guild_id]
-        channel = guild.get_channel(channel_id) or guild.system_channel or next((c for c in guild.text_channels if c.permissions_for(guild.me).send_messages), None)
-        if channel is None:
-            continue
-        state = event_008_breach.get(guild.id, {"active": False, "last": 0})
-        # Only trigger if NOT active and enough time has passed since the last breach
-        if state["active"]:
-            continue  # Don't trigger if already active
-        if now - state["last"] < 12 * 3600:
-            continue  # Don't trigger if last breach was less than 12 hours ago
-        # Otherwise, trigger a new breach
-        await channel.send("☣️ **SCP-008 has breached containment! Use /containmentsuit to protect yourself!**")
-        logging.debug(f"[DEBUG] Breach event set active for guild {guild.id}")
-        event_008_breach[guild.id] = {"active": True, "last": now}
-        save_event_008_breach()
+# Minimum time between breaches in a guild, counted from the last response
+BREACH_COOLDOWN = 12 * 3600
+
+async def announce_breach(guild, channel_id):
+    """Start a breach in the guild's configured channel (or the first one we can post in)"""
+    channel = guild.get_channel(channel_id) or guild.system_channel or next((c for c in guild.text_channels if c.permissions_for(guild.me).send_messages), None)
+    if channel is None:
+        return None
+    await channel.send("☣️ **SCP-008 has breached containment! Use /containmentsuit to protect yourself!**")
+    logging.debug(f"[DEBUG] Breach event set active for guild {guild.id}")
+    return {}
 
 @app_commands.command(name="enable008", description="Enable SCP-008 breach event for this server (admin only)")
 @app_commands.checks.has_permissions(administrator=True)
 async def enable008(interaction):
-    enabled_guilds = load_enabled_008()
-    if str(interaction.guild.id) not in enabled_guilds:
-        enabled_guilds.append(str(interaction.guild.id))
-        save_enabled_008(enabled_guilds)
+    if interaction.client.breach_events.channel_id(interaction.guild.id) is None:
+        interaction.client.breach_events.enable(interaction.guild.id, interaction.channel.id)
         await interaction.response.send_message("SCP-008 event enabled for this server.")
     else:
         await interaction.response.send_message("SCP-008 event is already enabled.")
@@ -477,37 +407,30 @@ async def enable008(interaction):
 @app_commands.command(name="disable008", description="Disable SCP-008 breach event for this server (admin only)")
 @app_commands.checks.has_permissions(administrator=True)
 async def disable008(interaction):
-    enabled_guilds = load_enabled_008()
-    if str(interaction.guild.id) in enabled_guilds:
-        enabled_guilds.remove(str(interaction.guild.id))
-        save_enabled_008(enabled_guilds)
+    if interaction.client.breach_events.disable(interaction.guild.id):
         await interaction.response.send_message("SCP-008 event disabled for this server.")
     else:
         await interaction.response.send_message("SCP-008 event is already disabled.")
 
 @app_commands.command(name="containmentsuit", description="Respond to an active SCP-008 breach event.")
 async def containmentsuit(interaction):
-    state = event_008_breach.get(interaction.guild.id, {"active": False})
-    if not state["active"]:
+    if interaction.client.breach_events.active(interaction.guild.id) is None:
         await interaction.response.send_message("There is no active SCP-008 breach event right now.", ephemeral=True)
         return
-    user_data = get_user(interaction.user.id)
+    user_data = await aget_user_fields(interaction.user.id, "inventory")
     inventory = user_data.get("inventory", [])
     channel = interaction.channel
+    if interaction.client.breach_events.resolve(interaction.guild.id) is None:
+        await interaction.response.send_message("The SCP-008 breach has already been dealt with.", ephemeral=True)
+        return
     if "Containment Suit" in inventory:
-        user_data["credits"] = user_data.get("credits", 0) + 100
-        user_data["xp"] = user_data.get("xp", 0) + 50
-        update_user(interaction.user.id, credits=user_data["credits"], xp=user_data["xp"])
+        await aadjust_user(interaction.user.id, credits=100, xp=50)
         await interaction.response.send_message("✅ You used your Containment Suit and survived the breach! You gained 100 credits and 50 XP.", ephemeral=True)
         await channel.send(f"{interaction.user.mention} used a Containment Suit and survived the SCP-008 breach! Event is now over.")
     else:
-        user_data["credits"] = max(0, user_data.get("credits", 0) - 50)
-        user_data["xp"] = max(0, user_data.get("xp", 0) - 100)
-        update_user(interaction.user.id, credits=user_data["credits"], xp=user_data["xp"])
+        await aadjust_user(interaction.user.id, floor=0, clamp=True, credits=-50, xp=-100)
         await interaction.response.send_message("❌ You did not have a Containment Suit and suffered the effects of SCP-008! You lost 50 credits and 100 XP.", ephemeral=True)
         await channel.send(f"{interaction.user.mention} failed to protect themselves from SCP-008! Event is now over.")
-    event_008_breach[interaction.guild.id] = {"active": False, "last": time.time()}
-    save_event_008_breach()
 
 # Add web server for ping functionality
 async def web_server():
@@ -518,10 +441,18 @@ async def web_server():
         return web.Response(text="Bot is alive! 🟢")
     
     async def status_handler(request):
+        moderation = bot.get_cog("Moderation")
         return web.json_response({
             "status": "online",
             "timestamp": datetime.utcnow().isoformat(),
-            "uptime": str(datetime.utcnow() - bot.start_time) if hasattr(bot, 'start_time') else "Unknown"
+            "uptime": str(datetime.utcnow() - bot.start_time) if hasattr(bot, 'start_time') else "Unknown",
+            "user_cache": user_cache.stats(),
+            "message_pipeline": bot.message_pipeline.stats(),
+            "spam_tracker": moderation.spam_tracker.stats() if moderation else None,
+            "state_store": state_store.stats(),
+            "autocomplete": autocomplete.stats(),
+            "vault_events": bot.vault_events.stats() if hasattr(bot, 'vault_events') else None,
+            "breach_events": bot.breach_events.stats() if hasattr(bot, 'breach_events') else None
         })
     
     app.router.add_get('/', ping_handler)
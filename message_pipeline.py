@@ -0,0 +1,70 @@
+# message_pipeline.py
+"""
+Single dispatch path for incoming messages.
+
+The bot's on_message hands every message to one MessagePipeline, which runs
+the registered stages in order: automod, AFK, personnel/mention replies and
+finally prefix commands. A stage returns True when it has fully handled the
+message (e.g. automod deleted it) and the remaining stages are skipped.
+Cogs register their stage in cog_load and remove it in cog_unload.
+"""
+
+import time
+
+# Stage order; lower runs first
+STAGE_AUTOMOD = 10
+STAGE_AFK = 20
+STAGE_REPLIES = 30
+STAGE_COMMANDS = 40
+
+
+class MessagePipeline:
+    def __init__(self):
+        # Sorted list of (order, name, handler)
+        self._stages = []
+        # name -> [calls, stops, total seconds, slowest seconds]
+        self._timings = {}
+
+    def register(self, name, handler, order):
+        """Add a stage (replacing one with the same name, e.g. after a cog reload)"""
+        self.unregister(name)
+        self._stages.append((order, name, handler))
+        self._stages.sort(key=lambda stage: stage[0])
+        self._timings.setdefault(name, [0, 0, 0.0, 0.0])
+
+    def unregister(self, name):
+        self._stages = [stage for stage in self._stages if stage[1] != name]
+
+    def stage_names(self):
+        return [name for _, name, _ in self._stages]
+
+    async def dispatch(self, message):
+        """Run the stages over a message; returns the name of the stage that stopped it, if any"""
+        for _, name, handler in list(self._stages):
+            start = time.perf_counter()
+            try:
+                stop = await handler(message)
+            except Exception as e:
+                print(f"[ERROR] Message stage '{name}' failed: {e}")
+                stop = False
+            elapsed = time.perf_counter() - start
+            timing = self._timings.setdefault(name, [0, 0, 0.0, 0.0])
+            timing[0] += 1
+            timing[2] += elapsed
+            timing[3] = max(timing[3], elapsed)
+            if stop:
+                timing[1] += 1
+                return name
+        return None
+
+    def stats(self):
+        """Per-stage call counts, short-circuits and timings in milliseconds"""
+        return {
+            name: {
+                "calls": calls,
+                "stopped": stops,
+                "avg_ms": round(total / calls * 1000, 3) if calls else 0.0,
+                "max_ms": round(slowest * 1000, 3),
+            }
+            for name, (calls, stops, total, slowest) in self._timings.items()
+        }
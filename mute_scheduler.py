@@ -0,0 +1,219 @@
+# mute_scheduler.py
+"""
+Timed mutes enforced with Discord member timeouts.
+
+Mutes are kept in memory (persisted through the shared state store as
+muted.json: guild id -> user id -> entry) and every pending expiry sits in a
+heap. One background task sleeps until the earliest entry is due, then lifts
+the mute or, for mutes longer than Discord's 28-day timeout limit, renews the
+timeout for the next stretch. The heap is rebuilt from the file when the
+Moderation cog loads, so restarts don't lose or extend mutes.
+"""
+
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+from state_store import state_store
+
+MUTED_FILE = "muted.json"
+# Discord refuses timeouts longer than 28 days; longer mutes are renewed a little before they lapse
+MAX_TIMEOUT = timedelta(days=28)
+RENEW_MARGIN = timedelta(hours=1)
+# A renewal or expiry that fails (e.g. Discord refuses the timeout) is retried after this long
+RETRY_DELAY = timedelta(minutes=5)
+# Guild key for entries saved before mutes were tracked per guild (display only, never enforced)
+LEGACY_GUILD = "0"
+
+
+def _parse(timestamp):
+    return datetime.fromisoformat(timestamp) if timestamp else None
+
+
+def _epoch(dt):
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+class MuteScheduler:
+    def __init__(self, bot, on_expire=None, path=MUTED_FILE):
+        self.bot = bot
+        self.path = path
+        # async on_expire(guild, user_id, entry) - e.g. post to the mod log
+        self.on_expire = on_expire
+        # str(guild_id) -> str(user_id) -> {"reason", "moderator", "timestamp", "end_time", "timeout_until"}
+        self._mutes = {}
+        # (due epoch, guild key, user key); stale items are skipped when popped
+        self._heap = []
+        # (guild key, user key) -> due epoch of a pending retry after a failed attempt
+        self._retries = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def load(self):
+        data = state_store.load(self.path, {})
+        # Old files were flat {user_id: entry} with no guild
+        legacy = {user_id: entry for user_id, entry in data.items() if "end_time" in entry}
+        if legacy:
+            for user_id in legacy:
+                del data[user_id]
+            data.setdefault(LEGACY_GUILD, {}).update(legacy)
+        self._mutes = data
+        self._heap = [
+            (self._due(entry), guild_key, user_key)
+            for guild_key, users in self._mutes.items()
+            for user_key, entry in users.items()
+        ]
+        heapq.heapify(self._heap)
+        self._retries = {}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _save(self):
+        state_store.save(self.path, self._mutes)
+
+    @staticmethod
+    def _due(entry):
+        """When the entry next needs attention: its end, or shortly before its timeout runs out"""
+        end_time = _parse(entry["end_time"])
+        timeout_until = _parse(entry.get("timeout_until"))
+        if timeout_until is not None and timeout_until < end_time:
+            return _epoch(timeout_until - RENEW_MARGIN)
+        return _epoch(end_time)
+
+    def _push(self, guild_key, user_key):
+        due = self._due(self._mutes[guild_key][user_key])
+        self._retries.pop((guild_key, user_key), None)
+        heapq.heappush(self._heap, (due, guild_key, user_key))
+        # Wake the runner in case this is now the earliest entry
+        self._wakeup.set()
+
+    def get(self, guild_id, user_id):
+        """A user's active mute in a guild, or None"""
+        for guild_key in (str(guild_id), LEGACY_GUILD):
+            entry = self._mutes.get(guild_key, {}).get(str(user_id))
+            if entry is not None:
+                return entry
+        return None
+
+    def is_muted(self, guild_id, user_id):
+        return self.get(guild_id, user_id) is not None
+
+    def __len__(self):
+        return sum(len(users) for users in self._mutes.values())
+
+    async def mute(self, member, delta, reason, moderator_id):
+        """Time the member out and remember the mute; raises if Discord refuses the timeout"""
+        now = datetime.utcnow()
+        end_time = now + delta
+        timeout_until = min(end_time, now + MAX_TIMEOUT)
+        await member.timeout(timeout_until - now, reason=reason)
+        guild_key, user_key = str(member.guild.id), str(member.id)
+        self._mutes.setdefault(guild_key, {})[user_key] = {
+            "reason": reason,
+            "moderator": moderator_id,
+            "timestamp": now.isoformat(),
+            "end_time": end_time.isoformat(),
+            "timeout_until": timeout_until.isoformat(),
+        }
+        self._save()
+        self._push(guild_key, user_key)
+
+    async def unmute(self, guild, user_id, reason=None):
+        """Lift a mute early; returns the removed entry, or None if the user wasn't muted"""
+        entry = self._pop(str(guild.id), str(user_id))
+        if entry is None:
+            entry = self._pop(LEGACY_GUILD, str(user_id))
+            # Legacy mutes were never applied as timeouts
+            return entry
+        await self._clear_timeout(guild, user_id, reason)
+        return entry
+
+    def _pop(self, guild_key, user_key):
+        users = self._mutes.get(guild_key)
+        if not users or user_key not in users:
+            return None
+        entry = users.pop(user_key)
+        self._retries.pop((guild_key, user_key), None)
+        if not users:
+            del self._mutes[guild_key]
+        self._save()
+        # Its heap item is left behind and skipped when it comes up
+        return entry
+
+    async def _member(self, guild, user_id):
+        member = guild.get_member(int(user_id))
+        if member is None:
+            try:
+                member = await guild.fetch_member(int(user_id))
+            except discord.NotFound:
+                return None
+        return member
+
+    async def _clear_timeout(self, guild, user_id, reason):
+        member = await self._member(guild, user_id)
+        if member is not None and member.is_timed_out():
+            await member.timeout(None, reason=reason)
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - _epoch(datetime.utcnow()))
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due, guild_key, user_key = heapq.heappop(self._heap)
+            entry = self._mutes.get(guild_key, {}).get(user_key)
+            # Unmuted, or re-muted with a different schedule, since this item was pushed
+            if entry is None or due not in (self._due(entry), self._retries.get((guild_key, user_key))):
+                continue
+            self._retries.pop((guild_key, user_key), None)
+            try:
+                await self._process(guild_key, user_key, entry)
+            except Exception as e:
+                print(f"[ERROR] Failed to process mute of {user_key} in guild {guild_key}, retrying in {RETRY_DELAY}: {e}")
+                self._retry(guild_key, user_key)
+
+    def _retry(self, guild_key, user_key):
+        """Schedule another attempt for an entry that is still tracked, so it can't be left without a heap item"""
+        if user_key not in self._mutes.get(guild_key, {}):
+            return
+        due = _epoch(datetime.utcnow() + RETRY_DELAY)
+        self._retries[(guild_key, user_key)] = due
+        heapq.heappush(self._heap, (due, guild_key, user_key))
+
+    async def _process(self, guild_key, user_key, entry):
+        guild = self.bot.get_guild(int(guild_key))
+        now = datetime.utcnow()
+        end_time = _parse(entry["end_time"])
+        if end_time > now and guild is not None:
+            # Still muted: renew the timeout for the next stretch
+            timeout_until = min(end_time, now + MAX_TIMEOUT)
+            member = await self._member(guild, user_key)
+            if member is not None:
+                await member.timeout(timeout_until - now, reason="Mute continues")
+            entry["timeout_until"] = timeout_until.isoformat()
+            self._save()
+            self._push(guild_key, user_key)
+            return
+        self._pop(guild_key, user_key)
+        if guild is None:
+            # Legacy entry or a guild the bot has left
+            return
+        await self._clear_timeout(guild, user_key, "Mute expired")
+        if self.on_expire is not None:
+            await self.on_expire(guild, int(user_key), entry)
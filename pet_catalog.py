@@ -0,0 +1,85 @@
+# pet_catalog.py
+"""
+Indexed pet catalogue.
+
+PetCatalog turns the PETS list from cogs/pets.py into Pet records and builds
+its lookups once: by exact name, by rarity and a PrefixIndex of the names
+(whole-name and per-word lowercase prefixes), so lookups and autocomplete
+never scan the list. It also checks at construction that PETS and
+PET_RARITIES agree, so the bot refuses to start with a catalogue that has
+drifted.
+"""
+
+from autocomplete import PrefixIndex
+
+
+class Pet:
+    """One catalogue entry; pet["atk"] and pet.get("rarity") keep working for code written against the old dicts"""
+
+    __slots__ = ("name", "rarity", "hp", "atk")
+
+    def __init__(self, name, rarity, hp, atk):
+        self.name = name
+        self.rarity = rarity
+        self.hp = hp
+        self.atk = atk
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __repr__(self):
+        return f"Pet({self.name!r}, {self.rarity!r}, hp={self.hp}, atk={self.atk})"
+
+
+class PetCatalog:
+    def __init__(self, pets, rarities):
+        self.pets = [Pet(pet["name"], pet["rarity"], pet["hp"], pet["atk"]) for pet in pets]
+        self._validate(rarities)
+        self._by_name = {pet.name: pet for pet in self.pets}
+        self._by_rarity = {}
+        for pet in self.pets:
+            self._by_rarity.setdefault(pet.rarity, []).append(pet)
+        self.index = PrefixIndex(pet.name for pet in self.pets)
+
+    def _validate(self, rarities):
+        problems = []
+        seen = set()
+        for pet in self.pets:
+            if pet.name in seen:
+                problems.append(f"{pet.name} is listed twice")
+            seen.add(pet.name)
+            if pet.name not in rarities:
+                problems.append(f"{pet.name} is missing from PET_RARITIES")
+            elif rarities[pet.name] != pet.rarity:
+                problems.append(f"{pet.name} is {pet.rarity} in PETS but {rarities[pet.name]} in PET_RARITIES")
+        problems += [f"{name} is in PET_RARITIES but not in PETS" for name in rarities if name not in seen]
+        if problems:
+            raise ValueError("Pet catalogue is inconsistent: " + "; ".join(problems))
+
+    def __len__(self):
+        return len(self.pets)
+
+    def __iter__(self):
+        return iter(self.pets)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def get(self, name):
+        """The Pet with this exact name, or None"""
+        return self._by_name.get(name)
+
+    def with_rarity(self, *rarities):
+        """Pets of any of these rarities, in catalogue order"""
+        if len(rarities) == 1:
+            return list(self._by_rarity.get(rarities[0], []))
+        return [pet for pet in self.pets if pet.rarity in rarities]
+
+    def search(self, query, within=None, limit=25):
+        """Pet names matching what the user typed, best first (see PrefixIndex.search)"""
+        return self.index.search(query, within=within, limit=limit)
@@ -0,0 +1,274 @@
+# poll_engine.py
+"""
+Polls with button voting.
+
+Every poll keeps a voter -> option map plus a running count per option, so a
+vote (or a changed vote) is a couple of dict/list updates. polls.json is
+written through the shared state store, so a burst of votes costs one write.
+The poll message shows a live tally that is edited at most once every
+POLL_REFRESH_DELAY seconds, and a heap of end times closes each poll on time
+whether or not anyone votes. Button views are persistent: they are re-attached
+to open polls when the Misc cog loads, so voting keeps working across restarts.
+"""
+
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+
+import discord
+from discord import ui
+
+from state_store import state_store
+
+POLLS_FILE = "polls.json"
+POLL_REFRESH_DELAY = 3.0
+# Closed polls are kept this long for /pollresults, then dropped on the next load
+POLL_RETENTION = timedelta(days=30)
+OPTION_EMOJIS = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
+
+
+def _epoch(timestamp):
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def build_poll_embed(poll_id, poll, tallies):
+    """Question, per-option bars and status for a poll"""
+    active = poll["active"]
+    embed = discord.Embed(
+        title="📊 Poll" if active else "📊 Poll Results",
+        description=f"**{poll['question']}**",
+        color=discord.Color.blue() if active else discord.Color.red()
+    )
+    total_votes = sum(tallies)
+    for i, option in enumerate(poll["options"]):
+        votes = tallies[i]
+        percentage = (votes / total_votes * 100) if total_votes > 0 else 0
+        bar_length = int(percentage / 10)  # 10% per bar segment
+        bar = "█" * bar_length + "░" * (10 - bar_length)
+        embed.add_field(
+            name=f"{OPTION_EMOJIS[i]} {option}",
+            value=f"Votes: {votes} ({percentage:.1f}%)\n{bar}",
+            inline=False
+        )
+    embed.add_field(name="Total Votes", value=str(total_votes), inline=True)
+    embed.add_field(name="Status", value="🟢 Active" if active else "🔴 Ended", inline=True)
+    if active:
+        end_epoch = int(_epoch(poll["end_time"]))
+        embed.add_field(name="Ends", value=f"<t:{end_epoch}:R>", inline=True)
+    embed.set_footer(text=f"Poll ID: {poll_id}")
+    return embed
+
+
+class PollButton(ui.Button):
+    def __init__(self, engine, poll_id, index, label):
+        super().__init__(
+            label=label[:80],
+            emoji=OPTION_EMOJIS[index],
+            style=discord.ButtonStyle.primary,
+            custom_id=f"poll:{poll_id}:{index}"
+        )
+        self.engine = engine
+        self.poll_id = poll_id
+        self.index = index
+
+    async def callback(self, interaction: discord.Interaction):
+        error = self.engine.vote(self.poll_id, interaction.user.id, self.index)
+        if error:
+            await interaction.response.send_message(f"❌ {error}", ephemeral=True)
+            return
+        option = self.engine.polls[self.poll_id]["options"][self.index]
+        await interaction.response.send_message(f"✅ Your vote for **{option}** has been recorded.", ephemeral=True)
+
+
+class PollView(ui.View):
+    """Persistent voting buttons for one poll"""
+
+    def __init__(self, engine, poll_id):
+        super().__init__(timeout=None)
+        for index, option in enumerate(engine.polls[poll_id]["options"]):
+            self.add_item(PollButton(engine, poll_id, index, option))
+
+
+class PollEngine:
+    def __init__(self, bot, path=POLLS_FILE, refresh_delay=POLL_REFRESH_DELAY):
+        self.bot = bot
+        self.path = path
+        self.refresh_delay = refresh_delay
+        # poll_id -> poll dict (as saved); poll["voters"] is str(user_id) -> option index
+        self.polls = {}
+        # poll_id -> votes per option
+        self.tallies = {}
+        # poll_id -> PollView attached to its message
+        self._views = {}
+        # (end epoch, poll_id) for open polls
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # poll_id -> pending message edit
+        self._refresh_tasks = {}
+
+    def load(self):
+        polls = self.polls = state_store.load(self.path, {})
+        cutoff = datetime.utcnow() - POLL_RETENTION
+        changed = False
+        for poll_id, poll in list(polls.items()):
+            if not poll["active"] and datetime.fromisoformat(poll["end_time"]) < cutoff:
+                del polls[poll_id]
+                changed = True
+                continue
+            if "voters" not in poll:
+                changed = True
+                # Older files stored option index -> list of voters
+                poll["voters"] = {
+                    user_id: int(index) for index, voters in poll.pop("votes", {}).items() for user_id in voters
+                }
+            tallies = [0] * len(poll["options"])
+            for index in poll["voters"].values():
+                tallies[index] += 1
+            self.tallies[poll_id] = tallies
+            if poll["active"]:
+                self._heap.append((_epoch(poll["end_time"]), poll_id))
+                self._attach_view(poll_id)
+        heapq.heapify(self._heap)
+        if changed:
+            state_store.save(self.path, self.polls)
+
+    def _attach_view(self, poll_id):
+        message_id = self.polls[poll_id].get("message_id")
+        if message_id:
+            view = self._views[poll_id] = PollView(self, poll_id)
+            self.bot.add_view(view, message_id=int(message_id))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._refresh_tasks.values():
+            task.cancel()
+        self._refresh_tasks.clear()
+        for view in self._views.values():
+            view.stop()
+        self._views.clear()
+
+    async def create(self, channel, author, question, options, end_time, poll_id):
+        """Post a poll with voting buttons and schedule its close; returns the message"""
+        poll = {
+            "question": question,
+            "options": options,
+            "voters": {},
+            "created_by": str(author.id),
+            "created_at": datetime.utcnow().isoformat(),
+            "end_time": end_time.isoformat(),
+            "channel_id": str(channel.id),
+            "message_id": None,
+            "active": True
+        }
+        self.polls[poll_id] = poll
+        self.tallies[poll_id] = [0] * len(options)
+        view = self._views[poll_id] = PollView(self, poll_id)
+        embed = build_poll_embed(poll_id, poll, self.tallies[poll_id])
+        embed.set_footer(text=f"Poll ID: {poll_id} • Created by {author.display_name}")
+        try:
+            message = await channel.send(embed=embed, view=view)
+        except Exception:
+            del self.polls[poll_id], self.tallies[poll_id], self._views[poll_id]
+            raise
+        poll["message_id"] = str(message.id)
+        state_store.save(self.path, self.polls)
+        heapq.heappush(self._heap, (_epoch(poll["end_time"]), poll_id))
+        self._wakeup.set()
+        return message
+
+    def vote(self, poll_id, user_id, index):
+        """Record or change a vote; returns an error message, or None on success"""
+        poll = self.polls.get(poll_id)
+        if poll is None:
+            return "Poll not found."
+        if not poll["active"] or datetime.utcnow() >= datetime.fromisoformat(poll["end_time"]):
+            return "This poll has ended."
+        if not 0 <= index < len(poll["options"]):
+            return "Invalid option number."
+        user_key = str(user_id)
+        previous = poll["voters"].get(user_key)
+        if previous == index:
+            return None
+        tallies = self.tallies[poll_id]
+        if previous is not None:
+            tallies[previous] -= 1
+        poll["voters"][user_key] = index
+        tallies[index] += 1
+        state_store.save(self.path, self.polls)
+        self._schedule_refresh(poll_id)
+        return None
+
+    def _schedule_refresh(self, poll_id):
+        task = self._refresh_tasks.get(poll_id)
+        if task is None or task.done():
+            self._refresh_tasks[poll_id] = asyncio.get_running_loop().create_task(self._refresh_later(poll_id))
+
+    async def _refresh_later(self, poll_id):
+        await asyncio.sleep(self.refresh_delay)
+        if self._refresh_tasks.get(poll_id) is asyncio.current_task():
+            del self._refresh_tasks[poll_id]
+        await self._edit_message(poll_id)
+
+    async def _edit_message(self, poll_id):
+        """Show the current tally on the poll message (buttons are dropped once it closes)"""
+        poll = self.polls.get(poll_id)
+        if poll is None or not poll.get("message_id"):
+            return
+        channel = self.bot.get_channel(int(poll["channel_id"]))
+        if channel is None:
+            return
+        embed = build_poll_embed(poll_id, poll, self.tallies[poll_id])
+        view = self._views.get(poll_id) if poll["active"] else None
+        try:
+            await channel.get_partial_message(int(poll["message_id"])).edit(embed=embed, view=view)
+        except Exception as e:
+            print(f"[ERROR] Failed to update poll message {poll_id}: {e}")
+
+    async def close(self, poll_id):
+        """End a poll now and show its final results; returns False if it was already closed"""
+        poll = self.polls.get(poll_id)
+        if poll is None or not poll["active"]:
+            return False
+        poll["active"] = False
+        state_store.save(self.path, self.polls)
+        task = self._refresh_tasks.pop(poll_id, None)
+        if task is not None:
+            task.cancel()
+        view = self._views.pop(poll_id, None)
+        if view is not None:
+            view.stop()
+        # Its heap item is skipped when it comes up
+        await self._edit_message(poll_id)
+        return True
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - datetime.now(timezone.utc).timestamp())
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, poll_id = heapq.heappop(self._heap)
+            try:
+                await self.close(poll_id)
+            except Exception as e:
+                print(f"[ERROR] Failed to close poll {poll_id}: {e}")
+
+    def active_in_channel(self, channel_id):
+        return [
+            (poll_id, poll) for poll_id, poll in self.polls.items()
+            if poll["channel_id"] == str(channel_id) and poll["active"]
+        ]
@@ -0,0 +1,86 @@
+# quests.py
+"""
+Daily, weekly and monthly quests.
+
+Progress lives in the quest_progress table, one row per user and period.
+Commands report what the player did with record(user_id, event); every quest
+counting that event is bumped in one atomic upsert, which also starts the
+counter over when a new day, week or month has begun. /quest reads the rows
+with progress() and pays out finished quests with claim().
+"""
+
+from datetime import datetime
+
+from db import aadvance_quests, aclaim_quests, aget_quest_progress
+
+# Quest events reported by the commands
+EVENT_RECONTAIN = "recontain"
+EVENT_PETBATTLE_WIN = "petbattle_win"
+EVENT_ADOPT = "adopt"
+
+# period -> quest definition; "key" is the strftime format naming the current period
+QUESTS = {
+    "daily": {
+        "title": "Daily Quest",
+        "description": "Complete 5 recontainment battles (/recontainscp)",
+        "event": EVENT_RECONTAIN,
+        "target": 5,
+        "reward": 100,
+        "key": "%Y-%m-%d",
+    },
+    "weekly": {
+        "title": "Weekly Quest",
+        "description": "Win 10 pet battles (/petbattle)",
+        "event": EVENT_PETBATTLE_WIN,
+        "target": 10,
+        "reward": 500,
+        "key": "%Y-W%U",
+    },
+    "monthly": {
+        "title": "Monthly Quest",
+        "description": "Adopt 10 pets (/adoptpet or /premiumpets)",
+        "event": EVENT_ADOPT,
+        "target": 10,
+        "reward": 2000,
+        "key": "%Y-%m",
+    },
+}
+
+
+def period_key(period, now=None):
+    """Name of the current day/week/month for a quest, e.g. '2025-W07'"""
+    return (now or datetime.utcnow()).strftime(QUESTS[period]["key"])
+
+
+async def record(user_id, event, amount=1):
+    """Count something a player did towards every quest that tracks it (errors are logged, never raised)"""
+    now = datetime.utcnow()
+    periods = [(period, period_key(period, now)) for period, quest in QUESTS.items() if quest["event"] == event]
+    if not periods or amount <= 0:
+        return
+    try:
+        await aadvance_quests(user_id, periods, amount)
+    except Exception as e:
+        print(f"[ERROR] Failed to record quest event {event} for {user_id}: {e}")
+
+
+async def progress(user_id):
+    """{period: (progress, claimed)} for the current periods; stale rows count as a fresh start"""
+    now = datetime.utcnow()
+    rows = await aget_quest_progress(user_id)
+    result = {}
+    for period in QUESTS:
+        key, count, claimed = rows.get(period, (None, 0, False))
+        if key != period_key(period, now):
+            count, claimed = 0, False
+        result[period] = (count, claimed)
+    return result
+
+
+async def claim(user_id):
+    """Claim every finished quest and pay its reward; returns [(period, reward)]"""
+    now = datetime.utcnow()
+    targets = [(period, period_key(period, now), quest["target"], quest["reward"]) for period, quest in QUESTS.items()]
+    # Rewards are paid in the same statement that marks the quests claimed
+    claimed, _ = await aclaim_quests(user_id, targets)
+    return [(period, QUESTS[period]["reward"]) for period in QUESTS if period in claimed]
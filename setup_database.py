@@ -9,63 +9,8 @@ import sys
 import psycopg2
 import psycopg2.extras
 
-# Database Schema Definition
-SCHEMA = {
-    'users': {
-        'id': 'BIGINT PRIMARY KEY',
-        'xp': 'INTEGER DEFAULT 0',
-        'level': 'INTEGER DEFAULT 1',
-        'credits': 'INTEGER DEFAULT 0',
-        'pets': 'TEXT',
-        'inventory': 'TEXT',
-        'equipped_weapon': 'VARCHAR(100)',
-        'last_daily': 'TIMESTAMP',
-        'last_weekly': 'TIMESTAMP',
-        'achievements': 'TEXT',
-        'pet_stats': 'TEXT',
-        'pet_last_train': 'TEXT',
-        'mission_progress': 'TEXT',
-        'quiz_last': 'TIMESTAMP',
-        'team': 'VARCHAR(100)',
-        'team_role': 'VARCHAR(50)',
-        'team_points': 'INTEGER DEFAULT 0',
-        'last_mission_start': 'TIMESTAMP',
-        'equipped_pets': 'TEXT DEFAULT \'[]\'',
-        'battle_team': 'TEXT DEFAULT \'[]\'',
-        'damaged_items': 'TEXT',
-        'equipped_gun': 'VARCHAR(255)',
-        'daily_streak': 'INTEGER DEFAULT 0',
-        'weekly_streak': 'INTEGER DEFAULT 0',
-        'inventory_value': 'INTEGER DEFAULT 0',
-        'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
-    },
-    'teams': {
-        'name': 'VARCHAR(100) PRIMARY KEY',
-        'owner': 'BIGINT',
-        'members': 'TEXT',
-        'created': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP',
-        'points': 'INTEGER DEFAULT 0',
-        'icon': 'TEXT',
-        'description': 'TEXT',
-        'achievements': 'TEXT',
-        'quest': 'TEXT'
-    },
-    'polls': {
-        'id': 'SERIAL PRIMARY KEY',
-        'question': 'TEXT NOT NULL',
-        'options': 'JSONB NOT NULL',
-        'votes': 'JSONB DEFAULT \'{}\'',
-        'created_by': 'BIGINT NOT NULL',
-        'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
-    },
-    'warnings': {
-        'id': 'SERIAL PRIMARY KEY',
-        'user_id': 'BIGINT NOT NULL',
-        'reason': 'TEXT NOT NULL',
-        'moderator_id': 'BIGINT NOT NULL',
-        'created_at': 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
-    }
-}
+# Tables, columns and migration steps are defined once, in db.py
+from db import migrate_schema
 
 def get_db_config():
     """Get database configuration from environment variables"""
@@ -83,35 +28,15 @@ def get_db_connection():
     return psycopg2.connect(**config)
 
 def create_tables():
-    """Create all tables if they don't exist"""
+    """Create all tables if they don't exist and apply pending migrations"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
         
-        print("🔧 Creating database tables...")
+        print("🔧 Checking database schema...")
+        version = migrate_schema(conn)
         
-        for table_name, columns in SCHEMA.items():
-            # Build CREATE TABLE statement
-            column_definitions = []
-            for col_name, col_type in columns.items():
-                column_definitions.append(f"{col_name} {col_type}")
-            
-            create_sql = f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                {', '.join(column_definitions)}
-            );
-            """
-            
-            try:
-                cursor.execute(create_sql)
-                print(f"✅ Table {table_name} created/verified successfully")
-            except Exception as e:
-                print(f"❌ Error creating table {table_name}: {e}")
-        
-        conn.commit()
-        cursor.close()
         conn.close()
-        print("✅ Database setup complete!")
+        print(f"✅ Database setup complete! (schema version {version})")
         return True
         
     except Exception as e:
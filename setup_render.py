@@ -88,8 +88,6 @@ def check_json_files():
     json_files = [
         'game_data.json',
         'teams.json',
-        'marketplace.json',
-        'warnings.json',
         'afk_status.json',
         'polls.json'
     ]
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Economy balance simulator
+
+Drives the odds and reward formulas the bot itself uses (economy.py, combat.py
+and the SCP/pet data in cogs/game.py and cogs/pets.py) through NumPy and
+reports expected value, variance and how many credits each faucet puts into
+circulation over time. Runs are seeded, so the numbers are repeatable and the
+timings can be compared between changes as a benchmark.
+
+Needs numpy (pip install numpy) on top of requirements.txt; the bot doesn't.
+
+    python simulate_economy.py                              # every report
+    python simulate_economy.py gamble --trials 5000000
+    python simulate_economy.py recontain --weapon Rifle --pet "SCP-999" --per-hour 60
+    python simulate_economy.py gacha --players 10000 --pulls 100
+    python simulate_economy.py streaks --players 10000 --days 365 --miss 0.1
+"""
+
+import argparse
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import combat
+import economy
+from cogs.game import SCP_LIST, DANGEROUS_SCP, WEAPON_BONUS
+from cogs.pets import PETS, ADOPT_BANNER, PREMIUM_BANNER, PET_ADOPT_COST, PREMIUM_PET_COST
+
+# /adoptpet and /premiumpets pay this instead of charging when the pet is already owned
+ADOPT_DUPE_REFUND = 50
+PREMIUM_DUPE_REFUND = 200
+# 10x adoptions cost 10 pulls with a 5% discount and keep duplicates
+BULK_DISCOUNT = 0.95
+# SCP-682 is rolled fresh every battle; this many variants are sampled to cover its range
+DANGEROUS_SAMPLES = 20
+STREAK_CHECKPOINTS = [1, 7, 14, 30, 60, 90, 180, 365]
+
+
+def _timed(label, trials, started):
+    elapsed = time.perf_counter() - started
+    rate = trials / elapsed if elapsed > 0 else float("inf")
+    print(f"  [{label}: {trials:,} trials in {elapsed:.3f}s, {rate:,.0f} trials/s]")
+
+
+def _sample(outcomes, size, rng):
+    """Outcome indices drawn with the table's chances, same cumulative scheme as economy.roll"""
+    bounds = np.cumsum([chance for _, chance, _ in outcomes])
+    picks = np.searchsorted(bounds, rng.random(size), side="right")
+    return np.minimum(picks, len(outcomes) - 1)
+
+
+def gamble_report(trials, rng):
+    print("Gambling commands (net credits per credit bet)")
+    tables = [(f"scp914 {setting}", economy.scp914_outcomes(setting)) for setting in economy.SCP914_SETTINGS]
+    tables += [
+        ("scp294", economy.SCP294_OUTCOMES),
+        ("scp963", economy.scp963_outcomes("heads")),
+        ("scp999", economy.SCP999_OUTCOMES),
+    ]
+    print(f"  {'command':<20}{'EV':>9}{'variance':>11}{'sim EV':>9}{'sim var':>10}{'P(win)':>8}")
+    started = time.perf_counter()
+    for name, outcomes in tables:
+        mean, variance = economy.expected_value(outcomes)
+        multipliers = np.array([multiplier for _, _, multiplier in outcomes], dtype=np.float64)
+        net = multipliers[_sample(outcomes, trials, rng)] - 1
+        print(f"  {name:<20}{mean:>+9.4f}{variance:>11.4f}{net.mean():>+9.4f}{net.var():>10.4f}{(net > 0).mean():>8.3f}")
+    _timed("gamble", trials * len(tables), started)
+
+
+def _player_side(weapon, pets):
+    """The /recontainscp player side for a loadout, built like the command builds it"""
+    attackers = [("You", 10 + WEAPON_BONUS[weapon])] if weapon else []
+    pet_objs = {pet["name"]: pet for pet in PETS}
+    for name in pets:
+        if name not in pet_objs:
+            sys.exit(f"Unknown pet: {name}")
+        attackers.append((name, pet_objs[name]["atk"]))
+    return combat.side("You", 100, *attackers)
+
+
+def recontain_report(fights, weapon, pets, per_hour, seed):
+    loadout = ", ".join(([weapon] if weapon else ["no weapon"]) + list(pets))
+    print(f"/recontainscp ({loadout}; {per_hour} battles/hour)")
+    player = _player_side(weapon, pets)
+    rng = np.random.default_rng(seed)
+    # (chance of meeting it, dangerous, win rate, loss rate)
+    matchups = []
+    started = time.perf_counter()
+    normal_chance = (1 - economy.RECONTAIN_DANGEROUS_CHANCE) / len(SCP_LIST)
+    print(f"  {'SCP':<36}{'win':>7}{'loss':>7}{'draw':>7}{'turns':>7}")
+    for scp in SCP_LIST:
+        scp_side = combat.side(scp["name"], scp["hp"], (scp["name"], scp["atk"]))
+        stats = combat.simulate(player, scp_side, fights=fights, seed=int(rng.integers(2**32)))
+        matchups.append((normal_chance, False, stats["win_rate"], stats["loss_rate"]))
+        print(f"  {scp['name']:<36}{stats['win_rate']:>7.3f}{stats['loss_rate']:>7.3f}{stats['draw_rate']:>7.3f}{stats['avg_turns']:>7.2f}")
+    dangerous_wins = dangerous_losses = 0.0
+    for _ in range(DANGEROUS_SAMPLES):
+        hp = int(rng.integers(DANGEROUS_SCP["hp"][0], DANGEROUS_SCP["hp"][1] + 1))
+        atk = int(rng.integers(DANGEROUS_SCP["atk"][0], DANGEROUS_SCP["atk"][1] + 1))
+        scp_side = combat.side(DANGEROUS_SCP["name"], hp, (DANGEROUS_SCP["name"], atk))
+        stats = combat.simulate(player, scp_side, fights=max(1, fights // DANGEROUS_SAMPLES), seed=int(rng.integers(2**32)))
+        dangerous_wins += stats["win_rate"] / DANGEROUS_SAMPLES
+        dangerous_losses += stats["loss_rate"] / DANGEROUS_SAMPLES
+    matchups.append((economy.RECONTAIN_DANGEROUS_CHANCE, True, dangerous_wins, dangerous_losses))
+    print(f"  {DANGEROUS_SCP['name']:<36}{dangerous_wins:>7.3f}{dangerous_losses:>7.3f}{max(0.0, 1 - dangerous_wins - dangerous_losses):>7.3f}")
+
+    credits_mean = credits_square = xp_mean = 0.0
+    for chance, dangerous, win_rate, loss_rate in matchups:
+        rewards = economy.RECONTAIN_REWARDS[dangerous]
+        credits_mean += chance * (win_rate * rewards["credits"] - loss_rate * rewards["loss"])
+        credits_square += chance * (win_rate * rewards["credits"] ** 2 + loss_rate * rewards["loss"] ** 2)
+        xp_mean += chance * win_rate * rewards["xp"]
+    credits_var = credits_square - credits_mean ** 2
+    print(f"  per battle: EV {credits_mean:+.2f} credits (variance {credits_var:,.1f}), {xp_mean:.2f} XP")
+    print(f"  per hour:   EV {credits_mean * per_hour:+,.1f} credits (std {np.sqrt(credits_var * per_hour):,.1f}), {xp_mean * per_hour:,.1f} XP")
+    _timed("recontain", fights * (len(SCP_LIST) + 1), started)
+
+
+def _gacha_mode(name, players, pulls, banner, cost, refund, bulk, rng):
+    """Credits and distinct pets per player after `pulls` uses of one adoption command, pity included"""
+    index = {pet["name"]: i for i, pet in enumerate(PETS)}
+    pool = np.array([index[pet["name"]] for pet in banner.pets])
+    probabilities = np.array(banner.table.probabilities())
+    hits_pity = np.array([pet["rarity"] in banner.pity_rarities for pet in banner.pets])
+    if banner.pity_table is not None:
+        pity_pool = np.array([index[pet["name"]] for pet in banner.pity_table.items])
+        pity_probabilities = np.array(banner.pity_table.probabilities())
+    owned = np.zeros((players, len(PETS)), dtype=bool)
+    credits = np.zeros(players, dtype=np.int64)
+    pity = np.zeros(players, dtype=np.int64)
+    rows = np.arange(players)
+    for _ in range(pulls):
+        if bulk:
+            credits -= cost
+        for _ in range(10 if bulk else 1):
+            drawn = rng.choice(len(pool), size=players, p=probabilities)
+            picks = pool[drawn]
+            hit = hits_pity[drawn]
+            if banner.pity_table is not None:
+                forced = pity + 1 >= banner.pity_after
+                picks = np.where(forced, pity_pool[rng.choice(len(pity_pool), size=players, p=pity_probabilities)], picks)
+                hit = hit | forced
+            pity = np.where(hit, 0, pity + 1)
+            if not bulk:
+                credits += np.where(owned[rows, picks], refund, -cost)
+            owned[rows, picks] = True
+    distinct = owned.sum(axis=1)
+    spent = -credits.mean()
+    per_pet = f"{spent / distinct.mean():,.0f}" if distinct.mean() else "-"
+    print(f"  {name:<16}{pulls:>6}{credits.mean():>+13,.0f}{credits.std():>10,.0f}{distinct.mean():>9.1f}{per_pet:>14}")
+
+
+def gacha_report(players, pulls, rng):
+    print(f"Pet adoption ({players:,} players, {len(PETS)} pets)")
+    print(f"  {'command':<16}{'pulls':>6}{'net credits':>13}{'std':>10}{'distinct':>9}{'credits/pet':>14}")
+    started = time.perf_counter()
+    bulk_pulls = max(1, pulls // 10)
+    _gacha_mode("adoptpet", players, pulls, ADOPT_BANNER, PET_ADOPT_COST, ADOPT_DUPE_REFUND, False, rng)
+    _gacha_mode("premiumpets", players, pulls, PREMIUM_BANNER, PREMIUM_PET_COST, PREMIUM_DUPE_REFUND, False, rng)
+    _gacha_mode("adoptpet10x", players, bulk_pulls, ADOPT_BANNER, int(PET_ADOPT_COST * 10 * BULK_DISCOUNT), 0, True, rng)
+    _gacha_mode("premiumpets10x", players, bulk_pulls, PREMIUM_BANNER, int(PREMIUM_PET_COST * 10 * BULK_DISCOUNT), 0, True, rng)
+    _timed("gacha", players * (2 * pulls + 20 * bulk_pulls), started)
+
+
+def _streak_table(schedule, longest):
+    """Credits per claim indexed by streak length, straight from economy.streak_reward"""
+    return np.array([0] + [economy.streak_reward(schedule, streak)[2] for streak in range(1, longest + 1)], dtype=np.int64)
+
+
+def streaks_report(players, days, miss, rng):
+    print(f"/daily and /weekly ({players:,} players, {days} days, {miss:.0%} of claims missed)")
+    started = time.perf_counter()
+    daily_rewards = _streak_table(economy.DAILY_STREAK, days)
+    weekly_rewards = _streak_table(economy.WEEKLY_STREAK, days)
+    daily_streak = np.zeros(players, dtype=np.int64)
+    weekly_streak = np.zeros(players, dtype=np.int64)
+    claimed_yesterday = np.ones(players, dtype=bool)
+    claimed_last_week = np.ones(players, dtype=bool)
+    minted = np.zeros(players, dtype=np.int64)
+    curve = []
+    for day in range(1, days + 1):
+        # A missed day puts more than 48 hours between claims, which resets the streak
+        claimed = rng.random(players) >= miss
+        daily_streak = np.where(claimed, np.where(claimed_yesterday, daily_streak + 1, 1), daily_streak)
+        minted += np.where(claimed, daily_rewards[daily_streak], 0)
+        claimed_yesterday = claimed
+        if day % 7 == 1:
+            claimed = rng.random(players) >= miss
+            weekly_streak = np.where(claimed, np.where(claimed_last_week, weekly_streak + 1, 1), weekly_streak)
+            minted += np.where(claimed, weekly_rewards[weekly_streak], 0)
+            claimed_last_week = claimed
+        if day in STREAK_CHECKPOINTS or day == days:
+            curve.append((day, minted.mean(), minted.std(), daily_streak.mean()))
+    print(f"  {'day':>5}{'credits minted':>16}{'std':>10}{'per day':>9}{'avg streak':>12}")
+    for day, mean, std, streak in curve:
+        print(f"  {day:>5}{mean:>16,.0f}{std:>10,.0f}{mean / day:>9,.0f}{streak:>12.1f}")
+    _timed("streaks", players * days, started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate the Hanuko credit economy")
+    parser.add_argument("report", nargs="?", default="all", choices=["all", "gamble", "recontain", "gacha", "streaks"])
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0, so runs are repeatable)")
+    parser.add_argument("--trials", type=int, default=1_000_000, help="bets per gambling command")
+    parser.add_argument("--fights", type=int, default=100_000, help="battles per SCP for /recontainscp")
+    parser.add_argument("--weapon", choices=sorted(WEAPON_BONUS), help="equipped weapon for /recontainscp")
+    parser.add_argument("--pet", action="append", default=[], help="equipped pet for /recontainscp (repeatable)")
+    parser.add_argument("--per-hour", type=int, default=60, help="/recontainscp battles per hour")
+    parser.add_argument("--players", type=int, default=10_000, help="simulated players for gacha and streaks")
+    parser.add_argument("--pulls", type=int, default=100, help="adoptions per player")
+    parser.add_argument("--days", type=int, default=365, help="days of /daily and /weekly claims")
+    parser.add_argument("--miss", type=float, default=0.1, help="chance a player misses a claim")
+    args = parser.parse_args(argv)
+    if np is None:
+        sys.exit("simulate_economy.py needs numpy (pip install numpy)")
+
+    rng = np.random.default_rng(args.seed)
+    reports = ["gamble", "recontain", "gacha", "streaks"] if args.report == "all" else [args.report]
+    for report in reports:
+        if report == "gamble":
+            gamble_report(args.trials, rng)
+        elif report == "recontain":
+            recontain_report(args.fights, args.weapon, args.pet, args.per_hour, args.seed)
+        elif report == "gacha":
+            gacha_report(args.players, args.pulls, rng)
+        elif report == "streaks":
+            streaks_report(args.players, args.days, args.miss, rng)
+        print()
+
+
+if __name__ == "__main__":
+    main()
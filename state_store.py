@@ -0,0 +1,106 @@
+# state_store.py
+"""
+Shared in-memory copy of the bot's JSON state files.
+
+Each file is read once, the first time something loads it; after that load()
+hands back the same object, so callers mutate it and call save(). A save only
+marks the file dirty and schedules one write STATE_SAVE_DELAY seconds later,
+so a burst of changes costs a single write. The data is serialized on the
+event loop and written on a worker thread via a temp file and rename, so a
+crash can't leave a half-written file behind. HanukoBot.close() calls
+flush_all() so nothing pending is lost on shutdown.
+"""
+
+import asyncio
+import json
+import os
+
+STATE_SAVE_DELAY = float(os.getenv("STATE_SAVE_DELAY", "2.0"))
+
+
+class StateStore:
+    def __init__(self, save_delay=STATE_SAVE_DELAY):
+        self.save_delay = save_delay
+        # path -> loaded object
+        self._data = {}
+        self._dirty = set()
+        # path -> pending save task
+        self._save_tasks = {}
+        # path -> lock so two flushes of one file can't race on its temp file
+        self._write_locks = {}
+        self.reads = 0
+        self.writes = 0
+
+    def load(self, path, default):
+        """The file's contents, read from disk only the first time (default if it doesn't exist)"""
+        if path in self._data:
+            return self._data[path]
+        data = default
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.reads += 1
+            except Exception as e:
+                print(f"[ERROR] Failed to load {path}: {e}")
+        self._data[path] = data
+        return data
+
+    def save(self, path, data):
+        """Replace the file's contents and write them out shortly"""
+        self._data[path] = data
+        self._dirty.add(path)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the bot (maintenance scripts) there is no loop to defer to
+            self._dirty.discard(path)
+            self._write(path, json.dumps(data))
+            return
+        task = self._save_tasks.get(path)
+        if task is None or task.done():
+            self._save_tasks[path] = loop.create_task(self._save_later(path))
+
+    async def _save_later(self, path):
+        await asyncio.sleep(self.save_delay)
+        await self.flush(path)
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.writes += 1
+
+    async def flush(self, path):
+        """Write one file now if it has unsaved changes"""
+        task = self._save_tasks.pop(path, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        lock = self._write_locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            if path not in self._dirty:
+                return
+            self._dirty.discard(path)
+            try:
+                # Snapshot on the event loop; only the file write happens off it
+                data = json.dumps(self._data[path])
+                await asyncio.get_running_loop().run_in_executor(None, self._write, path, data)
+            except Exception as e:
+                self._dirty.add(path)
+                print(f"[ERROR] Failed to save {path}: {e}")
+
+    async def flush_all(self):
+        """Write every file with unsaved changes (called on bot shutdown)"""
+        await asyncio.gather(*(self.flush(path) for path in list(self._dirty)))
+
+    def stats(self):
+        return {
+            "files": len(self._data),
+            "dirty": len(self._dirty),
+            "reads": self.reads,
+            "writes": self.writes,
+        }
+
+
+state_store = StateStore()
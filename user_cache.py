@@ -0,0 +1,171 @@
+# user_cache.py
+"""
+Per-process cache of user rows.
+
+Records are keyed by user id, evicted LRU-first once the cache is full and
+reloaded after a TTL. Writes are applied to the cached record immediately and
+the changed columns are remembered as "dirty" until db.py flushes them, so a
+burst of updates for one user turns into a single UPDATE.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    def __init__(self, max_size=5000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        # user_id -> [loaded_at, record]; order is least -> most recently used
+        self._entries = OrderedDict()
+        # user_id -> set of column names changed since the last flush
+        self._dirty = {}
+        # user_id -> number of flushes currently writing this user
+        self._in_flight = {}
+        # Touched from the event loop and from db executor threads
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _pinned(self, user_id):
+        # Records with unsaved or still-saving changes must not be dropped or reloaded
+        return user_id in self._dirty or user_id in self._in_flight
+
+    def _lookup(self, user_id):
+        # Caller holds the lock; returns the live record or None, counting the hit/miss
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expired = time.monotonic() - entry[0] > self.ttl
+            if not expired or self._pinned(user_id):
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            del self._entries[user_id]
+        self.misses += 1
+        return None
+
+    def get(self, user_id):
+        """Return a private copy of the cached record, or None on a miss"""
+        with self._lock:
+            record = self._lookup(user_id)
+            return copy.deepcopy(record) if record is not None else None
+
+    def project(self, user_id, fields):
+        """Like get() but copies only the named columns"""
+        with self._lock:
+            record = self._lookup(user_id)
+            if record is None:
+                return None
+            return {field: copy.deepcopy(record.get(field)) for field in fields}
+
+    def put(self, user_id, record):
+        """Cache a freshly loaded record and return a private copy of what is now cached"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                # An entry that appeared while we were loading is at least as new as our row
+                entry = [time.monotonic(), copy.deepcopy(record)]
+                self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            self._evict()
+            return copy.deepcopy(entry[1])
+
+    def apply(self, user_id, fields, dirty=True):
+        """Merge column values into a cached record; returns the changed names, or None if not cached"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            record = entry[1]
+            unknown = [field for field in fields if field not in record]
+            if unknown:
+                raise KeyError(f"Unknown users column(s): {', '.join(unknown)}")
+            changed = set()
+            for field, value in fields.items():
+                if record[field] != value:
+                    record[field] = copy.deepcopy(value)
+                    changed.add(field)
+            if dirty and changed:
+                self._dirty.setdefault(user_id, set()).update(changed)
+            return changed
+
+    def update_field(self, user_id, field, func):
+        """Replace a cached column with func(current value) without marking it dirty"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and field in entry[1]:
+                entry[1][field] = func(entry[1][field])
+
+    def take_dirty(self, user_id):
+        """Pop the pending changes for a user as {column: value}; pair with finish_flush()"""
+        with self._lock:
+            fields = self._dirty.pop(user_id, None)
+            entry = self._entries.get(user_id)
+            if not fields or entry is None:
+                return {}
+            self._in_flight[user_id] = self._in_flight.get(user_id, 0) + 1
+            return {field: copy.deepcopy(entry[1][field]) for field in fields}
+
+    def finish_flush(self, user_id, fields, ok=True):
+        """Release a flush started by take_dirty(), re-marking its columns dirty if it failed"""
+        with self._lock:
+            remaining = self._in_flight.get(user_id, 0) - 1
+            if remaining > 0:
+                self._in_flight[user_id] = remaining
+            else:
+                self._in_flight.pop(user_id, None)
+            if not ok and fields and user_id in self._entries:
+                self._dirty.setdefault(user_id, set()).update(fields)
+
+    def is_cached(self, user_id):
+        with self._lock:
+            return user_id in self._entries
+
+    def is_dirty(self, user_id):
+        with self._lock:
+            return user_id in self._dirty
+
+    def dirty_users(self):
+        with self._lock:
+            return list(self._dirty)
+
+    def overlay(self, user_id, record):
+        """Apply unflushed changes on top of a row read straight from the database"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and self._pinned(user_id):
+                for field in self._dirty.get(user_id, ()):
+                    record[field] = copy.deepcopy(entry[1][field])
+            return record
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if not self._pinned(user_id):
+                self._entries.pop(user_id, None)
+
+    def _evict(self):
+        # Oldest clean entries go first; pinned ones stay until they are flushed
+        if len(self._entries) <= self.max_size:
+            return
+        for user_id in list(self._entries):
+            if len(self._entries) <= self.max_size:
+                break
+            if self._pinned(user_id):
+                continue
+            del self._entries[user_id]
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "dirty": len(self._dirty),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }